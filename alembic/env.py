@@ -13,7 +13,7 @@ from src.core.config import app_settings
 # access to the values within the .ini file in use.
 config = context.config
 target_metadata = Base.metadata
-config.set_main_option('sqlalchemy.url', app_settings.postgres_dsn.unicode_string())
+config.set_main_option('sqlalchemy.url', app_settings.postgres_dsn)
 # Interpret the config file for Python logging.
 # This line sets up loggers basically.
 if config.config_file_name is not None:
@@ -0,0 +1,44 @@
+"""Snippets updated_at and content hash
+
+Revision ID: 3c1f0e7d9a2b
+Revises: 8b7b9a912f54
+Create Date: 2026-10-18 13:05:41.228170
+
+"""
+import hashlib
+import zlib
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c1f0e7d9a2b'
+down_revision: Union[str, None] = '8b7b9a912f54'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('snippets', sa.Column('updated_at', sa.DateTime(), nullable=True))
+    op.add_column('snippets', sa.Column('content_hash', sa.String(length=64), nullable=True))
+    op.execute("UPDATE snippets SET updated_at = created_at")
+    op.alter_column('snippets', 'updated_at', nullable=False)
+    # хеш несжатого текста считаем в PostgreSQL, сжатого - после распаковки здесь
+    op.execute("UPDATE snippets SET content_hash = encode(sha256(convert_to(content, 'UTF8')), 'hex') "
+               "WHERE content_codec IS NULL")
+    # в режиме --sql строк нет: хеш сжатых сниппетов остаётся NULL и появится при следующей записи
+    if not context.is_offline_mode():
+        connection = op.get_bind()
+        rows = connection.execute(sa.text(
+            "SELECT id, content_compressed FROM snippets WHERE content_codec = 'zlib'"))
+        for snippet_id, data in rows.fetchall():
+            connection.execute(sa.text("UPDATE snippets SET content_hash = :content_hash WHERE id = :id"),
+                               {"content_hash": hashlib.sha256(zlib.decompress(data)).hexdigest(),
+                                "id": snippet_id})
+
+
+def downgrade() -> None:
+    op.drop_column('snippets', 'content_hash')
+    op.drop_column('snippets', 'updated_at')
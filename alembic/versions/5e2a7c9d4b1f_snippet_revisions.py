@@ -0,0 +1,79 @@
+"""Snippet revision history
+
+Revision ID: 5e2a7c9d4b1f
+Revises: 9d4e2b7c1a5f
+Create Date: 2026-10-18 16:40:52.118204
+
+"""
+import hashlib
+import zlib
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e2a7c9d4b1f'
+down_revision: Union[str, None] = '9d4e2b7c1a5f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('snippet_revisions',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('snippet_id', sa.Integer(), nullable=False),
+    sa.Column('number', sa.Integer(), nullable=False),
+    sa.Column('title', sa.String(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('content_hash', sa.String(length=64), nullable=False),
+    sa.Column('is_snapshot', sa.Boolean(), nullable=False),
+    sa.Column('codec', sa.String(length=16), nullable=True),
+    sa.Column('data', sa.LargeBinary(), nullable=False),
+    sa.ForeignKeyConstraint(['snippet_id'], ['snippets.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('snippet_id', 'number', name='uq_snippet_revisions_snippet_id_number')
+    )
+    op.add_column('snippets', sa.Column('revision', sa.Integer(), server_default='0', nullable=False))
+    # у сжатых сниппетов content пустой: хеш, оставленный NULL запуском 3c1f0e7d9a2b в режиме --sql,
+    # считается только по распакованному тексту, иначе первая ревизия не пройдёт проверку хеша
+    if not context.is_offline_mode():
+        connection = op.get_bind()
+        rows = connection.execute(sa.text("SELECT id, content_codec, content_compressed FROM snippets "
+                                          "WHERE content_hash IS NULL AND content_codec IS NOT NULL"))
+        for snippet_id, codec, data in rows.fetchall():
+            connection.execute(sa.text("UPDATE snippets SET content_hash = :content_hash WHERE id = :id"),
+                               {"content_hash": hashlib.sha256(_decompress(data, codec)).hexdigest(),
+                                "id": snippet_id})
+    # в режиме --sql распаковать нечем: такие строки останавливают миграцию
+    op.execute("""
+        DO $$
+        BEGIN
+            IF EXISTS (SELECT 1 FROM snippets WHERE content_hash IS NULL AND content_codec IS NOT NULL) THEN
+                RAISE EXCEPTION 'Compressed snippets without content_hash: run this migration online to fill them';
+            END IF;
+        END $$
+    """)
+    # текущий текст существующих сниппетов - их первая ревизия (снимок в том же виде, как он хранится)
+    op.execute("""
+        INSERT INTO snippet_revisions (snippet_id, number, title, created_at, content_hash, is_snapshot, codec, data)
+        SELECT id, 1, title, updated_at, coalesce(content_hash, encode(sha256(convert_to(content, 'UTF8')), 'hex')),
+               true, content_codec,
+               CASE WHEN content_codec IS NULL THEN convert_to(content, 'UTF8') ELSE content_compressed END
+        FROM snippets
+    """)
+    op.execute("UPDATE snippets SET revision = 1")
+
+
+def _decompress(data: bytes, codec: str) -> bytes:
+    if codec == "zlib":
+        return zlib.decompress(data)
+    # zstandard нужен, только если такие сниппеты есть
+    import zstandard
+    return zstandard.ZstdDecompressor().decompress(data)
+
+
+def downgrade() -> None:
+    op.drop_column('snippets', 'revision')
+    op.drop_table('snippet_revisions')
@@ -0,0 +1,63 @@
+"""Snippets content compression
+
+Revision ID: 8b7b9a912f54
+Revises: aeb853015d9a
+Create Date: 2026-10-18 12:20:05.318402
+
+"""
+import zlib
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b7b9a912f54'
+down_revision: Union[str, None] = 'aeb853015d9a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SEARCH_VECTOR = ("setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+                 "setweight(to_tsvector('simple', coalesce(content, '')), 'B')")
+
+
+def upgrade() -> None:
+    op.add_column('snippets', sa.Column('content_codec', sa.String(length=16), nullable=True))
+    op.add_column('snippets', sa.Column('content_compressed', sa.LargeBinary(), nullable=True))
+    # сжатый текст недоступен выражению GENERATED, поэтому search_vector становится
+    # обычной колонкой, которую заполняет приложение при записи
+    op.drop_index('ix_snippets_search_vector', table_name='snippets', postgresql_using='gin')
+    op.drop_column('snippets', 'search_vector')
+    op.add_column('snippets', sa.Column('search_vector', postgresql.TSVECTOR(), nullable=True))
+    op.execute(f"UPDATE snippets SET search_vector = {SEARCH_VECTOR}")
+    op.create_index('ix_snippets_search_vector', 'snippets', ['search_vector'],
+                    unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    # перед удалением колонок возвращаем сжатый текст в content
+    if context.is_offline_mode():
+        # в SQL-скрипте распаковать текст нечем, а без распаковки он потерялся бы
+        raise RuntimeError("Downgrade of 8b7b9a912f54 restores compressed content and cannot run with --sql")
+    connection = op.get_bind()
+    rows = connection.execute(sa.text(
+        "SELECT id, content_codec, content_compressed FROM snippets WHERE content_codec IS NOT NULL"))
+    for snippet_id, codec, data in rows.fetchall():
+        if codec != 'zlib':
+            raise RuntimeError(f"Cannot downgrade snippet {snippet_id} compressed with {codec}")
+        connection.execute(sa.text("UPDATE snippets SET content = :content WHERE id = :id"),
+                           {"content": zlib.decompress(data).decode(), "id": snippet_id})
+    op.drop_index('ix_snippets_search_vector', table_name='snippets', postgresql_using='gin')
+    op.drop_column('snippets', 'search_vector')
+    op.add_column('snippets', sa.Column(
+        'search_vector',
+        postgresql.TSVECTOR(),
+        sa.Computed(SEARCH_VECTOR, persisted=True),
+        nullable=True,
+    ))
+    op.create_index('ix_snippets_search_vector', 'snippets', ['search_vector'],
+                    unique=False, postgresql_using='gin')
+    op.drop_column('snippets', 'content_compressed')
+    op.drop_column('snippets', 'content_codec')
@@ -0,0 +1,42 @@
+"""Short codes for shared snippets
+
+Revision ID: 9d4e2b7c1a5f
+Revises: 3c1f0e7d9a2b
+Create Date: 2026-10-18 14:02:17.503311
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.schema import CreateSequence, DropSequence
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d4e2b7c1a5f'
+down_revision: Union[str, None] = '3c1f0e7d9a2b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# шаг должен совпадать с models.shorted_url.SHORT_CODE_BLOCK_SIZE
+short_code_seq = sa.Sequence('short_code_seq', start=1, increment=1000)
+
+
+def upgrade() -> None:
+    op.execute(CreateSequence(short_code_seq))
+    op.create_table('short_code_counter',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('value', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.add_column('url', sa.Column('snippet_id', sa.Integer(), nullable=True))
+    op.create_index(op.f('ix_url_snippet_id'), 'url', ['snippet_id'], unique=False)
+    op.create_foreign_key('url_snippet_id_fkey', 'url', 'snippets', ['snippet_id'], ['id'], ondelete='CASCADE')
+
+
+def downgrade() -> None:
+    op.drop_constraint('url_snippet_id_fkey', 'url', type_='foreignkey')
+    op.drop_index(op.f('ix_url_snippet_id'), table_name='url')
+    op.drop_column('url', 'snippet_id')
+    op.drop_table('short_code_counter')
+    op.execute(DropSequence(short_code_seq))
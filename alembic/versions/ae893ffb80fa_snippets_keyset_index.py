@@ -0,0 +1,30 @@
+"""Snippets keyset pagination index
+
+Revision ID: ae893ffb80fa
+Revises: f951f7cc9d86
+Create Date: 2026-10-18 10:12:41.207315
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'ae893ffb80fa'
+down_revision: Union[str, None] = 'f951f7cc9d86'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # keyset-пагинация сравнивает (created_at, id), поэтому NULL в created_at недопустим
+    op.execute("UPDATE snippets SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL")
+    op.alter_column('snippets', 'created_at', existing_type=sa.DateTime(), nullable=False)
+    op.create_index('ix_snippets_created_at_id', 'snippets', ['created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_snippets_created_at_id', table_name='snippets')
+    op.alter_column('snippets', 'created_at', existing_type=sa.DateTime(), nullable=True)
@@ -0,0 +1,40 @@
+"""Snippets full-text search
+
+Revision ID: aeb853015d9a
+Revises: ae893ffb80fa
+Create Date: 2026-10-18 11:02:17.540981
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'aeb853015d9a'
+down_revision: Union[str, None] = 'ae893ffb80fa'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # вычисляемая колонка: совпадения в заголовке весят больше, чем в тексте
+    op.add_column('snippets', sa.Column(
+        'search_vector',
+        postgresql.TSVECTOR(),
+        sa.Computed(
+            "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('simple', coalesce(content, '')), 'B')",
+            persisted=True,
+        ),
+        nullable=True,
+    ))
+    op.create_index('ix_snippets_search_vector', 'snippets', ['search_vector'],
+                    unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_snippets_search_vector', table_name='snippets', postgresql_using='gin')
+    op.drop_column('snippets', 'search_vector')
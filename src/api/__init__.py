@@ -5,6 +5,10 @@ from api.v1.auth import auth_router
 
 from api.v1.user import user_router
 from api.v1.snippets import snippets_router
+from api.v1.internal import internal_router
+from api.v1.health import health_router
+from api.v1.metrics import metrics_router
+from api.v1.short_links import short_links_router
 
 
 api_router = APIRouter()
@@ -12,4 +16,8 @@ api_router = APIRouter()
 
 api_router.include_router(user_router)
 api_router.include_router(auth_router)
-api_router.include_router(snippets_router)
\ No newline at end of file
+api_router.include_router(snippets_router)
+api_router.include_router(internal_router)
+api_router.include_router(health_router)
+api_router.include_router(metrics_router)
+api_router.include_router(short_links_router)
\ No newline at end of file
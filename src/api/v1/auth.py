@@ -1,20 +1,21 @@
 from typing import Annotated
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request
 from fastapi.security import OAuth2PasswordRequestForm
 from starlette import status
 from starlette.exceptions import HTTPException
 
-from auth.auth import authenticate_user, create_access_token, reg_user, user_dependency
-from db.db import db_dependency
+from auth.auth import authenticate_user, create_access_token, reg_user, user_dependency, limit_auth_attempts
+from db.db import db_dependency, SessionRoute
 from schemas.user import UserRegisterSchema, UserLoginSchema
 
-auth_router = APIRouter(prefix="/auth", tags=['auth'])
+auth_router = APIRouter(prefix="/auth", tags=['auth'], route_class=SessionRoute)
 
 
 @auth_router.post("/login")
 async def login_for_access_token(db: db_dependency,
-                                login_data: UserLoginSchema):
+                                login_data: UserLoginSchema, request: Request):
+   limit_auth_attempts(request, login_data.email)
    user = await authenticate_user(login_data, db)
    if not user:
        raise HTTPException(
@@ -29,7 +30,8 @@ async def login_for_access_token(db: db_dependency,
 
 @auth_router.post("/token")
 async def token(form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
-               db: db_dependency):
+               db: db_dependency, request: Request):
+   limit_auth_attempts(request, form_data.username)
    user = await authenticate_user(
        UserLoginSchema(email=form_data.username, password=form_data.password),
        db=db)
@@ -0,0 +1,40 @@
+import asyncio
+import logging
+
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from sqlalchemy import text
+
+from db import db as database
+from services.warmup import readiness
+
+logger = logging.getLogger(__name__)
+# Проверка БД в /health/ready вместе с ожиданием соединения из пула: при исчерпанном пуле
+# проба не должна висеть db_pool_timeout секунд
+READINESS_DB_TIMEOUT = 1.0
+
+# Проверки для балансировщика: жив ли процесс и готов ли воркер принимать трафик
+health_router = APIRouter(prefix="/health", tags=['health'])
+
+
+@health_router.get("/live")
+async def liveness():
+    return {"status": "ok"}
+
+
+async def _check_database() -> None:
+    async with database.engine.connect() as connection:
+        await connection.execute(text("SELECT 1"))
+
+
+@health_router.get("/ready")
+async def readiness_check():
+    # проба доступна без авторизации: причина ошибки только в логе, наружу - фиксированный статус
+    if not readiness.ready:
+        return JSONResponse(status_code=503, content={"status": "warming_up"})
+    try:
+        await asyncio.wait_for(_check_database(), timeout=READINESS_DB_TIMEOUT)
+    except Exception as ex:
+        logger.warning(f"Readiness check failed: {ex!r}")
+        return JSONResponse(status_code=503, content={"status": "database_unavailable"})
+    return {"status": "ready"}
@@ -0,0 +1,13 @@
+from fastapi import APIRouter, Depends
+
+from auth.auth import has_role
+from core.stats import collect_stats
+
+# Служебные эндпоинты для эксплуатации (только для администраторов)
+internal_router = APIRouter(prefix="/internal", tags=['internal'])
+
+
+@internal_router.get("/stats", dependencies=[Depends(has_role(["admin"]))])
+async def get_internal_stats():
+    """Счётчики кэшей и пулов текущего воркера"""
+    return collect_stats()
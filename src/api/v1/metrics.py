@@ -0,0 +1,13 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from core.metrics import render_all_workers
+
+# Метрики в текстовом формате Prometheus, по всем воркерам сервера
+metrics_router = APIRouter(tags=['metrics'])
+
+
+@metrics_router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Счётчики запросов и гистограммы времени ответа по маршрутам"""
+    return PlainTextResponse(render_all_workers(), media_type="text/plain; version=0.0.4")
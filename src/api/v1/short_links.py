@@ -0,0 +1,17 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import RedirectResponse
+
+from db.db import read_db_dependency, SessionRoute
+from services.short_codes import resolve_short_code
+
+# Короткие ссылки на публичные сниппеты
+short_links_router = APIRouter(prefix="/s", tags=['short links'], route_class=SessionRoute)
+
+
+@short_links_router.get("/{code}", response_class=RedirectResponse, status_code=307)
+async def follow_short_link(code: str, db: read_db_dependency):
+    """Переход по короткому коду на страницу публичного сниппета"""
+    location = await resolve_short_code(db, code)
+    if location is None:
+        raise HTTPException(status_code=404, detail="Short link not found")
+    return RedirectResponse(location, status_code=307)
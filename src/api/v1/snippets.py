@@ -1,14 +1,76 @@
-from fastapi import FastAPI, Depends, HTTPException, APIRouter
+import logging
+import zlib
+from typing import Optional, AsyncIterator
+
+import orjson
+from fastapi import FastAPI, Depends, HTTPException, APIRouter, Response, Query, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from schemas.snippet import SnippetCreate, SnippetResponse, SnippetUpdate
-from services.crud_snippet import create_snippet, get_snippet, get_snippets, update_snippet, delete_snippet, get_snippet_by_shared_url_from_db
-from db.db import db_dependency
+from core.compression import negotiate_encoding, compress_body
+from core.conditional import (PreconditionFailed, snippet_etag, encoded_etag, http_date,
+                              is_conditional, is_not_modified)
+from core.config import app_settings
+from core.executor import ExecutorSaturated
+from schemas.snippet import SnippetCreate, SnippetResponse, SnippetUpdate, SnippetRevisionInfo, SnippetRevisionResponse
+from services.crud_snippet import create_snippet, get_snippet_row, get_snippets, update_snippet, delete_snippet, get_snippet_by_shared_url_from_db, search_snippets, bulk_create_snippets, iter_snippets_for_export, get_snippet_validators, get_shared_snippet_validators
+from db.db import db_dependency, read_db_dependency, SessionRoute
 from auth.auth import has_role
+from services.pagination import encode_cursor, decode_created_at_cursor, decode_rank_cursor
+from services.revisions import RevisionCorrupted, get_revisions, get_revision
+from services.rendering import RenderOptionError, resolve_lexer, resolve_style, render_snippet
 
 
+logger = logging.getLogger(__name__)
 
 # Создаем экземпляр APIRouter
-snippets_router = APIRouter(prefix="/snippets", tags=['snippets'])
+snippets_router = APIRouter(prefix="/snippets", tags=['snippets'], route_class=SessionRoute)
+
+
+def json_response(request: Request, content, headers: Optional[dict] = None,
+                  etag: Optional[str] = None) -> Response:
+    """JSON-ответ через orjson; большие тела сжимаются по Accept-Encoding клиента.
+
+    etag однозначно определяет тело, поэтому он же служит ключом кэша сжатых тел.
+    """
+    return encoded_response(request, orjson.dumps(content), "application/json", headers=headers, etag=etag)
+
+
+def encoded_response(request: Request, body: bytes, media_type: str, headers: Optional[dict] = None,
+                     etag: Optional[str] = None) -> Response:
+    """Готовое тело ответа, сжатое по Accept-Encoding, если оно достаточно большое"""
+    headers = {**(headers or {}), "Vary": "Accept-Encoding"}
+    encoding = None
+    if len(body) >= app_settings.response_compression_min_size:
+        encoding = negotiate_encoding(request.headers.get("accept-encoding", ""))
+        if encoding is not None:
+            body = compress_body(body, encoding, digest=etag.encode() if etag else None)
+            headers["Content-Encoding"] = encoding
+    if etag is not None:
+        headers["ETag"] = encoded_etag(etag, encoding)
+    return Response(body, media_type=media_type, headers=headers)
+
+
+def _validator_headers(snippet: dict) -> dict:
+    return {"ETag": snippet_etag(snippet["id"], snippet["updated_at"], snippet["content_hash"]),
+            "Last-Modified": http_date(snippet["updated_at"])}
+
+
+def _not_modified(request: Request, snippet: dict) -> Optional[Response]:
+    """Ответ 304, если у клиента актуальная версия сниппета (If-None-Match / If-Modified-Since)"""
+    headers = _validator_headers(snippet)
+    if is_not_modified(request.headers, headers["ETag"], snippet["updated_at"]):
+        return Response(status_code=304, headers={**headers, "Vary": "Accept-Encoding"})
+    return None
+
+
+def snippet_response(request: Request, snippet: dict) -> Response:
+    """Ответ с одним сниппетом: ETag и Last-Modified, 304 при совпадении условий"""
+    not_modified = _not_modified(request, snippet)
+    if not_modified is not None:
+        return not_modified
+    headers = _validator_headers(snippet)
+    return json_response(request, snippet, headers={"Last-Modified": headers["Last-Modified"]},
+                         etag=headers["ETag"])
 
 
 @snippets_router.post("/", response_model=SnippetResponse, dependencies=[Depends(has_role(["user"]))])
@@ -17,28 +79,229 @@ async def create_new_snippet(snippet: SnippetCreate, db: db_dependency):
     return await create_snippet(db, snippet)
 
 
+NDJSON_MEDIA_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+
+async def _iter_ndjson(request: Request) -> AsyncIterator[tuple[int, object]]:
+    # читаем тело потоком и разбираем по строкам, не держа весь файл в памяти
+    index, buffer = 0, b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield index, _parse_line(line)
+                index += 1
+    if buffer.strip():
+        yield index, _parse_line(buffer)
+
+
+def _parse_line(line: bytes) -> object:
+    try:
+        return orjson.loads(line)
+    except orjson.JSONDecodeError as ex:
+        return ValueError(f"Invalid JSON: {ex}")
+
+
+async def _iter_json_array(request: Request) -> AsyncIterator[tuple[int, object]]:
+    try:
+        items = orjson.loads(await request.body())
+    except orjson.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Invalid JSON")
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON array of snippets")
+    for index, item in enumerate(items):
+        yield index, item
+
+
+@snippets_router.post("/bulk", dependencies=[Depends(has_role(["user"]))])
+async def bulk_import_snippets(request: Request, db: db_dependency):
+    """Массовый импорт сниппетов: JSON-массив или NDJSON (по объекту на строку).
+
+    Ошибочные строки не прерывают импорт, их номера и причины возвращаются в ответе.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    items = _iter_ndjson(request) if content_type in NDJSON_MEDIA_TYPES else _iter_json_array(request)
+    result = await bulk_create_snippets(db, items, app_settings.bulk_insert_batch_size)
+    return result.as_dict()
+
+
+async def _export_ndjson(gzip: bool) -> AsyncIterator[bytes]:
+    # по одному куску ответа на пачку строк из курсора
+    compressor = zlib.compressobj(wbits=31) if gzip else None  # wbits=31 - формат gzip
+    async for rows in iter_snippets_for_export(app_settings.export_fetch_size):
+        chunk = b"".join(orjson.dumps(row) + b"\n" for row in rows)
+        if compressor is not None:
+            chunk = compressor.compress(chunk)
+        if chunk:
+            yield chunk
+    if compressor is not None:
+        yield compressor.flush()
+
+
+@snippets_router.get("/export", dependencies=[Depends(has_role(["user"]))])
+async def export_snippets(gzip: bool = False):
+    """Выгрузка всех сниппетов в NDJSON потоком, при gzip=true - со сжатием"""
+    headers = {"Content-Disposition": 'attachment; filename="snippets.ndjson"'}
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(_export_ndjson(gzip), media_type="application/x-ndjson", headers=headers)
+
+
+@snippets_router.get("/search", response_model=list[SnippetResponse], dependencies=[Depends(has_role(["user"]))])
+async def search_snippets_by_text(response: Response, db: read_db_dependency,
+                                  q: str = Query(min_length=1, max_length=256),
+                                  limit: int = Query(10, ge=1, le=100),
+                                  cursor: Optional[str] = None):
+    """Полнотекстовый поиск по заголовку и тексту сниппетов, самые релевантные первыми.
+
+    Курсор следующей страницы возвращается в заголовке X-Next-Cursor.
+    """
+    after = None
+    if cursor:
+        try:
+            after = decode_rank_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    rows = await search_snippets(db, q, limit, after=after)
+    if len(rows) == limit:
+        last_snippet, last_rank = rows[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor(last_rank, last_snippet["id"])
+    return [snippet for snippet, _ in rows]
+
+
 @snippets_router.get("/{snippet_id}", response_model=SnippetResponse, dependencies=[Depends(has_role(["user"]))])
-async def read_snippet(snippet_id: int, db: db_dependency):
-    """Получить сниппет по ID"""
-    snippet = await get_snippet(db, snippet_id)
+async def read_snippet(snippet_id: int, request: Request, db: read_db_dependency):
+    """Получить сниппет по ID (поддерживает If-None-Match / If-Modified-Since)"""
+    if is_conditional(request.headers):
+        # сначала проверяем версию по валидаторам - текст читается, только если он изменился
+        validators = await get_snippet_validators(db, snippet_id)
+        if not validators:
+            raise HTTPException(status_code=404, detail="Snippet not found")
+        not_modified = _not_modified(request, validators)
+        if not_modified is not None:
+            return not_modified
+    # строка из БД уже имеет форму SnippetResponse - отдаём её через orjson без повторной валидации
+    snippet = await get_snippet_row(db, snippet_id)
+    if not snippet:
+        raise HTTPException(status_code=404, detail="Snippet not found")
+    return snippet_response(request, snippet)
+
+
+async def rendered_response(request: Request, snippet: dict, lexer: Optional[str], style: Optional[str]) -> Response:
+    """HTML сниппета с подсветкой; 304, если у клиента уже есть этот рендеринг"""
+    try:
+        lexer = resolve_lexer(lexer, snippet["title"])
+        style = resolve_style(style)
+    except RenderOptionError as ex:
+        raise HTTPException(status_code=400, detail=str(ex))
+    # HTML определяется текстом, лексером и стилем - ETag общий для сниппетов с одинаковым текстом,
+    # и сжатое тело тоже кэшируется один раз
+    etag = f'"html-{(snippet["content_hash"] or "")[:16]}-{lexer}-{style}"'
+    headers = {"Last-Modified": http_date(snippet["updated_at"])}
+    if is_not_modified(request.headers, etag, snippet["updated_at"]):
+        return Response(status_code=304, headers={**headers, "ETag": etag, "Vary": "Accept-Encoding"})
+    if len(snippet["content"].encode()) > app_settings.render_max_bytes:
+        raise HTTPException(status_code=413, detail="Snippet is too large to render")
+    try:
+        html = await render_snippet(snippet["content"], snippet["content_hash"], lexer, style)
+    except ExecutorSaturated:
+        raise HTTPException(status_code=503, detail="Server is busy, try again later",
+                            headers={"Retry-After": "1"})
+    return encoded_response(request, html, "text/html; charset=utf-8", headers=headers, etag=etag)
+
+
+@snippets_router.get("/{snippet_id}/rendered", response_class=Response, dependencies=[Depends(has_role(["user"]))])
+async def read_rendered_snippet(snippet_id: int, request: Request, db: read_db_dependency,
+                                lexer: Optional[str] = None, style: Optional[str] = None):
+    """HTML сниппета с подсветкой синтаксиса.
+
+    lexer - имя или псевдоним лексера pygments (по умолчанию определяется по заголовку как имени файла),
+    style - стиль pygments (по умолчанию render_default_style).
+    """
+    snippet = await get_snippet_row(db, snippet_id)
     if not snippet:
         raise HTTPException(status_code=404, detail="Snippet not found")
-    return snippet
+    return await rendered_response(request, snippet, lexer, style)
+
+
+@snippets_router.get("/{snippet_id}/revisions", response_model=list[SnippetRevisionInfo],
+                     dependencies=[Depends(has_role(["user"]))])
+async def read_snippet_revisions(snippet_id: int, request: Request, db: read_db_dependency,
+                                 limit: int = Query(20, ge=1, le=app_settings.revision_list_limit),
+                                 cursor: Optional[str] = None):
+    """История правок сниппета, новые ревизии первыми.
+
+    Курсор следующей страницы возвращается в заголовке X-Next-Cursor.
+    """
+    before = None
+    if cursor:
+        try:
+            before = int(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    revisions = await get_revisions(db, snippet_id, limit, before=before)
+    if not revisions and before is None:
+        raise HTTPException(status_code=404, detail="Snippet not found")
+    headers = {}
+    if len(revisions) == limit:
+        headers["X-Next-Cursor"] = str(revisions[-1]["number"])
+    return json_response(request, revisions, headers=headers)
+
+
+@snippets_router.get("/{snippet_id}/revisions/{number}", response_model=SnippetRevisionResponse,
+                     dependencies=[Depends(has_role(["user"]))])
+async def read_snippet_revision(snippet_id: int, number: int, request: Request, db: read_db_dependency):
+    """Ревизия сниппета с полным текстом (восстанавливается из снимка и дельт)"""
+    try:
+        revision = await get_revision(db, snippet_id, number)
+    except RevisionCorrupted as ex:
+        # повторный запрос не поможет: нужна починка истории, клиенту - понятная ошибка
+        logger.error(f"Corrupted revision history: snippet_id={snippet_id} number={number}: {ex}")
+        raise HTTPException(status_code=500, detail="Revision history is corrupted")
+    if revision is None:
+        raise HTTPException(status_code=404, detail="Revision not found")
+    # ревизия не меняется, ETag - её номер и хеш; формат отличается от ETag сниппета,
+    # потому что по ETag кэшируются сжатые тела ответов
+    etag = f'"{snippet_id:x}-r{number:x}-{revision["content_hash"][:16]}"'
+    if is_not_modified(request.headers, etag, revision["created_at"]):
+        return Response(status_code=304, headers={"ETag": etag, "Vary": "Accept-Encoding"})
+    return json_response(request, revision, headers={"Last-Modified": http_date(revision["created_at"])}, etag=etag)
 
 
 @snippets_router.get("/", response_model=list[SnippetResponse], dependencies=[Depends(has_role(["user"]))])
-async def read_snippets(db: db_dependency, skip: int = 0, limit: int = 10):
-    """Получить список сниппетов с пагинацией"""
-    return await get_snippets(db, skip, limit)
+async def read_snippets(request: Request, db: read_db_dependency, skip: int = 0, limit: int = 10,
+                        cursor: Optional[str] = None):
+    """Получить список сниппетов с пагинацией.
+
+    Курсор следующей страницы возвращается в заголовке X-Next-Cursor,
+    его нужно передать в параметре cursor. Параметры skip/limit работают как раньше.
+    """
+    after = None
+    if cursor:
+        try:
+            after = decode_created_at_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    snippets = await get_snippets(db, skip, limit, after=after)
+    headers = {}
+    if limit > 0 and len(snippets) == limit:
+        last = snippets[-1]
+        headers["X-Next-Cursor"] = encode_cursor(last["created_at"], last["id"])
+    return json_response(request, snippets, headers=headers)
 
 
 @snippets_router.put("/{snippet_id}", response_model=SnippetResponse, dependencies=[Depends(has_role(["user"]))])
 async def update_existing_snippet(
-        snippet_id: int, snippet: SnippetUpdate, db: db_dependency):
-    """Обновить существующий сниппет"""
-    updated_snippet = await update_snippet(db, snippet_id, snippet)
+        snippet_id: int, snippet: SnippetUpdate, request: Request, response: Response, db: db_dependency):
+    """Обновить существующий сниппет; с заголовком If-Match - только если версия не изменилась"""
+    try:
+        updated_snippet = await update_snippet(db, snippet_id, snippet, if_match=request.headers.get("if-match"))
+    except PreconditionFailed:
+        raise HTTPException(status_code=412, detail="Snippet has been modified")
     if not updated_snippet:
         raise HTTPException(status_code=404, detail="Snippet not found")
+    response.headers.update(_validator_headers(updated_snippet))
     return updated_snippet
 
 
@@ -55,9 +318,26 @@ async def delete_existing_snippet(snippet_id: int, db: db_dependency):
 
 
 @snippets_router.get("/shared/{shared_url}", response_model=SnippetResponse)
-async def get_snippet_by_shared_url(shared_url: str, db: db_dependency):
-    """Получить сниппет по уникальной ссылке"""
+async def get_snippet_by_shared_url(shared_url: str, request: Request, db: read_db_dependency):
+    """Получить сниппет по уникальной ссылке (поддерживает If-None-Match / If-Modified-Since)"""
+    if is_conditional(request.headers):
+        validators = await get_shared_snippet_validators(db, shared_url)
+        if not validators:
+            raise HTTPException(status_code=404, detail="Snippet not found")
+        not_modified = _not_modified(request, validators)
+        if not_modified is not None:
+            return not_modified
+    snippet = await get_snippet_by_shared_url_from_db(db, shared_url)
+    if not snippet:
+        raise HTTPException(status_code=404, detail="Snippet not found")
+    return snippet_response(request, snippet)
+
+
+@snippets_router.get("/shared/{shared_url}/rendered", response_class=Response)
+async def get_rendered_snippet_by_shared_url(shared_url: str, request: Request, db: read_db_dependency,
+                                             lexer: Optional[str] = None, style: Optional[str] = None):
+    """HTML сниппета по уникальной ссылке с подсветкой синтаксиса (параметры как у /{snippet_id}/rendered)"""
     snippet = await get_snippet_by_shared_url_from_db(db, shared_url)
     if not snippet:
         raise HTTPException(status_code=404, detail="Snippet not found")
-    return snippet
+    return await rendered_response(request, snippet, lexer, style)
@@ -1,12 +1,13 @@
-import httpx
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from sqlalchemy import select
+from models.model import User
 from schemas.user import UserRegisterSchema, UserLoginSchema
-from db.db import db_dependency
-from auth.auth import reg_user, authenticate_user, create_access_token,has_role  # Импортируем нужные функции
+from db.db import db_dependency, SessionRoute
+from auth.auth import reg_user, authenticate_user, create_access_token,has_role, limit_auth_attempts  # Импортируем нужные функции
 from fastapi import BackgroundTasks
 
 # Создаем APIRouter с префиксом "/user" и тегом 'user' для отображения в документации
-user_router = APIRouter(prefix="/user", tags=['user'])
+user_router = APIRouter(prefix="/user", tags=['user'], route_class=SessionRoute)
 
 
 @user_router.get("/{user_id}", dependencies=[Depends(has_role(["admin"]))])
@@ -24,9 +25,12 @@ async def get_user(user_id: int, db: db_dependency):
 
 
 @user_router.post("/register")
-async def register_user(user_data: UserRegisterSchema, db: db_dependency):
+async def register_user(user_data: UserRegisterSchema, db: db_dependency, request: Request):
+    limit_auth_attempts(request, user_data.email)
     try:
         return await reg_user(user_data=user_data, db=db)
+    except HTTPException:
+        raise
     except Exception as ex:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
                             detail=f"Аn error has occurred: {ex}")
@@ -34,7 +38,8 @@ async def register_user(user_data: UserRegisterSchema, db: db_dependency):
 
 @user_router.post("/login")
 async def login_for_access_token(db: db_dependency,
-                                 login_data: UserLoginSchema):
+                                 login_data: UserLoginSchema, request: Request):
+    limit_auth_attempts(request, login_data.email)
     user = await authenticate_user(login_data, db)
     if not user:
         raise HTTPException(
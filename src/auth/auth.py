@@ -1,18 +1,22 @@
+import functools
+import hashlib
+import math
+import time
 from calendar import timegm
 from datetime import timedelta, datetime
 from typing import Optional, Annotated, Dict, List
 
-import bcrypt
-from asyncpg import UniqueViolationError
-from fastapi import Depends, HTTPException
+from fastapi import Depends, HTTPException, Request
 from fastapi.security import OAuth2PasswordBearer
-from jose import jwt, JWTError
-from passlib.context import CryptContext
 from sqlalchemy import select
 from sqlalchemy.orm import joinedload
 from starlette import status
 from models.role import RoleEnum
+from core.cache import LRUCache
 from core.config import app_settings
+from core.executor import BoundedExecutor, ExecutorSaturated
+from core.rate_limit import TokenBucketStore
+from core.stats import register_stats
 from db.db import db_dependency
 from models.model import User
 from models.role import Role
@@ -22,20 +26,72 @@ from schemas.user import UserRegisterSchema, UserLoginSchema
 JWT_SECRET = app_settings.jwt_secret  # your_super_secret
 # Алгоритм хеширования
 ALGORITHM = app_settings.algorithm  # 'HS256'
-# Контекст для валидации и хеширования
-bcrypt_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
 # специальный класс для настройки авторизации в Swagger
 oauth2_bearer = OAuth2PasswordBearer(tokenUrl='/auth/token')
+# отдельный пул для bcrypt, чтобы хеширование паролей не блокировало event loop воркера
+password_executor = BoundedExecutor("bcrypt",
+                                    max_workers=app_settings.password_hash_workers,
+                                    max_queue=app_settings.password_hash_queue_size)
+register_stats("password_hashing", password_executor.stats)
+# кэш уже проверенных токенов: sha256 токена -> данные пользователя, живёт до exp токена
+token_cache = LRUCache(maxsize=app_settings.token_cache_size)
+register_stats("token_cache", token_cache.stats)
+# ведра попыток входа и регистрации, общие для воркеров
+auth_rate_limiter = TokenBucketStore()
+register_stats("auth_rate_limit", auth_rate_limiter.stats)
+
+
+# Контекст для валидации и хеширования.
+# bcrypt, passlib и jose импортируются при первом использовании (прогрев воркера), а не при импорте
+@functools.cache
+def password_context():
+    from passlib.context import CryptContext
+    return CryptContext(schemes=['bcrypt'], deprecated='auto')
 
 
 # Генерация соли
 def generate_salt():
+    import bcrypt
     return bcrypt.gensalt().decode("utf-8")
 
 
 # Хэширование пароля с использованием соли
 def hash_password(password: str, salt: str):
-    return bcrypt_context.hash(password + salt)
+    return password_context().hash(password + salt)
+
+
+# Запуск bcrypt в пуле; при переполнении очереди сразу отвечаем 503
+async def run_password_task(fn, *args):
+    try:
+        return await password_executor.run(fn, *args)
+    except ExecutorSaturated:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail="Server is busy, try again later",
+                            headers={"Retry-After": "1"})
+
+
+# Ограничение частоты входа и регистрации: вызывается первым в обработчике, до БД и bcrypt
+def limit_auth_attempts(request: Request, account: str) -> None:
+    if not app_settings.auth_rate_limit_enabled:
+        return
+    client_ip = request.client.host if request.client else "unknown"
+    retry_after = auth_rate_limiter.take([
+        (f"ip:{client_ip}", app_settings.auth_rate_limit_ip_burst, app_settings.auth_rate_limit_ip_per_second),
+        (f"account:{account.strip().lower()}", app_settings.auth_rate_limit_account_burst,
+         app_settings.auth_rate_limit_account_per_second),
+    ])
+    if retry_after > 0:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                            detail="Too many attempts, try again later",
+                            headers={"Retry-After": str(math.ceil(retry_after))})
+
+
+async def hash_password_async(password: str, salt: str) -> str:
+    return await run_password_task(hash_password, password, salt)
+
+
+async def verify_password(password: str, salt: str, hashed_password: str) -> bool:
+    return await run_password_task(password_context().verify, password + salt, hashed_password)
 
 
 # Создание нового токена
@@ -51,11 +107,13 @@ def create_access_token(data: dict, expires_delta: timedelta = timedelta(minutes
     to_encode.update({"exp": expire})
 
     # генерируем токен из данных, секрета и алгоритма
+    from jose import jwt
     return jwt.encode(to_encode, JWT_SECRET, algorithm=ALGORITHM)
 
 
 # Регистрация пользователя
 async def reg_user(user_data: UserRegisterSchema, db: db_dependency):
+    from asyncpg import UniqueViolationError
     user_salt: str = generate_salt()
     try:
         # Проверка существования роли
@@ -75,7 +133,7 @@ async def reg_user(user_data: UserRegisterSchema, db: db_dependency):
         create_user_statement: User = User(
             **user_data.model_dump(exclude={'password', 'role'}),  # Исключаем пароль и роль
             salt=user_salt,
-            hashed_password=hash_password(user_data.password, user_salt),
+            hashed_password=await hash_password_async(user_data.password, user_salt),
             role_id=role.id  # Привязываем роль к пользователю
         )
         # создаём пользователя в базе данных
@@ -86,22 +144,29 @@ async def reg_user(user_data: UserRegisterSchema, db: db_dependency):
         # если возникает ошибка UniqueViolationError, то считаем, что пользователь с такими данными уже есть
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
                             detail='User with such credentials already exists')
+    except HTTPException:
+        raise
     except Exception as ex:
         raise ex
 
 
-# Аутентификация пользователя
-async def authenticate_user(login_data: UserLoginSchema, db: db_dependency):
+# Поиск пользователя вместе с ролью по email
+async def get_user_by_email(db: db_dependency, email: str) -> Optional[User]:
     # делаем SELECT-запрос в базу данных для нахождения пользователя по email
     result = await db.execute(select(User)
                               .options(joinedload(User.role))
-                              .where(User.email == login_data.email))
-    user: Optional[User] = result.scalars().first()
+                              .where(User.email == email))
+    return result.scalars().first()
+
+
+# Аутентификация пользователя
+async def authenticate_user(login_data: UserLoginSchema, db: db_dependency):
+    user = await get_user_by_email(db, login_data.email)
 
     # пользователь будет авторизован, если он зарегистрирован и ввёл корректный пароль
     if not user:
         return False
-    if not bcrypt_context.verify(login_data.password + user.salt, user.hashed_password):
+    if not await verify_password(login_data.password, user.salt, user.hashed_password):
         return False
     return user
 
@@ -113,6 +178,11 @@ async def get_current_user(token: str = Depends(oauth2_bearer)):
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    token_digest = hashlib.sha256(token.encode()).digest()
+    current_user = token_cache.get(token_digest)
+    if current_user is not None:
+        return current_user
+    from jose import jwt, JWTError
     try:
         payload = jwt.decode(token, JWT_SECRET, algorithms=[ALGORITHM])
         user_email = payload.get("sub")
@@ -121,7 +191,12 @@ async def get_current_user(token: str = Depends(oauth2_bearer)):
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    return {"email": user_email, "role": user_role}
+    current_user = {"email": user_email, "role": user_role}
+    expires_at = payload.get("exp")
+    if isinstance(expires_at, (int, float)):
+        # запись не переживает сам токен
+        token_cache.set(token_digest, current_user, ttl=expires_at - time.time())
+    return current_user
 
 
 user_dependency = Annotated[Dict, Depends(get_current_user)]
@@ -0,0 +1,36 @@
+"""Бенчмарк стоимости авторизации одного запроса (get_current_user).
+
+Запуск из каталога src:
+    python -m benchmarks.bench_auth [--requests 20000]
+"""
+import argparse
+import asyncio
+import time
+
+from auth.auth import create_access_token, get_current_user, token_cache
+
+
+async def measure(token: str, requests: int, cached: bool) -> float:
+    token_cache.clear()
+    started = time.perf_counter()
+    for _ in range(requests):
+        if not cached:
+            token_cache.clear()
+        await get_current_user(token)
+    return (time.perf_counter() - started) / requests
+
+
+async def main(requests: int) -> None:
+    token = create_access_token(data={"sub": "bench@example.com", "role": "user"})
+    uncached = await measure(token, requests, cached=False)
+    cached = await measure(token, requests, cached=True)
+    print(f"jwt.decode on every request: {uncached * 1e6:8.2f} us/request")
+    print(f"decoded-token cache:         {cached * 1e6:8.2f} us/request")
+    print(f"speedup: {uncached / cached:.1f}x, cache stats: {token_cache.stats()}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests))
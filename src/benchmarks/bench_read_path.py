@@ -0,0 +1,69 @@
+"""Бенчмарк чтения страницы из 100 сниппетов: ORM + SnippetResponse + json против
+выборки колонок + orjson.
+
+Запуск из каталога src (используется SQLite в памяти):
+    python -m benchmarks.bench_read_path [--pages 2000] [--page-size 100]
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine
+import orjson
+
+from db.db import create_sessionmaker
+from models import Base
+from models.model import Snippet
+from schemas.snippet import SnippetResponse
+from services.crud_snippet import get_snippets
+
+response_adapter = TypeAdapter(list[SnippetResponse])
+
+
+async def orm_page(session, page_size: int) -> bytes:
+    # так страница собиралась раньше: ORM-объекты, валидация response_model, stdlib json
+    result = await session.execute(select(Snippet).order_by(Snippet.created_at, Snippet.id).limit(page_size))
+    snippets = result.scalars().all()
+    validated = response_adapter.validate_python(snippets, from_attributes=True)
+    return json.dumps(jsonable_encoder(validated)).encode()
+
+
+async def projection_page(session, page_size: int) -> bytes:
+    return orjson.dumps(await get_snippets(session, limit=page_size))
+
+
+async def measure(session, build_page, pages: int, page_size: int) -> float:
+    started = time.perf_counter()
+    for _ in range(pages):
+        await build_page(session, page_size)
+        # каждый запрос получает новые объекты, как в отдельной сессии на запрос
+        session.expunge_all()
+    return pages / (time.perf_counter() - started)
+
+
+async def main(pages: int, page_size: int) -> None:
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with create_sessionmaker(engine)() as session:
+        session.add_all([Snippet(title=f"snippet {i}", content="print('hello world')\n" * 20,
+                                 is_private=i % 2 == 0) for i in range(page_size * 2)])
+        await session.commit()
+        orm_rate = await measure(session, orm_page, pages, page_size)
+        projection_rate = await measure(session, projection_page, pages, page_size)
+    await engine.dispose()
+    print(f"ORM + SnippetResponse + json: {orm_rate:8.1f} pages/s")
+    print(f"columns + orjson:             {projection_rate:8.1f} pages/s")
+    print(f"speedup: {projection_rate / orm_rate:.2f}x")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--page-size", type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(main(args.pages, args.page_size))
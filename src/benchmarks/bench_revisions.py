@@ -0,0 +1,112 @@
+"""Бенчмарк истории правок: место на ревизию и время восстановления ревизии.
+
+Сниппет из --lines строк правится --revisions раз (1-3 строки за правку) через update_snippet,
+затем восстанавливается каждая ревизия. Для сравнения считается размер полной копии текста
+на ревизию (как есть и сжатой). Прогон повторяется для каждого интервала снимков.
+
+Запуск из каталога src (по умолчанию SQLite в памяти):
+    python -m benchmarks.bench_revisions [--revisions 1000] [--intervals 10,50,200] [--dsn postgresql+asyncpg://...]
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+import zlib
+
+from sqlalchemy import select, func, delete
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from core.config import app_settings
+from db.db import create_sessionmaker
+from models import Base
+from models.model import Snippet
+from models.snippet_revision import SnippetRevision
+from schemas.snippet import SnippetCreate, SnippetUpdate
+from services.crud_snippet import create_snippet, update_snippet
+from services.revisions import get_revision
+
+
+def edit(lines: list[str], rng: random.Random) -> None:
+    # типичная правка: поменять, вставить или удалить пару строк
+    for _ in range(rng.randint(1, 3)):
+        position = rng.randrange(len(lines))
+        action = rng.random()
+        if action < 0.6:
+            lines[position] = f"    value_{rng.randrange(10 ** 6)} = compute({position}, {rng.random():.6f})\n"
+        elif action < 0.8 or len(lines) < 10:
+            lines.insert(position, f"    # note {rng.randrange(10 ** 6)}\n")
+        else:
+            lines.pop(position)
+
+
+def percentile(values: list[float], share: float) -> float:
+    return sorted(values)[min(len(values) - 1, int(len(values) * share))]
+
+
+async def run(session_factory, interval: int, revisions: int, lines_count: int) -> dict:
+    app_settings.revision_snapshot_interval = interval
+    rng = random.Random(42)
+    lines = [f"    line_{i} = compute({i}, {rng.random():.6f})\n" for i in range(lines_count)]
+    texts = []
+    async with session_factory() as session:
+        created = await create_snippet(session, SnippetCreate(title="bench", content="".join(lines)))
+        snippet_id = created["id"]
+        texts.append(created["content"])
+        started = time.perf_counter()
+        for _ in range(revisions - 1):
+            edit(lines, rng)
+            texts.append("".join(lines))
+            await update_snippet(session, snippet_id, SnippetUpdate(title="bench", content=texts[-1]))
+        update_time = (time.perf_counter() - started) / max(revisions - 1, 1)
+
+        stored = await session.scalar(select(func.sum(func.length(SnippetRevision.data)))
+                                      .where(SnippetRevision.snippet_id == snippet_id))
+        latencies = []
+        for number in range(1, revisions + 1):
+            started = time.perf_counter()
+            revision = await get_revision(session, snippet_id, number)
+            latencies.append(time.perf_counter() - started)
+            assert revision["content"] == texts[number - 1]
+        await session.execute(delete(SnippetRevision).where(SnippetRevision.snippet_id == snippet_id))
+        await session.execute(delete(Snippet).where(Snippet.id == snippet_id))
+        await session.commit()
+    raw = sum(len(text.encode()) for text in texts)
+    compressed = sum(len(zlib.compress(text.encode(), app_settings.content_compression_level)) for text in texts)
+    return {
+        "interval": interval,
+        "bytes_per_revision": stored / revisions,
+        "full_copy_bytes": raw / revisions,
+        "compressed_copy_bytes": compressed / revisions,
+        "update_ms": update_time * 1000,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "max_ms": max(latencies) * 1000,
+    }
+
+
+async def main(dsn: str, revisions: int, intervals: list[int], lines_count: int) -> None:
+    engine = create_async_engine(dsn)
+    if dsn.startswith("sqlite"):
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+    session_factory = create_sessionmaker(engine)
+    print(f"{revisions} revisions of a {lines_count}-line snippet, 1-3 lines changed per revision")
+    print(f"{'interval':>8} {'stored B/rev':>12} {'full copy':>10} {'zlib copy':>10} "
+          f"{'update ms':>10} {'read p50':>9} {'read p95':>9} {'read max':>9}")
+    for interval in intervals:
+        result = await run(session_factory, interval, revisions, lines_count)
+        print(f"{result['interval']:>8} {result['bytes_per_revision']:>12.0f} {result['full_copy_bytes']:>10.0f} "
+              f"{result['compressed_copy_bytes']:>10.0f} {result['update_ms']:>10.2f} {result['p50_ms']:>9.2f} "
+              f"{result['p95_ms']:>9.2f} {result['max_ms']:>9.2f}")
+    await engine.dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", default="sqlite+aiosqlite:///:memory:")
+    parser.add_argument("--revisions", type=int, default=1000)
+    parser.add_argument("--intervals", default="10,50,200")
+    parser.add_argument("--lines", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(main(args.dsn, args.revisions, [int(value) for value in args.intervals.split(",")], args.lines))
@@ -0,0 +1,126 @@
+"""Бенчмарк запуска: время импорта приложения по данным python -X importtime.
+
+Импорт выполняется в отдельном процессе несколько раз, в отчёт идёт медианный прогон:
+общее время, самые медленные модули и пакеты верхнего уровня (по собственному времени).
+
+Запуск из каталога src:
+    python -m benchmarks.import_time [--runs 5] [--top 15] [--json report.json] [--budget-ms 1500]
+
+Бюджет сравнивается с лучшим прогоном: медиана на загруженной машине колеблется на сотни мс.
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from typing import NamedTuple, Optional
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Бюджет на импорт main (совокупное время по importtime); его проверяют тесты
+IMPORT_BUDGET_MS = 1500
+# Тяжёлые модули, которые загружаются при первом использовании, а не при импорте main
+LAZY_MODULES = ("httpx", "rich", "jose", "passlib", "bcrypt", "asyncpg", "pygments")
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+class ImportRecord(NamedTuple):
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def parse_importtime(output: str) -> list[ImportRecord]:
+    """Строки вывода -X importtime -> записи по модулям (в порядке завершения импорта)"""
+    records = []
+    for line in output.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            records.append(ImportRecord(match[4], int(match[1]), int(match[2]), len(match[3]) // 2))
+    return records
+
+
+def run_importtime(module: str = "main") -> list[ImportRecord]:
+    """Импорт модуля в новом процессе с -X importtime"""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [SRC_DIR, os.path.dirname(SRC_DIR), env.get("PYTHONPATH")]))
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                               cwd=SRC_DIR, env=env, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{completed.stderr[-2000:]}")
+    return parse_importtime(completed.stderr)
+
+
+def build_report(records: list[ImportRecord], module: str = "main", top: int = 15) -> dict:
+    # модули интерпретатора (site, encodings) импортируются до приложения и в отчёт не входят
+    target = next((record for record in records if record.module == module and record.depth == 0), None)
+    if target is None:
+        raise ValueError(f"{module} is not in the importtime output")
+    app_records = records[:records.index(target) + 1]
+    start = len(app_records) - 1
+    while start > 0 and app_records[start - 1].depth > 0:
+        start -= 1
+    app_records = app_records[start:]
+    packages = defaultdict(int)
+    for record in app_records:
+        packages[record.module.split(".")[0]] += record.self_us
+    slowest = sorted(app_records, key=lambda record: record.self_us, reverse=True)[:top]
+    return {
+        "module": module,
+        "total_ms": target.cumulative_us / 1000,
+        "modules_imported": len(app_records),
+        "slowest_modules": [{"module": record.module, "self_ms": record.self_us / 1000,
+                             "cumulative_ms": record.cumulative_us / 1000} for record in slowest],
+        "packages": [{"package": package, "self_ms": self_us / 1000}
+                     for package, self_us in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]],
+        "loaded": sorted({record.module for record in app_records}),
+    }
+
+
+def measure(module: str = "main", runs: int = 5, top: int = 15) -> dict:
+    """Медианный по общему времени отчёт из нескольких прогонов (первый прогрев кэша .pyc не считается)"""
+    run_importtime(module)
+    reports = sorted((build_report(run_importtime(module), module, top) for _ in range(runs)),
+                     key=lambda report: report["total_ms"])
+    report = reports[len(reports) // 2]
+    report["runs_ms"] = [run["total_ms"] for run in reports]
+    # лучший прогон меньше всего зависит от соседней нагрузки на машину - по нему проверяется бюджет
+    report["best_ms"] = reports[0]["total_ms"]
+    report["stdev_ms"] = statistics.pstdev(report["runs_ms"])
+    return report
+
+
+def print_report(report: dict, budget_ms: Optional[float]) -> None:
+    print(f"import {report['module']}: {report['total_ms']:.1f} ms median, {report['best_ms']:.1f} ms best "
+          f"(runs: {', '.join(f'{ms:.0f}' for ms in report['runs_ms'])}), {report['modules_imported']} modules")
+    if budget_ms is not None:
+        print(f"budget: {budget_ms:.0f} ms - {'OK' if report['best_ms'] <= budget_ms else 'EXCEEDED'}")
+    print("\nslowest modules (self / cumulative, ms):")
+    for row in report["slowest_modules"]:
+        print(f"  {row['self_ms']:8.1f} {row['cumulative_ms']:8.1f}  {row['module']}")
+    print("\npackages (self, ms):")
+    for row in report["packages"]:
+        print(f"  {row['self_ms']:8.1f}  {row['package']}")
+    eager = [module for module in LAZY_MODULES if module in report["loaded"]]
+    if eager:
+        print(f"\nimported eagerly, expected lazy: {', '.join(eager)}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--json", help="куда сохранить отчёт")
+    parser.add_argument("--budget-ms", type=float, default=IMPORT_BUDGET_MS)
+    args = parser.parse_args()
+    result = measure(args.module, args.runs, args.top)
+    print_report(result, args.budget_ms)
+    if args.json:
+        with open(args.json, "w") as report_file:
+            json.dump(result, report_file, indent=2)
+    sys.exit(0 if result["best_ms"] <= args.budget_ms else 1)
@@ -0,0 +1,95 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+class LRUCache:
+    """Ограниченный по числу записей и по памяти LRU-кэш с TTL и счётчиками попаданий"""
+
+    def __init__(self,
+                 maxsize: int = 1024,
+                 ttl: Optional[float] = None,
+                 max_bytes: Optional[int] = None,
+                 weigher: Callable[[Any], int] = lambda value: 1):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.weigher = weigher
+        # ключ -> (значение, момент истечения, вес)
+        self._data: OrderedDict = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None, count: bool = True) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            if count:
+                self.misses += 1
+            return default
+        value, expires_at, _ = item
+        if expires_at is not None and expires_at <= time.monotonic():
+            # запись устарела - удаляем её и считаем промахом
+            self._remove(key)
+            if count:
+                self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        if count:
+            self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        if ttl is not None and ttl <= 0:
+            return
+        weight = self.weigher(value)
+        if self.max_bytes is not None and weight > self.max_bytes:
+            # запись больше всего кэша целиком не кэшируем
+            return
+        if key in self._data:
+            self._remove(key)
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        self._data[key] = (value, expires_at, weight)
+        self._bytes += weight
+        self._shrink()
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            return default
+        self._remove(key)
+        return item[0]
+
+    def clear(self) -> None:
+        self._data.clear()
+        self._bytes = 0
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def _remove(self, key: Hashable) -> None:
+        _, _, weight = self._data.pop(key)
+        self._bytes -= weight
+
+    def _shrink(self) -> None:
+        # вытесняем самые давно использованные записи, пока не уложимся в лимиты
+        while self._data and (len(self._data) > self.maxsize
+                              or (self.max_bytes is not None and self._bytes > self.max_bytes)):
+            key = next(iter(self._data))
+            self._remove(key)
+            self.evictions += 1
@@ -0,0 +1,104 @@
+import gzip
+import hashlib
+import zlib
+from typing import Optional
+
+from core.cache import LRUCache
+from core.config import app_settings
+from core.stats import register_stats
+
+# zstandard и brotli - необязательные зависимости: без них используются zlib и gzip
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+
+# --- Сжатие текста сниппетов при хранении ---
+
+def compress_content(content: str) -> tuple[Optional[bytes], Optional[str]]:
+    """Сжать текст, если он больше порога; возвращает (данные, кодек) или (None, None)"""
+    return compress_bytes(content.encode())
+
+
+def compress_bytes(raw: bytes, threshold: Optional[int] = None) -> tuple[Optional[bytes], Optional[str]]:
+    """То же для произвольных данных (снимки и дельты ревизий); порог по умолчанию - из настроек"""
+    if len(raw) < (app_settings.content_compression_threshold if threshold is None else threshold):
+        return None, None
+    codec = app_settings.content_compression_codec
+    if codec == "zstd" and zstandard is not None:
+        data = zstandard.ZstdCompressor(level=app_settings.content_compression_level).compress(raw)
+    else:
+        codec = "zlib"
+        data = zlib.compress(raw, app_settings.content_compression_level)
+    if len(data) >= len(raw):
+        # несжимаемые данные храним как есть
+        return None, None
+    return data, codec
+
+
+def decompress_content(data: bytes, codec: str) -> str:
+    return decompress_bytes(data, codec).decode()
+
+
+def decompress_bytes(data: bytes, codec: str) -> bytes:
+    if codec == "zlib":
+        return zlib.decompress(data)
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd-compressed snippets")
+        return zstandard.ZstdDecompressor().decompress(data)
+    raise ValueError(f"Unknown content codec: {codec}")
+
+
+# --- Сжатие ответов по Accept-Encoding ---
+
+# уже сжатые тела ответов: (хеш тела, кодировка) -> сжатые байты
+compressed_bodies = LRUCache(maxsize=app_settings.response_compression_cache_size,
+                             max_bytes=app_settings.response_compression_cache_max_bytes,
+                             weigher=len)
+register_stats("response_compression_cache", compressed_bodies.stats)
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Выбрать кодировку ответа из заголовка Accept-Encoding: br, если доступен, иначе gzip"""
+    accepted, refused = set(), set()
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        (accepted if quality > 0 else refused).add(name.strip())
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    if "*" in accepted:
+        # "*" - любая кодировка, кроме явно запрещённых через q=0
+        for encoding in ("gzip", "br") if brotli is not None else ("gzip",):
+            if encoding not in refused:
+                return encoding
+    return None
+
+
+def compress_body(body: bytes, encoding: str, digest: Optional[bytes] = None) -> bytes:
+    """Сжать тело ответа; результат кэшируется по хешу тела, чтобы не сжимать его на каждом запросе"""
+    key = (digest or hashlib.blake2b(body, digest_size=16).digest(), encoding)
+    compressed = compressed_bodies.get(key)
+    if compressed is None:
+        if encoding == "br":
+            compressed = brotli.compress(body, quality=app_settings.response_compression_level)
+        else:
+            compressed = gzip.compress(body, compresslevel=app_settings.response_compression_level, mtime=0)
+        compressed_bodies.set(key, compressed)
+    return compressed
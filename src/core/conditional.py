@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Mapping, Optional
+
+EPOCH = datetime(1970, 1, 1)
+# суффиксы, которые добавляются к ETag сжатого представления
+ENCODING_SUFFIXES = ("-gzip", "-br")
+
+
+class PreconditionFailed(Exception):
+    """Условие If-Match не выполнено: ресурс уже изменён"""
+
+
+def snippet_etag(snippet_id: int, updated_at: datetime, content_hash: Optional[str]) -> str:
+    """Сильный ETag версии сниппета: id, момент изменения и хеш текста"""
+    version = (updated_at.replace(tzinfo=None) - EPOCH) // timedelta(microseconds=1)
+    return f'"{snippet_id:x}-{version:x}-{(content_hash or "")[:16]}"'
+
+
+def parse_snippet_etag(tag: str) -> Optional[tuple[int, datetime, str]]:
+    """Разобрать ETag сниппета обратно в (id, updated_at, префикс хеша) для If-Match.
+
+    None - чужой формат или слабый ETag: If-Match требует сильного сравнения (RFC 9110),
+    слабое допустимо только в If-None-Match.
+    """
+    if tag.strip().startswith("W/"):
+        return None
+    parts = _opaque_tag(tag).strip('"').split("-")
+    if len(parts) != 3:
+        return None
+    try:
+        snippet_id, version = int(parts[0], 16), int(parts[1], 16)
+    except ValueError:
+        return None
+    return snippet_id, EPOCH + timedelta(microseconds=version), parts[2]
+
+
+def encoded_etag(etag: str, encoding: Optional[str]) -> str:
+    # у сжатого представления другие байты, поэтому и другой ETag
+    return f'{etag[:-1]}-{encoding}"' if encoding else etag
+
+
+def http_date(value: datetime) -> str:
+    return format_datetime(value.replace(tzinfo=timezone.utc, microsecond=0), usegmt=True)
+
+
+def _opaque_tag(tag: str) -> str:
+    tag = tag.strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    for suffix in ENCODING_SUFFIXES:
+        if tag.endswith(suffix + '"'):
+            return tag[:-len(suffix) - 1] + '"'
+    return tag
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    """Есть ли etag в списке заголовка If-Match / If-None-Match (без учёта сжатия)"""
+    if header.strip() == "*":
+        return True
+    return any(_opaque_tag(tag) == etag for tag in header.split(","))
+
+
+def is_conditional(headers: Mapping[str, str]) -> bool:
+    return "if-none-match" in headers or "if-modified-since" in headers
+
+
+def is_not_modified(headers: Mapping[str, str], etag: str, updated_at: datetime) -> bool:
+    """Можно ли ответить 304: If-None-Match приоритетнее If-Modified-Since"""
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    # Last-Modified передаётся с точностью до секунды
+    return updated_at.replace(tzinfo=timezone.utc, microsecond=0) <= since
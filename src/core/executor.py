@@ -0,0 +1,91 @@
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Optional
+
+
+class ExecutorSaturated(Exception):
+    """Пул занят, а очередь ожидания заполнена"""
+    pass
+
+
+def _timed_call(fn: Callable, submitted_at: float, *args: Any) -> tuple[Any, float, float]:
+    # выполняется внутри пула: меряем время ожидания в очереди и время работы функции
+    started_at = time.monotonic()
+    result = fn(*args)
+    return result, started_at - submitted_at, time.monotonic() - started_at
+
+
+class BoundedExecutor:
+    """Пул потоков/процессов для CPU-тяжёлых задач с ограниченной очередью и метриками.
+
+    Одновременно в работе и в очереди может быть не больше max_workers + max_queue задач,
+    остальные сразу отклоняются с ExecutorSaturated, не дожидаясь освобождения пула.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int, processes: bool = False,
+                 start_method: Optional[str] = None):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.processes = processes
+        # способ запуска процессов пула (fork, forkserver, spawn); None - по умолчанию платформы
+        self.start_method = start_method
+        self._executor: Optional[Executor] = None
+        self._in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+        self.run_time_total = 0.0
+        self.run_time_max = 0.0
+
+    def _get_executor(self) -> Executor:
+        # пул создаётся лениво, уже внутри воркера uvicorn
+        if self._executor is None:
+            if self.processes:
+                context = multiprocessing.get_context(self.start_method) if self.start_method else None
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix=self.name)
+        return self._executor
+
+    async def run(self, fn: Callable, *args: Any) -> Any:
+        if self._in_flight >= self.max_workers + self.max_queue:
+            self.rejected += 1
+            raise ExecutorSaturated(f"{self.name} executor is saturated")
+        self._in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            result, wait_time, run_time = await loop.run_in_executor(
+                self._get_executor(), partial(_timed_call, fn, time.monotonic(), *args))
+        finally:
+            self._in_flight -= 1
+        self.completed += 1
+        self.wait_time_total += wait_time
+        self.wait_time_max = max(self.wait_time_max, wait_time)
+        self.run_time_total += run_time
+        self.run_time_max = max(self.run_time_max, run_time)
+        return result
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        completed = self.completed or 1
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_flight": self._in_flight,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "queue_wait_avg_ms": self.wait_time_total / completed * 1000,
+            "queue_wait_max_ms": self.wait_time_max * 1000,
+            "run_time_avg_ms": self.run_time_total / completed * 1000,
+            "run_time_max_ms": self.run_time_max * 1000,
+        }
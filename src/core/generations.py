@@ -0,0 +1,65 @@
+import fcntl
+import mmap
+import os
+import struct
+import threading
+import zlib
+from typing import Optional
+
+from core.config import run_dir
+
+GENERATION = struct.Struct("<Q")
+
+
+class GenerationTable:
+    """Счётчики поколений ключей в файле каталога запуска, общие для всех воркеров.
+
+    Запись кэша помнит поколение своего ключа, взятое до чтения из БД; запись в БД после
+    коммита увеличивает поколение, и во всех воркерах записи с прежним поколением
+    перестают быть попаданием. Ключи делят слоты по crc32 (hash() строк в разных
+    процессах разный): совпадение слотов даёт лишний промах, но не устаревшие данные.
+
+    Файл отображается в память при первом обращении в процессе: чтение поколения -
+    без системных вызовов, увеличение - под flock (дескриптор свой у каждого процесса,
+    иначе после fork блокировка общая и ничего не исключает).
+    """
+
+    def __init__(self, name: str, slots: int = 65536, path: Optional[str] = None):
+        self.name = name
+        self.slots = slots
+        self.path = path
+        self._pid: Optional[int] = None
+        self._fd: Optional[int] = None
+        self._mapped: Optional[mmap.mmap] = None
+        self._lock = threading.Lock()
+
+    def _map(self) -> mmap.mmap:
+        if self._pid != os.getpid():
+            if self.path is None:
+                self.path = os.path.join(run_dir(), self.name)
+            size = self.slots * GENERATION.size
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                # новый файл заполняется нулями - все поколения нулевые
+                if os.fstat(fd).st_size < size:
+                    os.ftruncate(fd, size)
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            self._fd, self._mapped, self._pid = fd, mmap.mmap(fd, size), os.getpid()
+        return self._mapped
+
+    def _offset(self, key: str) -> int:
+        return zlib.crc32(key.encode()) % self.slots * GENERATION.size
+
+    def get(self, key: str) -> int:
+        return GENERATION.unpack_from(self._map(), self._offset(key))[0]
+
+    def bump(self, key: str) -> None:
+        mapped, offset = self._map(), self._offset(key)
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                GENERATION.pack_into(mapped, offset, GENERATION.unpack_from(mapped, offset)[0] + 1)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
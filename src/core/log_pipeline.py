@@ -0,0 +1,211 @@
+import copy
+import logging
+import logging.handlers
+import queue
+import random
+import time
+from datetime import datetime, timezone
+
+import orjson
+
+from core.config import app_settings
+from core.stats import register_stats
+
+# стандартные поля LogRecord: всё остальное пришло через extra= и попадает в JSON отдельными ключами
+_RECORD_FIELDS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+
+class PipelineStats:
+    """Счётчики конвейера логов: сколько записей принято, отброшено, отсеяно и записано"""
+
+    def __init__(self):
+        self.enqueued = 0
+        self.dropped = 0
+        self.sampled_out = 0
+        self.batches = 0
+        self.written = 0
+
+    def stats(self) -> dict:
+        return {
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "sampled_out": self.sampled_out,
+            "batches": self.batches,
+            "written": self.written,
+            "avg_batch": self.written / self.batches if self.batches else 0.0,
+        }
+
+
+pipeline_stats = PipelineStats()
+register_stats("logging", pipeline_stats.stats)
+
+
+class JSONFormatter(logging.Formatter):
+    """Одна запись - одна строка JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "module": record.module,
+            "line": record.lineno,
+            "process": record.process,
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload["exc"] = record.exc_text
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS:
+                payload[key] = value
+        return orjson.dumps(payload, default=str).decode()
+
+
+class SamplingFilter(logging.Filter):
+    """Пропускает лишь долю записей шумных логгеров; WARNING и выше не отсеиваются никогда"""
+
+    def __init__(self, rates: dict[str, float] | None = None):
+        super().__init__()
+        # самый длинный префикс имени логгера побеждает: "uvicorn.access" точнее "uvicorn"
+        self.rates = sorted((rates if rates is not None else app_settings.log_sampling).items(),
+                            key=lambda item: len(item[0]), reverse=True)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        for prefix, rate in self.rates:
+            if record.name == prefix or record.name.startswith(prefix + "."):
+                if random.random() < rate:
+                    return True
+                pipeline_stats.sampled_out += 1
+                return False
+        return True
+
+
+def bounded_queue() -> queue.Queue:
+    return queue.Queue(maxsize=app_settings.log_queue_size)
+
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler, который никогда не блокирует: при полной очереди запись отбрасывается.
+
+    log_queue_drop_policy: "drop_new" - отбросить новую запись, "drop_oldest" - самую старую в очереди.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # как в QueueHandler, но трассировка остаётся в exc_text, а не склеивается с сообщением,
+        # и extra-поля записи сохраняются для JSON
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pipeline_stats.dropped += 1
+            if app_settings.log_queue_drop_policy != "drop_oldest":
+                return
+            try:
+                self.queue.get_nowait()
+                self.queue.put_nowait(record)
+            except (queue.Empty, queue.Full):
+                return
+        pipeline_stats.enqueued += 1
+
+
+class BatchingQueueListener(logging.handlers.QueueListener):
+    """Слушатель очереди, который забирает записи пачками: файл пишется и сбрасывается раз на пачку"""
+
+    def _monitor(self) -> None:
+        q = self.queue
+        batch_size = app_settings.log_batch_size
+        while True:
+            batch = [self.dequeue(True)]
+            while len(batch) < batch_size:
+                try:
+                    batch.append(self.dequeue(False))
+                except queue.Empty:
+                    break
+            records = [record for record in batch if record is not self._sentinel]
+            if records:
+                self.handle_batch(records)
+            for _ in batch:
+                q.task_done()
+            if len(records) != len(batch):
+                break
+
+    def handle_batch(self, records: list[logging.LogRecord]) -> None:
+        pipeline_stats.batches += 1
+        pipeline_stats.written += len(records)
+        for handler in self.handlers:
+            selected = records
+            if self.respect_handler_level:
+                selected = [record for record in records if record.levelno >= handler.level]
+            if not selected:
+                continue
+            if isinstance(handler, BatchingFileHandler):
+                handler.handle_batch(selected)
+            else:
+                for record in selected:
+                    handler.handle(record)
+
+    def enqueue_sentinel(self) -> None:
+        # очередь ограничена: ждём места, слушатель её разбирает
+        self.queue.put(self._sentinel)
+
+    def stop(self) -> None:
+        # stop вызывается и из lifespan, и через atexit
+        if self._thread is not None:
+            super().stop()
+
+
+class BatchingFileHandler(logging.handlers.RotatingFileHandler):
+    """Файл логов с ротацией по размеру и по времени и записью пачками"""
+
+    def __init__(self, filename: str, maxBytes: int = 0, backupCount: int = 0,
+                 rotate_seconds: float = 0, encoding: str | None = "utf-8"):
+        super().__init__(filename, maxBytes=maxBytes, backupCount=backupCount, encoding=encoding, delay=True)
+        self.rotate_seconds = rotate_seconds
+        self.rollover_at = time.time() + rotate_seconds if rotate_seconds else None
+
+    def _rollover_due(self, size: int) -> bool:
+        if self.rollover_at is not None and time.time() >= self.rollover_at:
+            return True
+        return bool(self.maxBytes) and self.stream.tell() + size > self.maxBytes
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if self.stream is None:
+            self.stream = self._open()
+        return self._rollover_due(len(self.format(record)) + len(self.terminator))
+
+    def doRollover(self) -> None:
+        super().doRollover()
+        if self.rotate_seconds:
+            self.rollover_at = time.time() + self.rotate_seconds
+
+    def handle_batch(self, records: list[logging.LogRecord]) -> None:
+        records = [record for record in records if self.filter(record)]
+        if not records:
+            return
+        data = "".join(self.format(record) + self.terminator for record in records)
+        self.acquire()
+        try:
+            if self.stream is None:
+                self.stream = self._open()
+            if self.stream.tell() and self._rollover_due(len(data)):
+                self.doRollover()
+                self.stream = self._open()
+            self.stream.write(data)
+            self.stream.flush()
+        except Exception:
+            self.handleError(records[-1])
+        finally:
+            self.release()
@@ -1,7 +1,12 @@
-
+import logging.config
 import os
-log_dir = os.path.abspath("../logs")
-os.makedirs(log_dir, exist_ok=True)
+
+from core.config import app_settings
+from core.log_pipeline import BatchingQueueListener, BoundedQueueHandler, SamplingFilter, bounded_queue
+
+# абсолютный путь: не зависит от каталога, из которого запущен сервер
+log_dir = app_settings.log_dir or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "logs")
 LOGGING_CONFIG = {
   "version": 1,
   "disable_existing_loggers": False,
@@ -10,9 +15,8 @@ LOGGING_CONFIG = {
       "format": "%(levelname)s: %(message)s",
       "datefmt": "%Y-%m-%dT%H:%M:%S%z"
     },
-    "detailed": {
-      "format": "[%(levelname)s|%(module)s|L%(lineno)d] %(asctime)s: %(message)s",
-      "datefmt": "%Y-%m-%dT%H:%M:%S%z"
+    "json": {
+      "()": "core.log_pipeline.JSONFormatter"
     }
   },
   "handlers": {
@@ -23,28 +27,44 @@ LOGGING_CONFIG = {
       "stream": "ext://sys.stderr"
     },
     "file": {
-      "class": "logging.handlers.RotatingFileHandler",
+      "class": "core.log_pipeline.BatchingFileHandler",
       "level": "DEBUG",
-      "formatter": "detailed",
-      "filename": "../logs/my_app.log",
-      "maxBytes": 10000,
-      "backupCount": 3
-    },
-    "queue_handler": {
-      "class": "logging.handlers.QueueHandler",
-      "handlers": [
-        "stderr",
-        "file",
-      ],
-      "respect_handler_level": True
+      "formatter": "json",
+      "filename": os.path.join(log_dir, "my_app.log"),
+      "maxBytes": app_settings.log_max_bytes,
+      "backupCount": app_settings.log_backup_count,
+      "rotate_seconds": app_settings.log_rotate_seconds
     }
   },
   "loggers": {
     "root": {
-      "level": "DEBUG",
+      "level": app_settings.log_level,
       "handlers": [
-        "queue_handler"
+        "stderr",
+        "file"
       ]
     }
   }
-}
\ No newline at end of file
+}
+
+
+def configure_logging() -> BoundedQueueHandler:
+    """Каталог логов создаётся при запуске приложения, а не при импорте модуля.
+
+    Обработчик очереди собирается вручную: ключи queue и listener в dictConfig есть только
+    с Python 3.12. dictConfig вешает конечные обработчики на корневой логгер, отсюда они
+    переезжают за очередь; слушатель запускает lifespan приложения.
+    """
+    os.makedirs(log_dir, exist_ok=True)
+    logging.config.dictConfig(LOGGING_CONFIG)
+    root = logging.getLogger()
+    handlers = list(root.handlers)
+    for handler in handlers:
+        root.removeHandler(handler)
+    # очередь ограничена: при переполнении запись отбрасывается, а не блокирует обработчик запроса
+    queue_handler = BoundedQueueHandler(bounded_queue())
+    queue_handler.set_name("queue_handler")
+    queue_handler.addFilter(SamplingFilter())
+    queue_handler.listener = BatchingQueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    root.addHandler(queue_handler)
+    return queue_handler
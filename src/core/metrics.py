@@ -0,0 +1,167 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from bisect import bisect_left
+from typing import Optional
+
+from core.config import app_settings, run_dir
+
+logger = logging.getLogger(__name__)
+
+
+class RequestMetrics:
+    """Счётчики запросов и гистограммы времени ответа по шаблону маршрута в одном воркере"""
+
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = tuple(sorted(buckets))
+        # (method, route, status) -> число запросов
+        self.requests: dict[tuple[str, str, str], int] = {}
+        # (method, route) -> [счётчики корзин..., +Inf, сумма, число]
+        self.durations: dict[tuple[str, str], list] = {}
+
+    def observe(self, method: str, route: str, status: int, seconds: float) -> None:
+        key = (method, route, str(status))
+        self.requests[key] = self.requests.get(key, 0) + 1
+        histogram = self.durations.get((method, route))
+        if histogram is None:
+            histogram = self.durations[(method, route)] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+        histogram[bisect_left(self.buckets, seconds)] += 1
+        histogram[-2] += seconds
+        histogram[-1] += 1
+
+    def snapshot(self) -> dict:
+        return {
+            "buckets": list(self.buckets),
+            "requests": [[*key, count] for key, count in self.requests.items()],
+            "durations": [[*key, histogram] for key, histogram in self.durations.items()],
+        }
+
+    def merge(self, snapshot: dict) -> None:
+        """Добавить к счётчикам снимок другого воркера"""
+        if tuple(snapshot["buckets"]) != self.buckets:
+            logger.warning("Skipping metrics snapshot with different buckets")
+            return
+        for method, route, status, count in snapshot["requests"]:
+            key = (method, route, status)
+            self.requests[key] = self.requests.get(key, 0) + count
+        for method, route, histogram in snapshot["durations"]:
+            total = self.durations.get((method, route))
+            if total is None:
+                self.durations[(method, route)] = list(histogram)
+            else:
+                for index, value in enumerate(histogram):
+                    total[index] += value
+
+    def render(self) -> str:
+        """Текстовый формат Prometheus"""
+        lines = ["# HELP http_requests_total Total number of HTTP requests.",
+                 "# TYPE http_requests_total counter"]
+        for (method, route, status), count in sorted(self.requests.items()):
+            lines.append(f"http_requests_total{{{_labels(method=method, route=route, status=status)}}} {count}")
+        lines += ["# HELP http_request_duration_seconds HTTP request latency.",
+                  "# TYPE http_request_duration_seconds histogram"]
+        bounds = [_number(bound) for bound in self.buckets] + ["+Inf"]
+        for (method, route), histogram in sorted(self.durations.items()):
+            labels = _labels(method=method, route=route)
+            cumulative = 0
+            for bound, count in zip(bounds, histogram):
+                cumulative += count
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"http_request_duration_seconds_sum{{{labels}}} {histogram[-2]}")
+            lines.append(f"http_request_duration_seconds_count{{{labels}}} {histogram[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+def _number(value: float) -> str:
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels: str) -> str:
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items())
+
+
+def metrics_dir() -> str:
+    # снимки всех воркеров одного запуска, и только его
+    if app_settings.metrics_dir:
+        return app_settings.metrics_dir
+    return os.path.join(run_dir(), "metrics")
+
+
+# (pid, имя файла снимка): имя выбирается при первом снимке процесса
+_snapshot_name = (0, "")
+
+
+def snapshot_name() -> str:
+    global _snapshot_name
+    pid = os.getpid()
+    if _snapshot_name[0] != pid:
+        # pid переиспользуется ОС: новый воркер с тем же pid пишет в свой файл,
+        # а не затирает итоги завершившегося (иначе счётчики пошли бы назад)
+        _snapshot_name = (pid, f"{pid}-{time.time_ns()}.json")
+    return _snapshot_name[1]
+
+
+request_metrics = RequestMetrics(app_settings.metrics_buckets)
+
+
+def write_snapshot() -> None:
+    """Записать снимок метрик воркера в общий каталог (атомарно, через переименование)"""
+    directory = metrics_dir()
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, snapshot_name())
+    with open(path + ".tmp", "w") as file:
+        json.dump(request_metrics.snapshot(), file)
+    os.replace(path + ".tmp", path)
+
+
+def render_all_workers() -> str:
+    """Метрики, просуммированные по снимкам всех воркеров (включая завершившиеся)"""
+    write_snapshot()
+    total = RequestMetrics(request_metrics.buckets)
+    directory = metrics_dir()
+    for name in os.listdir(directory):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(directory, name)) as file:
+                total.merge(json.load(file))
+        except (OSError, ValueError) as ex:
+            logger.warning(f"Cannot read metrics snapshot {name}: {ex}")
+    return total.render()
+
+
+class SnapshotWriter:
+    """Фоновая задача, периодически сбрасывающая снимок метрик воркера"""
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(app_settings.metrics_flush_interval)
+            try:
+                write_snapshot()
+            except OSError as ex:
+                logger.warning(f"Cannot write metrics snapshot: {ex}")
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        try:
+            # последний снимок, чтобы не потерять запросы завершающегося воркера
+            write_snapshot()
+        except OSError as ex:
+            logger.warning(f"Cannot write metrics snapshot: {ex}")
+
+
+snapshot_writer = SnapshotWriter()
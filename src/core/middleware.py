@@ -0,0 +1,122 @@
+import logging
+import math
+import time
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core.config import app_settings
+from core.metrics import request_metrics
+from db.profiler import RequestProfile, current_profile, route_sql_stats
+from db.replicas import READ_PRIMARY_COOKIE, WriteMarker, current_write_marker
+
+logger = logging.getLogger("root")
+
+# метка для запросов, не совпавших ни с одним маршрутом (404 по произвольным путям)
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+class ErrorAndMetricsMiddleware:
+    """ASGI-middleware: ошибки приложения -> JSON-ответ, метрики по шаблону маршрута.
+
+    В отличие от BaseHTTPMiddleware не создаёт задач и потоков тела ответа на каждый запрос.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+        response_started = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status, response_started
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception as exc:
+            if response_started:
+                # заголовки уже ушли клиенту - ответ заменить нельзя
+                raise
+            if isinstance(exc, HTTPException):
+                response = JSONResponse(status_code=exc.status_code, content={"message": exc.detail})
+            else:
+                logger.error(f"{scope['path']} | Error in application: {exc}")
+                response = JSONResponse(status_code=500, content={"message": "Internal server error"})
+            await response(scope, receive, send_wrapper)
+        finally:
+            # шаблон пути (/snippets/shared/{shared_url}) вместо самого пути держит число рядов метрик малым
+            route = scope.get("route")
+            request_metrics.observe(scope["method"], getattr(route, "path", UNMATCHED_ROUTE),
+                                    status, time.perf_counter() - started)
+
+
+class SQLProfilerMiddleware:
+    """ASGI-middleware: профиль SQL-запросов каждого HTTP-запроса.
+
+    Сводка копится по шаблонам маршрутов, а при sql_profile_header отдаётся в заголовке X-SQL-Profile.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not app_settings.sql_profiler_enabled:
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile()
+        token = current_profile.set(profile)
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start" and app_settings.sql_profile_header:
+                message["headers"] = [*message.get("headers", []),
+                                      (b"x-sql-profile", profile.header().encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_profile.reset(token)
+            route = scope.get("route")
+            route_sql_stats.add(getattr(route, "path", UNMATCHED_ROUTE), profile)
+
+
+class ReadYourWritesMiddleware:
+    """ASGI-middleware: клиент, который только что записал данные, получает куку,
+    и read_your_writes_seconds его чтения идут в основную БД, а не в отстающие реплики.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not app_settings.postgres_replica_dsns:
+            await self.app(scope, receive, send)
+            return
+
+        marker = WriteMarker()
+        token = current_write_marker.set(marker)
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start" and marker.written:
+                window = app_settings.read_your_writes_seconds
+                cookie = (f"{READ_PRIMARY_COOKIE}={time.time() + window:.3f}; Max-Age={math.ceil(window)}; "
+                          f"Path=/; HttpOnly; SameSite=Lax")
+                message["headers"] = [*message.get("headers", []), (b"set-cookie", cookie.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_write_marker.reset(token)
@@ -0,0 +1,144 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from core.config import app_settings, run_dir
+
+logger = logging.getLogger(__name__)
+
+# Ведро пополняется непрерывно: tokens + прошедшее время * rate, не больше capacity.
+# Запрос пропускается, если в ведре есть целый токен, и забирает его; отказ токены не тратит.
+# Всё в одном UPSERT ... RETURNING, поэтому проверка атомарна между воркерами без явных блокировок.
+TAKE_SQL = """
+INSERT INTO buckets (key, capacity, rate, tokens, updated, allowed)
+VALUES {values}
+ON CONFLICT (key) DO UPDATE SET
+    tokens = CASE WHEN min(excluded.capacity, tokens + (excluded.updated - updated) * excluded.rate) >= 1
+                  THEN min(excluded.capacity, tokens + (excluded.updated - updated) * excluded.rate) - 1
+                  ELSE min(excluded.capacity, tokens + (excluded.updated - updated) * excluded.rate) END,
+    allowed = min(excluded.capacity, tokens + (excluded.updated - updated) * excluded.rate) >= 1,
+    capacity = excluded.capacity,
+    rate = excluded.rate,
+    updated = excluded.updated
+RETURNING tokens, rate, allowed
+"""
+# ведра, простоявшие дольше этого, давно полны - их можно удалять
+STALE_BUCKET_SECONDS = 3600
+CLEANUP_EVERY = 10000
+
+
+class LocalBuckets:
+    """Те же ведра в памяти процесса - запасной вариант, пока общий файл занят или недоступен.
+
+    Ведро процесса не знает, сколько токенов уже потрачено в общем ведре и в других воркерах,
+    поэтому начинается пустым и только пополняется: полное ведро в каждом воркере дало бы
+    ёмкость, умноженную на число воркеров, как раз во время флуда. Когда общий файл снова
+    отвечает, ведра процесса для этих ключей забываются, и следующий отказ файла снова
+    начинается с пустых.
+    """
+
+    def __init__(self):
+        # ключ -> (токены, момент пересчёта)
+        self._buckets: dict[str, tuple[float, float]] = {}
+        self._checks = 0
+
+    def take(self, buckets: list[tuple[str, float, float]], now: float) -> list[tuple[float, float, bool]]:
+        self._checks += 1
+        if self._checks % CLEANUP_EVERY == 0:
+            self._buckets = {key: state for key, state in self._buckets.items()
+                             if state[1] >= now - STALE_BUCKET_SECONDS}
+        rows = []
+        for key, capacity, rate in buckets:
+            tokens, updated = self._buckets.get(key, (0.0, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            self._buckets[key] = (tokens - 1 if allowed else tokens, now)
+            rows.append((tokens - 1 if allowed else tokens, rate, allowed))
+        return rows
+
+    def forget(self, buckets: list[tuple[str, float, float]]) -> None:
+        if self._buckets:
+            for key, _, _ in buckets:
+                self._buckets.pop(key, None)
+
+
+class TokenBucketStore:
+    """Token bucket в файле SQLite, общем для всех воркеров сервера.
+
+    Соединение открывается при первой проверке, то есть уже в процессе воркера после fork;
+    без path файл берётся из каталога запуска (rate_limit_path) тогда же.
+    Проверка синхронная и идёт в цикле событий, поэтому ожидание блокировки файла короткое:
+    если файл занят другими воркерами дольше busy_timeout_ms (или недоступен), ведра берутся
+    из памяти процесса (LocalBuckets). Они начинаются пустыми, так что лимит на это время
+    становится строже, но не снимается.
+    """
+
+    def __init__(self, path: Optional[str] = None, busy_timeout_ms: int = 5):
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        self._connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._local = LocalBuckets()
+        self.allowed = 0
+        self.limited = 0
+        self.errors = 0
+        self.check_time_total = 0.0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            if self.path is None:
+                self.path = rate_limit_path()
+            connection = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False,
+                                         timeout=self.busy_timeout_ms / 1000)
+            # WAL и synchronous=OFF: счётчики не переживают падение ОС, зато запись - микросекунды
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=OFF")
+            connection.execute("CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, capacity REAL, "
+                               "rate REAL, tokens REAL, updated REAL, allowed INTEGER)")
+            self._connection = connection
+        return self._connection
+
+    def take(self, buckets: list[tuple[str, float, float]], now: Optional[float] = None) -> float:
+        """Взять по токену из каждого ведра (ключ, ёмкость, пополнение в секунду).
+
+        Возвращает 0, если запрос разрешён, иначе - через сколько секунд повторить.
+        """
+        now = time.time() if now is None else now
+        started = time.perf_counter()
+        values = ", ".join("(?, ?, ?, ?, ?, 1)" for _ in buckets)
+        params = [value for key, capacity, rate in buckets for value in (key, capacity, rate, capacity - 1, now)]
+        try:
+            with self._lock:
+                rows = self._connect().execute(TAKE_SQL.format(values=values), params).fetchall()
+                self._local.forget(buckets)
+                if (self.allowed + self.limited) % CLEANUP_EVERY == CLEANUP_EVERY - 1:
+                    self._connect().execute("DELETE FROM buckets WHERE updated < ?", (now - STALE_BUCKET_SECONDS,))
+        except sqlite3.Error as ex:
+            self.errors += 1
+            # логируем первую ошибку и затем каждую тысячную, а не каждую проверку во время флуда
+            if self.errors % 1000 == 1:
+                logger.warning(f"Rate limit store is unavailable, using per-worker buckets: {ex}")
+            rows = self._local.take(buckets, now)
+        finally:
+            self.check_time_total += time.perf_counter() - started
+        retry_after = max((0.0 if allowed else (1 - tokens) / rate) for tokens, rate, allowed in rows)
+        if retry_after > 0:
+            self.limited += 1
+        else:
+            self.allowed += 1
+        return retry_after
+
+    def stats(self) -> dict:
+        checks = self.allowed + self.limited
+        return {"path": self.path, "allowed": self.allowed, "limited": self.limited, "errors": self.errors,
+                "check_avg_us": self.check_time_total / (checks or 1) * 1_000_000}
+
+
+def rate_limit_path() -> str:
+    # как и снимки метрик: файл в каталоге запуска, общий для его воркеров
+    if app_settings.rate_limit_db:
+        return app_settings.rate_limit_db
+    return os.path.join(run_dir(), "ratelimit.db")
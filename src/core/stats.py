@@ -0,0 +1,13 @@
+from typing import Callable, Dict
+
+# Реестр внутренней статистики: компоненты (кэши, пулы) регистрируют функцию,
+# возвращающую словарь со своими счётчиками, а /internal/stats собирает их вместе
+_providers: Dict[str, Callable[[], dict]] = {}
+
+
+def register_stats(name: str, provider: Callable[[], dict]) -> None:
+    _providers[name] = provider
+
+
+def collect_stats() -> dict:
+    return {name: provider() for name, provider in _providers.items()}
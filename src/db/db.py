@@ -1,9 +1,20 @@
-from fastapi import Depends
+import functools
+import inspect
+import time
+
+from fastapi import Depends, Request
+from fastapi.routing import APIRoute
+from sqlalchemy import exc
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import (async_sessionmaker,
                                     create_async_engine,
                                     AsyncSession, AsyncEngine, AsyncConnection)
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
-from core.config import app_settings
+from core.config import app_settings, uvicorn_options
+from core.stats import register_stats
+from db.profiler import instrument_engine
+from db.replicas import ReplicaSet, read_session, read_primary_requested
 from typing import Union, Callable, Annotated
 
 
@@ -11,14 +22,44 @@ class InternalError(Exception):
     pass
 
 
-# Функция get_async_session используется для получения асинхронной сессии SQLAlchemy
+# Функция get_async_session используется для получения асинхронной сессии SQLAlchemy.
+# Соединение из пула сессия берёт только при первом запросе к БД, так что ответы
+# из кэша и отказы в доступе (зависимости маршрута решаются раньше) пул не трогают
 async def get_async_session() -> AsyncSession:
-    async with async_session() as session:
+    async with _lazy("async_session")() as session:
         try:
             yield session
-        except InternalError:
-            # в случае ошибки будет произведён откат транзакции
+        except Exception:
+            # при любой ошибке откатываем транзакцию, чтобы соединение не вернулось в пул в сбойной
             await session.rollback()
+            raise
+
+
+class SessionRoute(APIRoute):
+    """Маршрут, который закрывает сессию запроса сразу после обработчика.
+
+    Соединение возвращается в пул до сериализации, сжатия и отправки ответа,
+    а не при выходе из зависимости get_async_session.
+    """
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        if inspect.iscoroutinefunction(endpoint):
+            endpoint = _release_sessions_after(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+
+def _release_sessions_after(endpoint: Callable) -> Callable:
+    # functools.wraps сохраняет сигнатуру: FastAPI строит зависимости по __wrapped__
+    @functools.wraps(endpoint)
+    async def wrapper(*args, **kwargs):
+        try:
+            return await endpoint(*args, **kwargs)
+        finally:
+            for value in kwargs.values():
+                if isinstance(value, AsyncSession):
+                    # без транзакции close() ничего не делает, незавершённая откатывается
+                    await value.close()
+    return wrapper
 
 
 # Функция create_sessionmaker создаёт фабрику сессий для асинхронной работы с базой данных
@@ -33,11 +74,154 @@ def create_sessionmaker(
     )
 
 
-# Создание асинхронного движка SQLAlchemy для работы с PostgreSQL
-engine = create_async_engine(app_settings.postgres_dsn.unicode_string())
+class PoolStats:
+    """Счётчики пула соединений: ожидание выдачи соединения, переполнения и таймауты"""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.checkout_wait_total = 0.0
+        self.checkout_wait_max = 0.0
+        self.overflow_events = 0
+        self.timeouts = 0
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Пул, который считает время ожидания соединения, переполнения и таймауты"""
+    pool_stats: PoolStats
+
+    def _do_get(self):
+        overflow_before = self.overflow()
+        started_at = time.monotonic()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.pool_stats.timeouts += 1
+            raise
+        finally:
+            wait = time.monotonic() - started_at
+            self.pool_stats.checkout_wait_total += wait
+            self.pool_stats.checkout_wait_max = max(self.pool_stats.checkout_wait_max, wait)
+        self.pool_stats.checkouts += 1
+        if self.overflow() > max(overflow_before, 0):
+            # пул исчерпан, открыто соединение сверх pool_size
+            self.pool_stats.overflow_events += 1
+        return connection
+
+
+def instrumented_pool_class() -> type[InstrumentedQueuePool]:
+    # один класс на движок, чтобы счётчики переживали пересоздание пула (recreate)
+    return type("InstrumentedQueuePool", (InstrumentedQueuePool,), {"pool_stats": PoolStats()})
+
+
+def create_engine_from_settings(dsn: str) -> AsyncEngine:
+    """Движок с пулом, настроенным через AppSettings"""
+    url = make_url(dsn)
+    options = {}
+    if url.get_backend_name() == "postgresql":
+        options.update(
+            poolclass=instrumented_pool_class(),
+            pool_size=app_settings.db_pool_size,
+            max_overflow=app_settings.db_max_overflow,
+            pool_timeout=app_settings.db_pool_timeout,
+            pool_recycle=app_settings.db_pool_recycle,
+            pool_pre_ping=app_settings.db_pool_pre_ping,
+            # кэш подготовленных выражений: asyncpg и адаптер SQLAlchemy (0 - для pgbouncer)
+            connect_args={"statement_cache_size": app_settings.db_statement_cache_size},
+        )
+        url = url.update_query_dict({"prepared_statement_cache_size": str(app_settings.db_statement_cache_size)})
+    return create_async_engine(url, **options)
+
+
+def get_pool_stats(bind_engine: AsyncEngine) -> dict:
+    """Счётчики пула одного движка; max_connections_* - соединения только этого пула"""
+    pool = bind_engine.pool
+    stats = {"pool": type(pool).__name__}
+    if not isinstance(pool, InstrumentedQueuePool):
+        return stats
+    counters = pool.pool_stats
+    per_worker = pool.size() + max(pool._max_overflow, 0)
+    stats.update({
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "in_use": pool.checkedout(),
+        "overflow": max(pool.overflow(), 0),
+        "checkouts": counters.checkouts,
+        "checkout_wait_avg_ms": counters.checkout_wait_total / (counters.checkouts or 1) * 1000,
+        "checkout_wait_max_ms": counters.checkout_wait_max * 1000,
+        "overflow_events": counters.overflow_events,
+        "timeouts": counters.timeouts,
+        # для расчёта max_connections в PostgreSQL: верхняя граница на воркер и на все воркеры
+        "max_connections_per_worker": per_worker,
+        "max_connections_all_workers": per_worker * uvicorn_options["workers"],
+    })
+    return stats
+
+
+def server_max_connections(primary: AsyncEngine, replicas: list[AsyncEngine]) -> int:
+    """Верхняя граница соединений всех воркеров к серверу основной БД:
+    её пул и пулы реплик с тем же host:port (например, другие базы того же сервера)
+    """
+    server = (primary.url.host, primary.url.port)
+    engines = [primary] + [replica for replica in replicas if (replica.url.host, replica.url.port) == server]
+    return sum(get_pool_stats(bind_engine).get("max_connections_all_workers", 0) for bind_engine in engines)
+
+
+def _create_engines() -> None:
+    # создаются только недостающие объекты: подменённые заранее (тесты) остаются
+    global engine, async_session, replica_engines, replica_set
+    if "engine" not in globals():
+        # Создание асинхронного движка SQLAlchemy для работы с PostgreSQL
+        engine = create_engine_from_settings(app_settings.postgres_dsn)
+        # каждый SQL-запрос учитывается в профиле текущего HTTP-запроса
+        instrument_engine(engine)
+    if "async_session" not in globals():
+        # Создание фабрики для сессий
+        async_session = create_sessionmaker(engine)
+    if "replica_engines" not in globals():
+        # Реплики для чтения; без них сессии чтения открываются на основной БД
+        replica_engines = [create_engine_from_settings(dsn) for dsn in app_settings.postgres_replica_dsns]
+        for replica_engine in replica_engines:
+            instrument_engine(replica_engine)
+    if "replica_set" not in globals():
+        replica_set = ReplicaSet(engine, replica_engines,
+                                 balancing=app_settings.db_replica_balancing,
+                                 retry_interval=app_settings.db_replica_retry_interval)
+
+
+def _lazy(name: str):
+    # Движки создаются при первом обращении, а не при импорте модуля:
+    # импорт не загружает драйвер БД и не создаёт пулы (в мастере serve.py - до fork)
+    if name not in globals():
+        _create_engines()
+    return globals()[name]
+
+
+def __getattr__(name: str):
+    # from db.db import engine / async_session / replica_engines / replica_set
+    if name in ("engine", "async_session", "replica_engines", "replica_set"):
+        return _lazy(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+register_stats("db_pool", lambda: {**get_pool_stats(_lazy("engine")),
+                                   "server_max_connections_all_workers":
+                                       server_max_connections(_lazy("engine"), _lazy("replica_engines"))})
+register_stats("db_replicas", lambda: {**_lazy("replica_set").stats(),
+                                       "pools": [get_pool_stats(replica) for replica in _lazy("replica_engines")]})
+
+
+# Сессия для обработчиков, которые только читают: реплика по балансировке, а сразу после
+# записи этого клиента (кука read-your-writes) - основная БД
+async def get_read_session(request: Request) -> AsyncSession:
+    async with read_session(_lazy("replica_set"), read_primary_requested(request.cookies)) as session:
+        try:
+            yield session
+        except Exception:
+            await session.rollback()
+            raise
 
-# Создание фабрики для сессий
-async_session = create_sessionmaker(engine)
 
 # Создание зависимости для работы с базой данных
 db_dependency = Annotated[AsyncSession, Depends(get_async_session)]
+# зависимость для обработчиков только на чтение
+read_db_dependency = Annotated[AsyncSession, Depends(get_read_session)]
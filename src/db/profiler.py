@@ -0,0 +1,111 @@
+import logging
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from core.config import app_settings
+from core.stats import register_stats
+
+logger = logging.getLogger(__name__)
+
+
+class RequestProfile:
+    """SQL-запросы одного HTTP-запроса: число, суммарное время и повторы одинаковых запросов"""
+
+    def __init__(self):
+        self.queries = 0
+        self.total_time = 0.0
+        self.statements: dict[str, int] = {}
+        self.n_plus_one: set[str] = set()
+
+    def record(self, statement: str, duration: float) -> None:
+        self.queries += 1
+        self.total_time += duration
+        repeats = self.statements.get(statement, 0) + 1
+        self.statements[statement] = repeats
+        if repeats == app_settings.sql_n_plus_one_threshold:
+            # один и тот же запрос в цикле - вероятно, N+1
+            self.n_plus_one.add(statement)
+            logger.warning(f"Possible N+1: statement executed {repeats} times in one request: {statement}")
+
+    def header(self) -> str:
+        return f"queries={self.queries}; time_ms={self.total_time * 1000:.2f}; n_plus_one={len(self.n_plus_one)}"
+
+
+# профиль текущего HTTP-запроса; SQLAlchemy передаёт контекст в greenlet, где выполняются события
+current_profile: ContextVar[Optional[RequestProfile]] = ContextVar("current_profile", default=None)
+
+
+class RouteSQLStats:
+    """Сводка профилей по шаблонам маршрутов для /internal/stats"""
+
+    def __init__(self):
+        # маршрут -> [запросов HTTP, запросов SQL, время SQL, максимум SQL на запрос, случаев N+1]
+        self._routes: dict[str, list] = {}
+        self.slow_queries = 0
+
+    def add(self, route: str, profile: RequestProfile) -> None:
+        stats = self._routes.get(route)
+        if stats is None:
+            stats = self._routes[route] = [0, 0, 0.0, 0, 0]
+        stats[0] += 1
+        stats[1] += profile.queries
+        stats[2] += profile.total_time
+        stats[3] = max(stats[3], profile.queries)
+        stats[4] += 1 if profile.n_plus_one else 0
+
+    def stats(self) -> dict:
+        return {
+            "slow_queries": self.slow_queries,
+            "routes": {
+                route: {
+                    "requests": requests,
+                    "queries_avg": queries / requests,
+                    "queries_max": queries_max,
+                    "time_avg_ms": total_time / requests * 1000,
+                    "n_plus_one_requests": n_plus_one,
+                }
+                for route, (requests, queries, total_time, queries_max, n_plus_one) in self._routes.items()
+            },
+        }
+
+
+route_sql_stats = RouteSQLStats()
+register_stats("sql_profiler", route_sql_stats.stats)
+
+
+def redact_parameters(parameters) -> str:
+    """Параметры запроса без значений: только типы (значения могут содержать личные данные)"""
+    if isinstance(parameters, (list, tuple)) and parameters and isinstance(parameters[0], (list, tuple, dict)):
+        return f"<{len(parameters)} rows of {redact_parameters(parameters[0])}>"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{key}: {type(value).__name__}" for key, value in parameters.items()) + "}"
+    if isinstance(parameters, (list, tuple)):
+        return "(" + ", ".join(type(value).__name__ for value in parameters) + ")"
+    return type(parameters).__name__
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._profiler_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - context._profiler_started
+    profile = current_profile.get()
+    if profile is not None:
+        profile.record(statement, duration)
+    if duration * 1000 >= app_settings.sql_slow_query_ms:
+        route_sql_stats.slow_queries += 1
+        logger.warning(f"Slow query {duration * 1000:.1f} ms: {statement} | parameters: "
+                       f"{redact_parameters(parameters)}")
+
+
+def instrument_engine(bind_engine: AsyncEngine) -> None:
+    """Подключить профилировщик к событиям движка"""
+    if not app_settings.sql_profiler_enabled:
+        return
+    event.listen(bind_engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(bind_engine.sync_engine, "after_cursor_execute", _after_cursor_execute)
@@ -0,0 +1,144 @@
+import itertools
+import logging
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Optional, AsyncIterator
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# Кука read-your-writes: до этого момента (unix-время) чтения клиента идут в основную БД
+READ_PRIMARY_COOKIE = "db_read_primary_until"
+
+
+class ReplicaSet:
+    """Реплики для чтения: балансировка round-robin или по числу активных сессий
+    и временное исключение реплики, к которой не удалось подключиться.
+    """
+
+    def __init__(self, primary: AsyncEngine, replicas: list[AsyncEngine],
+                 balancing: str = "round_robin", retry_interval: float = 5.0):
+        if balancing not in ("round_robin", "least_connections"):
+            raise ValueError(f"Unknown replica balancing: {balancing}")
+        self.primary = primary
+        self.replicas = replicas
+        self.balancing = balancing
+        self.retry_interval = retry_interval
+        self._turn = itertools.count()
+        # реплика -> число открытых на ней сессий чтения
+        self.in_use = {replica: 0 for replica in replicas}
+        # реплика -> момент, до которого она считается недоступной
+        self._down_until = {replica: 0.0 for replica in replicas}
+        self.failovers = 0
+        self.primary_reads = 0
+
+    def choose(self) -> AsyncEngine:
+        """Движок для очередной сессии чтения; без живых реплик - основная БД"""
+        now = time.monotonic()
+        alive = [replica for replica in self.replicas if self._down_until[replica] <= now]
+        if not alive:
+            self.primary_reads += 1
+            return self.primary
+        if self.balancing == "least_connections":
+            return min(alive, key=lambda replica: self.in_use[replica])
+        return alive[next(self._turn) % len(alive)]
+
+    def mark_down(self, replica: AsyncEngine) -> None:
+        self._down_until[replica] = time.monotonic() + self.retry_interval
+        self.failovers += 1
+        logger.warning(f"Read replica {_safe_url(replica)} is unavailable, "
+                       f"reading from primary for {self.retry_interval}s")
+
+    def find(self, sync_engine: Engine) -> Optional[AsyncEngine]:
+        for replica in self.replicas:
+            if replica.sync_engine is sync_engine:
+                return replica
+        return None
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "balancing": self.balancing,
+            "failovers": self.failovers,
+            "primary_reads": self.primary_reads,
+            "replicas": [{"url": _safe_url(replica), "in_use": self.in_use[replica],
+                          "down": self._down_until[replica] > now} for replica in self.replicas],
+        }
+
+
+def _safe_url(engine: AsyncEngine) -> str:
+    return make_url(engine.url).render_as_string(hide_password=True)
+
+
+class ReadSession(Session):
+    """Сессия чтения: при ошибке подключения к реплике переключается на основную БД"""
+
+    def _connection_for_bind(self, engine, execution_options=None, **kw):
+        try:
+            return super()._connection_for_bind(engine, execution_options, **kw)
+        except (exc.DBAPIError, OSError):
+            replica_set: ReplicaSet = self.info["replica_set"]
+            replica = replica_set.find(engine)
+            if replica is None:
+                raise
+            replica_set.mark_down(replica)
+            # и этот, и следующие запросы сессии идут в основную БД
+            self.bind = replica_set.primary.sync_engine
+            return super()._connection_for_bind(self.bind, execution_options, **kw)
+
+
+class WriteMarker:
+    """Флаг текущего HTTP-запроса: была ли закоммичена запись в основную БД"""
+
+    def __init__(self):
+        self.written = False
+
+
+current_write_marker: ContextVar[Optional[WriteMarker]] = ContextVar("current_write_marker", default=None)
+
+
+@event.listens_for(Session, "after_commit")
+def _mark_write(session: Session) -> None:
+    # сессии чтения не коммитят, так что любой коммит в запросе - запись
+    marker = current_write_marker.get()
+    if marker is not None and not isinstance(session, ReadSession):
+        marker.written = True
+
+
+def reads_from_replica(session: AsyncSession) -> bool:
+    """Сессия читает с реплики: прочитанное может отставать от последних записей"""
+    replica_set: Optional[ReplicaSet] = session.info.get("replica_set")
+    return replica_set is not None and session.sync_session.bind is not replica_set.primary.sync_engine
+
+
+def read_primary_requested(cookies: dict) -> bool:
+    """Клиент недавно писал - его чтения должны видеть свою запись"""
+    try:
+        return float(cookies.get(READ_PRIMARY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+@asynccontextmanager
+async def read_session(replica_set: ReplicaSet, read_primary: bool = False) -> AsyncIterator[AsyncSession]:
+    """Сессия чтения на выбранной реплике (или на основной БД для read-your-writes)"""
+    if read_primary:
+        replica_set.primary_reads += 1
+        engine = replica_set.primary
+    else:
+        engine = replica_set.choose()
+    tracked = engine in replica_set.in_use
+    if tracked:
+        replica_set.in_use[engine] += 1
+    try:
+        async with AsyncSession(bind=engine, expire_on_commit=False, sync_session_class=ReadSession,
+                                info={"replica_set": replica_set}) as session:
+            yield session
+    finally:
+        if tracked:
+            replica_set.in_use[engine] -= 1
@@ -1,19 +1,20 @@
-import uvicorn
-from fastapi import APIRouter, HTTPException, Depends, FastAPI, Request
-from src.core.config import uvicorn_options
-from src.core.logger import LOGGING_CONFIG
-from src.models.model import MyGetFuncResponseSchema, User, UserResponse
-from src.api import api_router
-from sqlalchemy import text
-from db.db import db_dependency
-import logging.config
-import logging.handlers
-import atexit
 from contextlib import asynccontextmanager
 from typing import AsyncContextManager
-from sqlalchemy.ext.asyncio import AsyncSession
+import atexit
+import logging
+
+from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
 
+# импорты без префикса src: иначе модули (и таблицы моделей) загружаются дважды
+from core.config import uvicorn_options, run_dir
+from core.logger import configure_logging
+from api import api_router
+from auth.auth import password_executor
+from services.rendering import render_executor
+from services.warmup import run_warm_up, stop_warm_up
+from core.metrics import snapshot_writer
+from core.middleware import ErrorAndMetricsMiddleware, SQLProfilerMiddleware, ReadYourWritesMiddleware
 
 
 logger = logging.getLogger("root")
@@ -23,9 +24,8 @@ logger = logging.getLogger("root")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncContextManager[None]:
-    logging.config.dictConfig(LOGGING_CONFIG)
-    # получаем обработчик очереди из корневого логгера
-    queue_handler = logging.getHandlerByName("queue_handler")
+    # обработчик очереди корневого логгера
+    queue_handler = configure_logging()
     try:
         # если логгер есть
         if queue_handler is not None:
@@ -33,11 +33,20 @@ async def lifespan(app: FastAPI) -> AsyncContextManager[None]:
             queue_handler.listener.start()
             # регистрируем функцию, которая будет вызвана при завершении работы программы
             atexit.register(queue_handler.listener.stop)
+        # периодически сбрасываем метрики воркера на диск для агрегации в /metrics
+        snapshot_writer.start()
+        # прогреваем соединения и кэши до того, как воркер начнёт принимать запросы
+        await run_warm_up()
         yield
     finally:
         # в случае ошибки выключаем слушатель
         if queue_handler is not None:
             queue_handler.listener.stop()
+        stop_warm_up()
+        snapshot_writer.stop()
+        # останавливаем пулы хеширования паролей и рендеринга
+        password_executor.shutdown()
+        render_executor.shutdown()
 
 
 app = FastAPI(
@@ -48,22 +57,12 @@ app = FastAPI(
 
 app.include_router(api_router)
 
-
-@app.middleware("http")
-async def error_middleware(request: Request, call_next):
-    try:
-        return await call_next(request)
-    except HTTPException as exc:
-        return JSONResponse(
-            status_code=exc.status_code,
-            content={"message": exc.detail}
-        )
-    except Exception as e:
-        logger.error(f"{request.url} | Error in application: {e}")
-        return JSONResponse(
-            status_code=500,
-            content={"message": "Internal server error"}
-        )
+# обработка ошибок и метрики запросов (чистое ASGI-middleware вместо @app.middleware("http"))
+app.add_middleware(ErrorAndMetricsMiddleware)
+# число и время SQL-запросов на каждый HTTP-запрос
+app.add_middleware(SQLProfilerMiddleware)
+# после записи чтения клиента на время идут в основную БД, а не в реплики
+app.add_middleware(ReadYourWritesMiddleware)
 
 
 @app.exception_handler(Exception)
@@ -75,8 +74,12 @@ async def global_exception_handler(request: Request, exc: Exception):
     )
 
 if __name__ == '__main__':
+    # локальный запуск; боевой - serve.py (предзагрузка, uvloop/httptools, перезапуск воркеров)
     # print для отображения настроек в терминале при локальной разработке
     print(uvicorn_options)
+    # каталог запуска создаём до старта воркеров uvicorn: они получат его через окружение
+    run_dir()
+    import uvicorn
     uvicorn.run(
         'main:app',
         **uvicorn_options
@@ -1,13 +1,16 @@
 from .base import Base
-from .shorted_url import ShortedUrl
+from .shorted_url import ShortedUrl, ShortCodeCounter
 from .role import Role
 from .model import User
+from .snippet_revision import SnippetRevision
 
 __all__ = [
     "Base",
     "ShortedUrl",
+    "ShortCodeCounter",
     "User",
     "Role",
     'Snippet',
+    "SnippetRevision",
 
 ]
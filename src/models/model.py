@@ -1,8 +1,9 @@
 from pydantic import BaseModel, EmailStr
 from typing import Optional
 from .base import Base
-from sqlalchemy import ForeignKey, String, Column, Integer, Text, Boolean, DateTime
-from sqlalchemy.orm import relationship
+from sqlalchemy import ForeignKey, String, Column, Integer, Text, Boolean, DateTime, Index, LargeBinary
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import relationship, deferred
 from .role import Role
 from datetime import datetime
 
@@ -38,5 +39,22 @@ class Snippet(Base):
     title = Column(String, index=True, nullable=False)
     content = Column(Text, nullable=False)
     is_private = Column(Boolean, default=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    shared_url = Column(String, unique=True, nullable=True)
\ No newline at end of file
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    # момент последнего изменения и sha256 текста - из них строятся ETag и Last-Modified
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    content_hash = Column(String(64), nullable=True)
+    shared_url = Column(String, unique=True, nullable=True)
+    # номер текущей ревизии в snippet_revisions (0 - истории нет)
+    revision = Column(Integer, default=0, server_default="0", nullable=False)
+    # большой текст хранится сжатым: content пустой, данные в content_compressed,
+    # content_codec - чем сжато (NULL - текст лежит в content как есть)
+    content_codec = Column(String(16), nullable=True)
+    content_compressed = deferred(Column(LargeBinary, nullable=True))
+    # полнотекстовый индекс заполняется при записи (только в PostgreSQL)
+    search_vector = deferred(Column(TSVECTOR().with_variant(Text(), "sqlite"), nullable=True))
+
+    __table_args__ = (
+        # составной индекс под keyset-пагинацию списка сниппетов
+        Index("ix_snippets_created_at_id", "created_at", "id"),
+        Index("ix_snippets_search_vector", "search_vector", postgresql_using="gin"),
+    )
@@ -1,13 +1,26 @@
 from datetime import datetime
 
-from sqlalchemy import String, Column, Integer, TIMESTAMP
+from sqlalchemy import String, Column, Integer, BigInteger, TIMESTAMP, ForeignKey, Sequence
 
 from .base import Base
 
+# Коды выдаются блоками: один nextval резервирует за воркером столько номеров
+SHORT_CODE_BLOCK_SIZE = 1000
+# последовательность номеров коротких кодов в PostgreSQL, шаг - размер блока
+short_code_sequence = Sequence("short_code_seq", start=1, increment=SHORT_CODE_BLOCK_SIZE, metadata=Base.metadata)
+
 
 class ShortedUrl(Base):
 	__tablename__ = "url"
 	id = Column(Integer, autoincrement=True, primary_key=True, index=True)
 	origin = Column(String(256))
 	shorted_url = Column(String(256), unique=True, index=True, nullable=False)
-	created_at = Column(TIMESTAMP, default=datetime.utcnow)
\ No newline at end of file
+	created_at = Column(TIMESTAMP, default=datetime.utcnow)
+	snippet_id = Column(Integer, ForeignKey("snippets.id", ondelete="CASCADE"), index=True)
+
+
+class ShortCodeCounter(Base):
+	"""Счётчик блоков кодов для SQLite, где нет последовательностей"""
+	__tablename__ = "short_code_counter"
+	id = Column(Integer, primary_key=True)
+	value = Column(BigInteger, nullable=False, default=0)
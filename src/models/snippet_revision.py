@@ -0,0 +1,30 @@
+from datetime import datetime
+
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, LargeBinary, ForeignKey, UniqueConstraint
+
+from .base import Base
+
+
+class SnippetRevision(Base):
+    """Ревизия сниппета. Только добавляется: первая и каждая N-я - полный текст (снимок),
+    остальные - дельта к тексту предыдущей ревизии.
+    """
+    __tablename__ = "snippet_revisions"
+
+    id = Column(Integer, primary_key=True)
+    snippet_id = Column(Integer, ForeignKey("snippets.id", ondelete="CASCADE"), nullable=False)
+    # номер ревизии внутри сниппета, начиная с 1
+    number = Column(Integer, nullable=False)
+    title = Column(String, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    # sha256 полного текста ревизии: проверка восстановления по дельтам
+    content_hash = Column(String(64), nullable=False)
+    is_snapshot = Column(Boolean, nullable=False)
+    # текст снимка или дельта, сжатые кодеком codec (NULL - как есть)
+    codec = Column(String(16), nullable=True)
+    data = Column(LargeBinary, nullable=False)
+
+    __table_args__ = (
+        # восстановление читает диапазон номеров от снимка до нужной ревизии
+        UniqueConstraint("snippet_id", "number", name="uq_snippet_revisions_snippet_id_number"),
+    )
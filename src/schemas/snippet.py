@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import Optional
 from datetime import datetime
 
@@ -16,7 +16,28 @@ class SnippetUpdate(SnippetBase):
 class SnippetResponse(SnippetBase):
     id: int
     created_at: datetime
+    updated_at: Optional[datetime] = None
+    content_hash: Optional[str] = None
     shared_url: Optional[str] = None
+    revision: Optional[int] = None
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
+
+
+class SnippetRevisionInfo(BaseModel):
+    number: int
+    title: str
+    created_at: datetime
+    content_hash: str
+    # хранится ли ревизия полным текстом или дельтой, и сколько байт она занимает
+    is_snapshot: bool
+    stored_bytes: int
+
+
+class SnippetRevisionResponse(BaseModel):
+    snippet_id: int
+    number: int
+    title: str
+    content: str
+    content_hash: str
+    created_at: datetime
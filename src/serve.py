@@ -0,0 +1,197 @@
+"""Боевой запуск: python serve.py (из каталога src, корень проекта в PYTHONPATH).
+
+Мастер один раз импортирует приложение, открывает сокет и форкает воркеры: код и данные
+импорта остаются общими страницами памяти (copy-on-write), а воркер стартует без повторного
+импорта. Воркеры работают на uvloop и httptools, перезапускаются после server_max_requests
+запросов или при росте RSS выше server_max_rss_mb, а на SIGTERM дорабатывают текущие запросы.
+"""
+import gc
+import importlib.util
+import logging
+import os
+import random
+import resource
+import signal
+import sys
+import time
+
+import uvicorn
+
+from core.config import app_settings, uvicorn_options, run_dir
+from core.stats import register_stats
+
+logger = logging.getLogger("serve")
+
+MB = 1024 * 1024
+# воркер, упавший быстрее этого, перезапускается с паузой, чтобы не крутить fork в цикле
+MIN_WORKER_LIFETIME = 1.0
+
+
+def rss_bytes() -> int:
+    """Текущий RSS процесса; без /proc (не Linux) - пиковый"""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def pss_bytes() -> int | None:
+    """Доля процесса в памяти с учётом общих с мастером страниц (Linux)"""
+    try:
+        with open("/proc/self/smaps_rollup") as smaps:
+            for line in smaps:
+                if line.startswith("Pss:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+class WorkerServer(uvicorn.Server):
+    """uvicorn.Server воркера: завершается (с дозавершением запросов) при росте RSS"""
+
+    def __init__(self, config: uvicorn.Config, started_at: float):
+        super().__init__(config)
+        self.started_at = started_at
+        self.ticks_per_check = max(1, int(app_settings.server_rss_check_interval * 10))
+
+    async def startup(self, sockets=None) -> None:
+        await super().startup(sockets=sockets)
+        pss = pss_bytes()
+        logger.info(f"Worker {os.getpid()} ready in {time.monotonic() - self.started_at:.2f}s, "
+                    f"RSS {rss_bytes() / MB:.1f} MB" + (f", PSS {pss / MB:.1f} MB" if pss is not None else ""))
+
+    async def on_tick(self, counter: int) -> bool:
+        if await super().on_tick(counter):
+            return True
+        # main_loop вызывает on_tick каждые 0.1 с
+        if app_settings.server_max_rss_mb and counter % self.ticks_per_check == 0:
+            rss = rss_bytes()
+            if rss > app_settings.server_max_rss_mb * MB:
+                logger.warning(f"Worker {os.getpid()} RSS {rss / MB:.1f} MB exceeds "
+                               f"{app_settings.server_max_rss_mb} MB, restarting")
+                return True
+        return False
+
+    def stats(self) -> dict:
+        return {"pid": os.getpid(), "requests": self.server_state.total_requests,
+                "max_requests": self.config.limit_max_requests, "rss_mb": rss_bytes() / MB,
+                "uptime": time.monotonic() - self.started_at}
+
+
+def _implementation(preferred: str, fallback: str) -> str:
+    if importlib.util.find_spec(preferred) is not None:
+        return preferred
+    logger.warning(f"{preferred} is not installed, using {fallback}")
+    return fallback
+
+
+class Master:
+    """Мастер-процесс: держит сокет и нужное число воркеров, на SIGTERM/SIGINT останавливает их"""
+
+    def __init__(self, config: uvicorn.Config, workers: int):
+        self.config = config
+        self.workers = workers
+        self.children: dict[int, float] = {}
+        self.stopping = False
+        self.stop_deadline = 0.0
+
+    def spawn(self, sock) -> None:
+        pid = os.fork()
+        if pid:
+            self.children[pid] = time.monotonic()
+            return
+        # воркер: сигналы обрабатывает uvicorn, мастерские обработчики не наследуем
+        for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+            signal.signal(sig, signal.SIG_DFL)
+        code = 0
+        try:
+            run_worker(self.config, sock)
+        except BaseException:
+            logger.exception(f"Worker {os.getpid()} failed")
+            code = 1
+        finally:
+            logging.shutdown()
+            os._exit(code)
+
+    def stop(self, signum, frame) -> None:
+        if not self.stopping:
+            logger.info(f"Received {signal.Signals(signum).name}, draining {len(self.children)} workers")
+            self.stopping = True
+            # у воркеров timeout_graceful_shutdown на текущие запросы, потом - принудительно
+            self.stop_deadline = time.monotonic() + app_settings.server_graceful_timeout + 5
+        for pid in self.children:
+            os.kill(pid, signal.SIGTERM)
+
+    def run(self, sock) -> None:
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for _ in range(self.workers):
+            self.spawn(sock)
+        while self.children:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                if self.stopping and time.monotonic() > self.stop_deadline:
+                    for child in self.children:
+                        os.kill(child, signal.SIGKILL)
+                time.sleep(0.2)
+                continue
+            started = self.children.pop(pid, None)
+            if started is None or self.stopping:
+                continue
+            # воркер отработал свои запросы или превысил RSS - заменяем новым
+            logger.info(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}, restarting")
+            if time.monotonic() - started < MIN_WORKER_LIFETIME:
+                time.sleep(MIN_WORKER_LIFETIME)
+            self.spawn(sock)
+        logger.info("All workers stopped")
+
+
+def run_worker(config: uvicorn.Config, sock) -> None:
+    started_at = time.monotonic()
+    # соединения пула не должны переходить через fork (мастер их не открывает, но на всякий случай)
+    from db.db import engine, replica_engines
+    for bind in (engine, *replica_engines):
+        bind.sync_engine.dispose(close=False)
+    # разброс порога запросов, чтобы воркеры не перезапускались одновременно
+    if app_settings.server_max_requests:
+        config.limit_max_requests = (app_settings.server_max_requests
+                                     + random.randint(0, app_settings.server_max_requests_jitter))
+    server = WorkerServer(config, started_at)
+    register_stats("worker", server.stats)
+    server.run(sockets=[sock])
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(process)d] %(message)s")
+    started = time.monotonic()
+    # каталог запуска (снимки метрик, rate limit) создаётся до fork и наследуется воркерами
+    logger.info(f"Run directory {run_dir()}")
+    # предзагрузка: всё приложение импортируется один раз, до fork
+    from main import app
+    config = uvicorn.Config(
+        app,
+        host=uvicorn_options["host"],
+        port=uvicorn_options["port"],
+        loop=_implementation("uvloop", "asyncio"),
+        http=_implementation("httptools", "h11"),
+        timeout_graceful_shutdown=app_settings.server_graceful_timeout,
+        access_log=False,
+    )
+    # импорт реализаций loop/http и обёртка приложения - тоже до fork
+    config.load()
+    sock = config.bind_socket()
+    # объекты импорта уходят из-под сборщика мусора: его проходы в воркерах
+    # не трогают общие страницы и не копируют их
+    gc.collect()
+    gc.freeze()
+    logger.info(f"Application preloaded in {time.monotonic() - started:.2f}s, master RSS {rss_bytes() / MB:.1f} MB, "
+                f"starting {uvicorn_options['workers']} workers on {config.host}:{config.port} "
+                f"({config.loop}, {config.http})")
+    Master(config, uvicorn_options["workers"]).run(sock)
+
+
+if __name__ == "__main__":
+    main()
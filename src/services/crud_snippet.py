@@ -1,58 +1,463 @@
+import hashlib
+from datetime import datetime
+from typing import Optional, AsyncIterator
+
+from pydantic import ValidationError
+from sqlalchemy import (insert, update, delete, tuple_, func, case, cast, and_, or_, true, false, bindparam,
+                        literal_column, Float)
 from sqlalchemy.future import select
+from core.compression import compress_content, decompress_content
+from core.conditional import PreconditionFailed, parse_snippet_etag
+from db import db as database
 from db.db import db_dependency
+from db.replicas import read_session, reads_from_replica
 from models.model import Snippet
+from models.shorted_url import ShortedUrl
+from models.snippet_revision import SnippetRevision
 from schemas.snippet import SnippetCreate, SnippetUpdate
-import uuid
+from services.revisions import revision_values, is_snapshot_revision
+from services.short_codes import short_codes, hot_codes, short_url_values
+from services.snippet_cache import shared_snippet_cache, snippet_writes
+
+# Конфигурация полнотекстового поиска PostgreSQL, должна совпадать с миграциями
+SEARCH_CONFIG = "simple"
+# Колонки ответа SnippetResponse: горячие чтения выбирают только их и получают
+# строки-словари без создания ORM-объектов и повторной валидации
+snippet_columns = (Snippet.id, Snippet.title, Snippet.content, Snippet.is_private,
+                   Snippet.created_at, Snippet.updated_at, Snippet.content_hash, Snippet.shared_url,
+                   Snippet.revision)
+# колонки ответа, которые возвращает RETURNING при записи (текст известен и так)
+snippet_write_columns = tuple(column for column in snippet_columns if column is not Snippet.content)
+# валидаторы для условных запросов: хватает их, текст при этом не читается
+validator_columns = (Snippet.id, Snippet.updated_at, Snippet.content_hash)
+# то же плюс сжатый текст, из которого восстанавливается content
+snippet_storage_columns = snippet_columns + (Snippet.content_codec, Snippet.content_compressed)
+# прежняя версия строки, от которой при обновлении считается дельта новой ревизии,
+# прежний is_private (короткий код выделяется только сниппету, который был приватным)
+# и прежняя ссылка, записи которой сбрасываются в кэшах всех воркеров
+previous_columns = (Snippet.revision, Snippet.title, Snippet.content, Snippet.content_codec,
+                    Snippet.content_compressed, Snippet.content_hash, Snippet.is_private, Snippet.shared_url)
+
+# Ограничение на число ошибок в ответе массового импорта
+MAX_REPORTED_ERRORS = 1000
+
+
+async def generate_shared_url(db: db_dependency) -> str:
+    """Ссылка публичного сниппета - короткий код, он же ключ перехода /s/{code}"""
+    return await short_codes.next_code(db)
+
+
+def search_vector_value(title, content):
+    """Значение search_vector: слова заголовка весят больше слов текста"""
+    return (func.setweight(func.to_tsvector(SEARCH_CONFIG, title), literal_column("'A'"))
+            .op("||")(func.setweight(func.to_tsvector(SEARCH_CONFIG, content), literal_column("'B'"))))
+
+
+def _content_values(db: db_dependency, title: str, content: str) -> dict:
+    """Колонки хранения текста: большой текст сжимается, в PostgreSQL заполняется search_vector"""
+    data, codec = compress_content(content)
+    values = {"content": "" if codec else content, "content_compressed": data, "content_codec": codec,
+              "content_hash": hashlib.sha256(content.encode()).hexdigest()}
+    if db.get_bind().dialect.name == "postgresql":
+        values["search_vector"] = search_vector_value(title, content)
+    return values
+
+
+def _stored_content(row) -> str:
+    """Текст из колонок хранения (content или сжатый content_compressed)"""
+    if row["content_codec"] is not None:
+        return decompress_content(row["content_compressed"], row["content_codec"])
+    return row["content"]
+
+
+def _decode_row(row) -> dict:
+    """Строка колонок хранения -> словарь ответа с распакованным текстом"""
+    snippet = dict(row)
+    codec = snippet.pop("content_codec")
+    data = snippet.pop("content_compressed")
+    if codec is not None:
+        snippet["content"] = decompress_content(data, codec)
+    return snippet
 
-async def create_snippet(db: db_dependency, snippet: SnippetCreate) -> Snippet:
+
+async def create_snippet(db: db_dependency, snippet: SnippetCreate) -> dict:
+    """Создать сниппет одним INSERT ... RETURNING и его первую ревизию
+    (у публичного - плюс строка короткого кода)
+    """
     # Если сниппет публичный, генерируем уникальную ссылку
-    shared_url = str(uuid.uuid4()) if not snippet.is_private else None
-    db_snippet = Snippet(**snippet.dict(), shared_url=shared_url)
-    db.add(db_snippet)
+    shared_url = await generate_shared_url(db) if not snippet.is_private else None
+    result = await db.execute(insert(Snippet)
+                              .values(title=snippet.title, is_private=snippet.is_private, shared_url=shared_url,
+                                      revision=1, **_content_values(db, snippet.title, snippet.content))
+                              .returning(*snippet_write_columns))
+    row = result.mappings().one()
+    await db.execute(insert(SnippetRevision).values(**revision_values(
+        row["id"], 1, snippet.title, snippet.content, row["content_hash"], row["updated_at"])))
+    if shared_url is not None:
+        await db.execute(insert(ShortedUrl).values(**short_url_values(row["id"], shared_url)))
     await db.commit()
-    await db.refresh(db_snippet)
-    return db_snippet
+    return {**row, "content": snippet.content}
 
 async def get_snippet(db: db_dependency, snippet_id: int):
     result = await db.execute(select(Snippet).filter(Snippet.id == snippet_id))
     return result.scalars().first()
 
-async def get_snippets(db: db_dependency, skip: int = 0, limit: int = 10):
-    result = await db.execute(select(Snippet).offset(skip).limit(limit))
-    return result.scalars().all()
+async def get_snippet_row(db: db_dependency, snippet_id: int) -> Optional[dict]:
+    """Сниппет по id в виде словаря колонок ответа"""
+    result = await db.execute(select(*snippet_storage_columns).where(Snippet.id == snippet_id))
+    row = result.mappings().first()
+    return _decode_row(row) if row is not None else None
+
+async def get_snippet_validators(db: db_dependency, snippet_id: int) -> Optional[dict]:
+    """id, updated_at и content_hash сниппета - для ответа 304 без чтения текста"""
+    result = await db.execute(select(*validator_columns).where(Snippet.id == snippet_id))
+    row = result.mappings().first()
+    return dict(row) if row is not None else None
+
 
+async def get_snippets(db: db_dependency, skip: int = 0, limit: int = 10,
+                       after: Optional[tuple[datetime, int]] = None) -> list[dict]:
+    """Список сниппетов (словари колонок ответа) в стабильном порядке (created_at, id).
 
-async def update_snippet(db: db_dependency, snippet_id: int, snippet: SnippetUpdate) -> Snippet:
+    Если передан курсор after, используется keyset-пагинация по индексу
+    ix_snippets_created_at_id и skip игнорируется, иначе - старый режим OFFSET/LIMIT.
+    """
+    query = select(*snippet_storage_columns).order_by(Snippet.created_at, Snippet.id).limit(limit)
+    if after is not None:
+        query = query.where(tuple_(Snippet.created_at, Snippet.id) > tuple_(*after))
+    else:
+        query = query.offset(skip)
+    result = await db.execute(query)
+    return [_decode_row(row) for row in result.mappings()]
 
-    db_snippet = await get_snippet(db, snippet_id)
 
-    if db_snippet:
-        # Если изменяется параметр is_private и сниппет становится публичным
-        if snippet.is_private != db_snippet.is_private:
-            if not snippet.is_private:  # Если становится публичным
-                db_snippet.shared_url = str(uuid.uuid4())  # Генерируем новую уникальную ссылку
-            else:
-                db_snippet.shared_url = None  # Если становится приватным, убираем ссылку
+@snippet_writes
+async def update_snippet(db: db_dependency, snippet_id: int, snippet: SnippetUpdate,
+                         if_match: Optional[str] = None) -> Optional[dict]:
+    """Обновить сниппет одним UPDATE ... RETURNING и дописать ревизию в историю.
+
+    При if_match обновление выполняется, только если ETag текущей версии есть в заголовке,
+    иначе PreconditionFailed. Ревизия (INSERT в snippet_revisions) появляется, только если
+    изменились текст или заголовок. Ставший публичным сниппет получает новый короткий код -
+    это ещё один INSERT, в таблицу url (в PostgreSQL и UPDATE ссылки: прежний is_private
+    известен только после основного UPDATE). Публичный сниппет сохраняет свой код,
+    и новый номер при этом не расходуется.
+    """
+    content_values = _content_values(db, snippet.title, snippet.content)
+    # приватный сниппет теряет ссылку, публичный сохраняет свою
+    shared_url = None if snippet.is_private else Snippet.shared_url
+    values = dict(title=snippet.title, is_private=snippet.is_private, **content_values)
+    previous = None
+    new_code = None
+    if db.get_bind().dialect.name == "postgresql":
+        # прежняя версия строки читается в том же запросе: CTE с FOR UPDATE блокирует строку,
+        # так что параллельное обновление не вклинится между чтением и записью
+        previous_cte = (select(Snippet.id, *previous_columns)
+                        .where(Snippet.id == snippet_id)
+                        .with_for_update()
+                        .cte("previous"))
+        changed = or_(previous_cte.c.content_hash.is_(None),
+                      previous_cte.c.content_hash != content_values["content_hash"],
+                      previous_cte.c.title != snippet.title)
+        statement = (update(Snippet)
+                     .where(Snippet.id == previous_cte.c.id)
+                     .values(revision=case((changed, previous_cte.c.revision + 1), else_=previous_cte.c.revision),
+                             shared_url=shared_url, **values)
+                     .returning(*snippet_write_columns,
+                                *(previous_cte.c[column.key].label(f"previous_{column.key}")
+                                  for column in previous_columns)))
+    else:
+        # SQLite: RETURNING не видит других таблиц запроса, прежняя версия читается отдельно
+        previous = (await db.execute(select(*previous_columns).where(Snippet.id == snippet_id))).mappings().first()
+        if previous is None:
+            return None
+        changed = previous["content_hash"] != content_values["content_hash"] or previous["title"] != snippet.title
+        if not snippet.is_private and previous["is_private"] is not False:
+            # прежнее состояние уже известно - новый код пишется тем же UPDATE
+            new_code = shared_url = await generate_shared_url(db)
+        statement = (update(Snippet)
+                     .where(Snippet.id == snippet_id)
+                     .values(revision=previous["revision"] + 1 if changed else previous["revision"],
+                             shared_url=shared_url, **values)
+                     .returning(*snippet_write_columns))
+    statement = statement.execution_options(synchronize_session=False)
+    if if_match is not None:
+        # проверка версии входит в сам UPDATE - между проверкой и записью нет окна для гонки
+        statement = statement.where(_if_match_condition(if_match))
+    row = (await db.execute(statement)).mappings().first()
+    if row is None:
+        # лишний запрос только на неуспешном пути: отличаем 412 от 404
+        if if_match is not None and await get_snippet_validators(db, snippet_id) is not None:
+            raise PreconditionFailed(snippet_id)
+        return None
+    row = dict(row)
+    if previous is None:
+        previous = {column.key: row.pop(f"previous_{column.key}") for column in previous_columns}
+    if row["revision"] != previous["revision"]:
+        # дельта считается от прежнего текста; для снимка он не нужен и не распаковывается
+        number = row["revision"]
+        previous_content = None if is_snapshot_revision(number) else _stored_content(previous)
+        await db.execute(insert(SnippetRevision).values(**revision_values(
+            snippet_id, number, snippet.title, snippet.content, row["content_hash"], row["updated_at"],
+            previous_content)))
+    if new_code is None and not snippet.is_private and previous["is_private"] is not False:
+        # PostgreSQL: сниппет был приватным - строка уже заблокирована UPDATE, дописываем ей код;
+        # updated_at передаётся явно, чтобы onupdate не сдвинул только что возвращённую версию
+        new_code = await generate_shared_url(db)
+        await db.execute(update(Snippet)
+                         .where(Snippet.id == snippet_id)
+                         .values(shared_url=new_code, updated_at=row["updated_at"])
+                         .execution_options(synchronize_session=False))
+        row["shared_url"] = new_code
+    if new_code is not None:
+        await db.execute(insert(ShortedUrl).values(**short_url_values(snippet_id, new_code)))
+    await db.commit()
+    # сбрасываем кэш после коммита, в том числе старую ссылку, если сниппет стал приватным
+    shared_snippet_cache.invalidate(snippet_id, previous["shared_url"])
+    hot_codes.invalidate(snippet_id, previous["shared_url"])
+    return {**row, "content": snippet.content}
 
-        # Обновление остальных данных
-        for key, value in snippet.dict(exclude_unset=True).items():
-            setattr(db_snippet, key, value)
 
-        # Сохранение изменений в базе данных
-        await db.commit()
-        await db.refresh(db_snippet)
+def _if_match_condition(if_match: str):
+    """Условие WHERE: версия строки совпадает с одним из ETag заголовка If-Match"""
+    if if_match.strip() == "*":
+        return true()
+    conditions = []
+    for tag in if_match.split(","):
+        validators = parse_snippet_etag(tag)
+        if validators is None:
+            continue
+        snippet_id, updated_at, hash_prefix = validators
+        condition = and_(Snippet.id == snippet_id, Snippet.updated_at == updated_at)
+        if hash_prefix:
+            condition = and_(condition, Snippet.content_hash.startswith(hash_prefix, autoescape=True))
+        conditions.append(condition)
+    return or_(*conditions) if conditions else false()
 
-    return db_snippet
 
-async def delete_snippet(db: db_dependency, snippet_id: int):
-    db_snippet = await get_snippet(db, snippet_id)
-    if db_snippet:
-        await db.delete(db_snippet)
-        await db.commit()
-    return db_snippet
+@snippet_writes
+async def delete_snippet(db: db_dependency, snippet_id: int) -> Optional[int]:
+    """Удалить сниппет одним DELETE ... RETURNING; возвращает id удалённого сниппета"""
+    result = await db.execute(delete(Snippet)
+                              .where(Snippet.id == snippet_id)
+                              .returning(Snippet.id, Snippet.shared_url)
+                              .execution_options(synchronize_session=False))
+    row = result.first()
+    if row is None:
+        return None
+    await db.commit()
+    shared_snippet_cache.invalidate(snippet_id, row.shared_url)
+    hot_codes.invalidate(snippet_id, row.shared_url)
+    return row.id
 
 async def get_snippet_by_shared_url_from_db(db: db_dependency, shared_url: str):
-    """Запрос для получения сниппета по уникальной ссылке"""
-    result = await db.execute(select(Snippet).filter(Snippet.shared_url == shared_url))
-    snippet = result.scalars().first()
-    return snippet
\ No newline at end of file
+    """Запрос для получения сниппета по уникальной ссылке (через кэш)"""
+    cached = shared_snippet_cache.get(shared_url)
+    if cached is not None:
+        return cached
+    generation = shared_snippet_cache.generation(shared_url)
+    result = await db.execute(select(*snippet_storage_columns).where(Snippet.shared_url == shared_url))
+    row = result.mappings().first()
+    if row is None:
+        return None
+    snippet = _decode_row(row)
+    if not reads_from_replica(db):
+        # строку с отстающей реплики не кэшируем: она может быть старше инвалидации
+        shared_snippet_cache.set(snippet, generation)
+    return snippet
+
+
+async def get_shared_snippet_validators(db: db_dependency, shared_url: str) -> Optional[dict]:
+    """Валидаторы публичного сниппета: из кэша или одним лёгким запросом"""
+    cached = shared_snippet_cache.get(shared_url)
+    if cached is not None:
+        return cached
+    result = await db.execute(select(*validator_columns).where(Snippet.shared_url == shared_url))
+    row = result.mappings().first()
+    return dict(row) if row is not None else None
+
+
+def _search_rank(db: db_dependency, q: str):
+    """Выражения (условие, ранг) для поиска: tsvector в PostgreSQL, LIKE-аналог в SQLite"""
+    if db.get_bind().dialect.name == "postgresql":
+        query = func.websearch_to_tsquery(SEARCH_CONFIG, q)
+        return Snippet.search_vector.op("@@")(query), cast(func.ts_rank_cd(Snippet.search_vector, query), Float)
+
+    # запасной вариант для SQLite: все слова должны встретиться в заголовке или тексте,
+    # совпадение в заголовке весит больше, как setweight 'A' в PostgreSQL;
+    # текст сжатых сниппетов здесь не просматривается
+    terms = q.lower().split()
+    if not terms:
+        return false(), cast(0, Float)
+    conditions, rank = [], 0
+    for term in terms:
+        in_title = func.instr(func.lower(Snippet.title), term) > 0
+        in_content = func.instr(func.lower(Snippet.content), term) > 0
+        conditions.append(in_title | in_content)
+        rank = rank + case((in_title, 1.0), else_=0.0) + case((in_content, 0.1), else_=0.0)
+    return and_(*conditions), cast(rank, Float)
+
+
+async def search_snippets(db: db_dependency, q: str, limit: int = 10,
+                          after: Optional[tuple[float, int]] = None):
+    """Поиск по заголовку и тексту, отсортированный по релевантности.
+
+    Возвращает пары (словарь сниппета, ранг); для следующей страницы передаётся
+    after=(ранг, id) последней записи.
+    """
+    condition, rank = _search_rank(db, q)
+    rank = rank.label("rank")
+    query = (select(*snippet_storage_columns, rank)
+             .where(condition)
+             .order_by(rank.desc(), Snippet.id.desc())
+             .limit(limit))
+    if after is not None:
+        query = query.where(tuple_(rank, Snippet.id) < tuple_(*after))
+    result = await db.execute(query)
+    rows = []
+    for row in result.mappings():
+        snippet = _decode_row(row)
+        rows.append((snippet, snippet.pop("rank")))
+    return rows
+
+
+class BulkImportResult:
+    """Итог массового импорта: число вставленных строк и ошибки по номерам строк"""
+
+    def __init__(self):
+        self.inserted = 0
+        self.failed = 0
+        self.errors: list[dict] = []
+
+    def add_error(self, index: int, error: str) -> None:
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"index": index, "error": error})
+
+    def as_dict(self) -> dict:
+        return {"inserted": self.inserted, "failed": self.failed, "errors": self.errors}
+
+
+def _snippet_row(snippet: SnippetCreate, created_at: datetime, shared_url: Optional[str]) -> dict:
+    data, codec = compress_content(snippet.content)
+    return {
+        "title": snippet.title,
+        "content": "" if codec else snippet.content,
+        "content_compressed": data,
+        "content_codec": codec,
+        "content_hash": hashlib.sha256(snippet.content.encode()).hexdigest(),
+        "is_private": snippet.is_private,
+        "shared_url": shared_url,
+        "revision": 1,
+        "created_at": created_at,
+        "updated_at": created_at,
+        # исходный текст для search_vector и первой ревизии: в content сжатого сниппета его нет
+        "search_title": snippet.title,
+        "search_content": snippet.content,
+    }
+
+
+def _bulk_insert_statement(db: db_dependency):
+    # Core-вставка по таблице обходит ORM bulk-путь, который дорого склеивает RETURNING
+    statement = insert(Snippet.__table__)
+    if db.get_bind().dialect.name == "postgresql":
+        statement = statement.values(
+            search_vector=search_vector_value(bindparam("search_title"), bindparam("search_content")))
+    return statement
+
+
+def _strip_search_params(db: db_dependency, row: dict) -> dict:
+    if db.get_bind().dialect.name == "postgresql":
+        return row
+    return {key: value for key, value in row.items() if not key.startswith("search_")}
+
+
+async def _insert_rows(db: db_dependency, table, rows: list[dict]) -> None:
+    """Вставка строк, id которых не нужны: в PostgreSQL - COPY в той же транзакции, иначе INSERT"""
+    if db.get_bind().dialect.name != "postgresql":
+        await db.execute(insert(table), rows)
+        return
+    # COPY обходит и разбор SQL, и сборку параметров SQLAlchemy, которые на таких пачках
+    # стоят больше самой записи
+    columns = list(rows[0])
+    connection = await (await db.connection()).get_raw_connection()
+    await connection.driver_connection.copy_records_to_table(
+        table.name, records=[tuple(row[column] for column in columns) for row in rows], columns=columns)
+
+
+async def _insert_batch(db: db_dependency, batch: list[tuple[int, dict]], result: BulkImportResult) -> None:
+    # одна многострочная вставка INSERT ... VALUES (...), (...) RETURNING id на всю пачку
+    # порядок RETURNING - как у строк пачки, чтобы сопоставить id с исходными строками
+    statement = _bulk_insert_statement(db).returning(Snippet.__table__.c.id, Snippet.__table__.c.shared_url,
+                                                     sort_by_parameter_order=True)
+    rows = [_strip_search_params(db, row) for _, row in batch]
+    inserted = []
+    try:
+        async with db.begin_nested():
+            inserted = list(zip((await db.execute(statement, rows)).all(), (row for _, row in batch)))
+    except Exception:
+        # пачка не прошла целиком - вставляем построчно, чтобы найти и пропустить плохие строки
+        for (index, source), row in zip(batch, rows):
+            try:
+                async with db.begin_nested():
+                    inserted.append(((await db.execute(statement, row)).one(), source))
+            except Exception as ex:
+                result.add_error(index, str(getattr(ex, "orig", ex)))
+    result.inserted += len(inserted)
+    if inserted:
+        # первые ревизии пачки - одной вставкой в snippet_revisions
+        await _insert_rows(db, SnippetRevision.__table__, [
+            revision_values(snippet_id, 1, source["title"], source["search_content"], source["content_hash"],
+                            source["created_at"])
+            for (snippet_id, _), source in inserted])
+    # короткие коды публичных сниппетов пачки - одной вставкой в url
+    short_urls = [short_url_values(snippet_id, shared_url)
+                  for (snippet_id, shared_url), _ in inserted if shared_url]
+    if short_urls:
+        await _insert_rows(db, ShortedUrl.__table__, short_urls)
+    await db.commit()
+
+
+async def bulk_create_snippets(db: db_dependency, items: AsyncIterator[tuple[int, object]],
+                               batch_size: int) -> BulkImportResult:
+    """Массовая вставка сниппетов пачками по batch_size строк.
+
+    items - поток пар (номер строки, сырые данные или исключение разбора строки);
+    невалидные строки попадают в ошибки результата и не прерывают импорт остальных.
+    """
+    result = BulkImportResult()
+    batch: list[tuple[int, dict]] = []
+    created_at = datetime.utcnow()
+    async for index, item in items:
+        if isinstance(item, Exception):
+            result.add_error(index, str(item))
+            continue
+        try:
+            snippet = SnippetCreate.model_validate(item)
+        except ValidationError as ex:
+            result.add_error(index, "; ".join(error["msg"] for error in ex.errors()))
+            continue
+        shared_url = await generate_shared_url(db) if not snippet.is_private else None
+        batch.append((index, _snippet_row(snippet, created_at, shared_url)))
+        if len(batch) >= batch_size:
+            await _insert_batch(db, batch, result)
+            batch = []
+    if batch:
+        await _insert_batch(db, batch, result)
+    return result
+
+
+async def iter_snippets_for_export(fetch_size: int) -> AsyncIterator[list[dict]]:
+    """Все сниппеты пачками по fetch_size строк через серверный курсор.
+
+    Сессия открывается здесь, а не через зависимость, потому что она должна жить,
+    пока клиент читает ответ; следующая пачка запрашивается только после того,
+    как предыдущая отдана потребителю.
+    """
+    query = (select(*snippet_storage_columns)
+             .order_by(Snippet.id)
+             .execution_options(yield_per=fetch_size))
+    async with read_session(database.replica_set) as session:
+        result = await session.stream(query)
+        async for partition in result.mappings().partitions():
+            yield [_decode_row(row) for row in partition]
@@ -0,0 +1,45 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Sequence
+
+
+# Курсор для keyset-пагинации: непрозрачная для клиента строка,
+# внутри которой лежат значения ключа сортировки последней записи страницы
+
+def encode_cursor(*values: Any) -> str:
+    payload = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Sequence[Any]:
+    """Разобрать курсор; при некорректном значении выбрасывается ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+    except (ValueError, TypeError) as ex:
+        raise ValueError("Invalid cursor") from ex
+    if not isinstance(payload, list):
+        raise ValueError("Invalid cursor")
+    return payload
+
+
+def decode_created_at_cursor(cursor: str) -> tuple[datetime, int]:
+    """Курсор списка сниппетов: (created_at, id)"""
+    values = decode_cursor(cursor)
+    try:
+        created_at, snippet_id = values
+        return datetime.fromisoformat(created_at), int(snippet_id)
+    except (ValueError, TypeError) as ex:
+        raise ValueError("Invalid cursor") from ex
+
+
+def decode_rank_cursor(cursor: str) -> tuple[float, int]:
+    """Курсор результатов поиска: (ранг, id)"""
+    values = decode_cursor(cursor)
+    try:
+        rank, snippet_id = values
+        return float(rank), int(snippet_id)
+    except (ValueError, TypeError) as ex:
+        raise ValueError("Invalid cursor") from ex
@@ -0,0 +1,114 @@
+import asyncio
+import functools
+import hashlib
+import multiprocessing
+from typing import Optional
+
+from core.cache import LRUCache
+from core.config import app_settings
+from core.executor import BoundedExecutor
+from core.stats import register_stats
+
+# Рендеринг идёт в процессах: большой файл подсвечивается сотни миллисекунд и не должен
+# держать цикл событий. fork из воркера с потоками небезопасен, поэтому процессы пула
+# порождает forkserver (где его нет - spawn). pygments импортируется только в них
+# и при разборе имён лексера и стиля, не при импорте модуля.
+START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+render_executor = BoundedExecutor("render",
+                                  max_workers=app_settings.render_workers,
+                                  max_queue=app_settings.render_queue_size,
+                                  processes=True,
+                                  start_method=START_METHOD)
+# готовый HTML по (sha256 текста, лексер, стиль): одинаковый текст разных сниппетов рендерится один раз
+render_cache = LRUCache(maxsize=app_settings.render_cache_size, max_bytes=app_settings.render_cache_max_bytes,
+                        weigher=len)
+register_stats("rendering", lambda: {"executor": render_executor.stats(), "cache": render_cache.stats()})
+# рендеринги в работе: параллельные запросы того же ключа ждут один и тот же результат
+_in_progress: dict[tuple[str, str, str], asyncio.Task] = {}
+
+
+class RenderOptionError(ValueError):
+    """Неизвестный лексер или стиль"""
+
+
+def render_html(content: str, lexer: str, style: str) -> bytes:
+    """HTML с подсветкой и CSS стиля (выполняется в процессе пула)"""
+    from pygments import highlight
+    from pygments.formatters import HtmlFormatter
+    from pygments.lexers import get_lexer_by_name
+
+    formatter = HtmlFormatter(style=style, cssclass="highlight")
+    # stripnl=False: пустые строки в начале и конце текста сохраняются
+    body = highlight(content, get_lexer_by_name(lexer, stripnl=False), formatter)
+    return f"<style>{formatter.get_style_defs('.highlight')}</style>\n{body}".encode()
+
+
+@functools.lru_cache(maxsize=1024)
+def _lexer_alias(name: str) -> Optional[str]:
+    from pygments.lexers import find_lexer_class_by_name
+    from pygments.util import ClassNotFound
+    try:
+        return find_lexer_class_by_name(name).aliases[0]
+    except ClassNotFound:
+        return None
+
+
+@functools.lru_cache(maxsize=1024)
+def _lexer_alias_for_filename(filename: str) -> str:
+    from pygments.lexers import find_lexer_class_for_filename
+    lexer_class = find_lexer_class_for_filename(filename)
+    return lexer_class.aliases[0] if lexer_class is not None and lexer_class.aliases else "text"
+
+
+@functools.lru_cache(maxsize=256)
+def _style_exists(name: str) -> bool:
+    from pygments.styles import get_style_by_name
+    from pygments.util import ClassNotFound
+    try:
+        get_style_by_name(name)
+    except ClassNotFound:
+        return False
+    return True
+
+
+def resolve_lexer(name: Optional[str], title: str) -> str:
+    """Основное имя лексера (py и python - один ключ кэша); без имени - по заголовку как имени файла"""
+    if not name:
+        return _lexer_alias_for_filename(title)
+    alias = _lexer_alias(name.strip().lower())
+    if alias is None:
+        raise RenderOptionError(f"Unknown lexer: {name}")
+    return alias
+
+
+def resolve_style(name: Optional[str]) -> str:
+    style = (name or app_settings.render_default_style).strip().lower()
+    if not _style_exists(style):
+        raise RenderOptionError(f"Unknown style: {name}")
+    return style
+
+
+async def _render(key: tuple[str, str, str], content: str) -> bytes:
+    try:
+        html = await render_executor.run(render_html, content, key[1], key[2])
+        render_cache.set(key, html)
+        return html
+    finally:
+        _in_progress.pop(key, None)
+
+
+async def render_snippet(content: str, content_hash: Optional[str], lexer: str, style: str) -> bytes:
+    """HTML сниппета: из кэша, из уже идущего рендеринга того же ключа или новым заданием пулу.
+
+    При переполненной очереди пула - ExecutorSaturated.
+    """
+    key = (content_hash or hashlib.sha256(content.encode()).hexdigest(), lexer, style)
+    html = render_cache.get(key)
+    if html is not None:
+        return html
+    task = _in_progress.get(key)
+    if task is None:
+        task = _in_progress[key] = asyncio.ensure_future(_render(key, content))
+    # shield: отключившийся клиент не отменяет рендеринг, который ждут другие запросы
+    return await asyncio.shield(task)
@@ -0,0 +1,139 @@
+import hashlib
+import zlib
+from datetime import datetime
+from difflib import SequenceMatcher
+from typing import Optional
+
+import orjson
+from sqlalchemy import select, func, true
+
+from core.compression import compress_bytes, decompress_bytes
+from core.config import app_settings
+from db.db import db_dependency
+from models.snippet_revision import SnippetRevision
+
+# Дельта - список операций над строками предыдущей ревизии (orjson):
+#   n > 0 - скопировать n строк, n < 0 - пропустить -n строк, строка - вставить этот текст.
+# Строки берутся с окончаниями (splitlines(keepends=True)), поэтому текст восстанавливается байт в байт.
+
+# метаданные ревизии для списка: без данных, только их размер
+revision_info_columns = (SnippetRevision.number, SnippetRevision.title, SnippetRevision.created_at,
+                         SnippetRevision.content_hash, SnippetRevision.is_snapshot,
+                         func.length(SnippetRevision.data).label("stored_bytes"))
+
+
+class RevisionCorrupted(Exception):
+    """Ревизию нельзя восстановить: данные не читаются или текст не совпал с её хешем"""
+
+
+def make_delta(old: str, new: str) -> bytes:
+    """Дельта, превращающая old в new"""
+    old_lines = old.splitlines(keepends=True)
+    new_lines = new.splitlines(keepends=True)
+    # общие начало и конец отрезаются до SequenceMatcher: правка обычно затрагивает
+    # несколько строк, а сравнение всего текста квадратично по числу строк
+    prefix = 0
+    limit = min(len(old_lines), len(new_lines))
+    while prefix < limit and old_lines[prefix] == new_lines[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and old_lines[-1 - suffix] == new_lines[-1 - suffix]:
+        suffix += 1
+    old_middle = old_lines[prefix:len(old_lines) - suffix]
+    new_middle = new_lines[prefix:len(new_lines) - suffix]
+    ops = [prefix] if prefix else []
+    matcher = SequenceMatcher(None, old_middle, new_middle, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append(i2 - i1)
+            continue
+        if i2 > i1:
+            ops.append(i1 - i2)
+        if j2 > j1:
+            ops.append("".join(new_middle[j1:j2]))
+    if suffix:
+        ops.append(suffix)
+    return orjson.dumps(ops)
+
+
+def apply_delta(old: str, delta: bytes) -> str:
+    return "".join(_apply_to_lines(old.splitlines(keepends=True), delta))
+
+
+def _apply_to_lines(old_lines: list[str], delta: bytes) -> list[str]:
+    # цепочка дельт применяется к списку строк: текст склеивается один раз в конце
+    position = 0
+    lines = []
+    for op in orjson.loads(delta):
+        if isinstance(op, str):
+            lines.extend(op.splitlines(keepends=True))
+        elif op > 0:
+            lines.extend(old_lines[position:position + op])
+            position += op
+        else:
+            position -= op
+    return lines
+
+
+def is_snapshot_revision(number: int) -> bool:
+    """Первая и каждая revision_snapshot_interval-я ревизия хранится полным текстом"""
+    return (number - 1) % app_settings.revision_snapshot_interval == 0
+
+
+def revision_values(snippet_id: int, number: int, title: str, content: str, content_hash: str,
+                    created_at: datetime, previous_content: Optional[str] = None) -> dict:
+    """Строка snippet_revisions: снимок или дельта к previous_content (для снимка не нужен)"""
+    snapshot = is_snapshot_revision(number) or previous_content is None
+    raw = content.encode() if snapshot else make_delta(previous_content, content)
+    # история - холодные данные: сжимаем всё, что сжимается, без порога
+    data, codec = compress_bytes(raw, threshold=0)
+    return {"snippet_id": snippet_id, "number": number, "title": title, "created_at": created_at,
+            "content_hash": content_hash, "is_snapshot": snapshot, "codec": codec,
+            "data": data if codec else raw}
+
+
+def _unpack(row) -> bytes:
+    return decompress_bytes(row["data"], row["codec"]) if row["codec"] else row["data"]
+
+
+async def get_revisions(db: db_dependency, snippet_id: int, limit: int,
+                        before: Optional[int] = None) -> list[dict]:
+    """Метаданные ревизий сниппета, новые первыми; before - номер, с которого продолжить"""
+    query = (select(*revision_info_columns)
+             .where(SnippetRevision.snippet_id == snippet_id)
+             .order_by(SnippetRevision.number.desc())
+             .limit(limit))
+    if before is not None:
+        query = query.where(SnippetRevision.number < before)
+    result = await db.execute(query)
+    return [dict(row) for row in result.mappings()]
+
+
+async def get_revision(db: db_dependency, snippet_id: int, number: int) -> Optional[dict]:
+    """Ревизия с полным текстом: ближайший снимок не новее неё и дельты после него - одним запросом"""
+    snapshot = (select(func.max(SnippetRevision.number))
+                .where(SnippetRevision.snippet_id == snippet_id,
+                       SnippetRevision.number <= number,
+                       SnippetRevision.is_snapshot == true())
+                .scalar_subquery())
+    result = await db.execute(select(SnippetRevision.number, SnippetRevision.title, SnippetRevision.created_at,
+                                     SnippetRevision.content_hash, SnippetRevision.codec, SnippetRevision.data)
+                              .where(SnippetRevision.snippet_id == snippet_id,
+                                     SnippetRevision.number <= number,
+                                     SnippetRevision.number >= snapshot)
+                              .order_by(SnippetRevision.number))
+    rows = result.mappings().all()
+    if not rows or rows[-1]["number"] != number:
+        return None
+    try:
+        lines = _unpack(rows[0]).decode().splitlines(keepends=True)
+        for row in rows[1:]:
+            lines = _apply_to_lines(lines, _unpack(row))
+    except (ValueError, TypeError, zlib.error) as ex:
+        raise RevisionCorrupted(f"Revision {number} of snippet {snippet_id} cannot be rebuilt: {ex}") from ex
+    content = "".join(lines)
+    target = rows[-1]
+    if hashlib.sha256(content.encode()).hexdigest() != target["content_hash"]:
+        raise RevisionCorrupted(f"Revision {number} of snippet {snippet_id} does not match its hash")
+    return {"snippet_id": snippet_id, "number": number, "title": target["title"], "content": content,
+            "content_hash": target["content_hash"], "created_at": target["created_at"]}
@@ -0,0 +1,211 @@
+import hashlib
+import string
+from typing import Optional
+
+from sqlalchemy import select, insert, update, and_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from core.cache import LRUCache
+from core.config import app_settings
+from core.generations import GenerationTable
+from core.stats import register_stats
+from db.db import db_dependency
+from db.replicas import reads_from_replica
+from models.model import Snippet
+from models.shorted_url import ShortedUrl, ShortCodeCounter, SHORT_CODE_BLOCK_SIZE, short_code_sequence
+from services.snippet_cache import shared_url_generations, snippet_writes
+
+ALPHABET = string.digits + string.ascii_uppercase + string.ascii_lowercase
+
+
+class CodePermutation:
+    """Перестановка номеров 0..62^длина-1 по секретному ключу.
+
+    Сеть Фейстеля по битам номера с прогонкой по циклу: пока результат не попал
+    в пространство кодов, перестановка применяется снова. Разные номера дают разные
+    коды (повторы при вставке не нужны), а без ключа по номеру нельзя получить код.
+    """
+    ROUNDS = 6
+
+    def __init__(self, key: bytes, length: int):
+        self.space = 62 ** length
+        self.half_bits = ((self.space - 1).bit_length() + 1) // 2
+        self.mask = (1 << self.half_bits) - 1
+        # ключ blake2b не длиннее 64 байт
+        self.key = hashlib.sha256(key).digest()
+
+    def _round(self, number: int, value: int) -> int:
+        digest = hashlib.blake2b(value.to_bytes(8, "big"), digest_size=8, key=self.key, salt=bytes([number]))
+        return int.from_bytes(digest.digest(), "big") & self.mask
+
+    def _encrypt(self, value: int) -> int:
+        left, right = value >> self.half_bits, value & self.mask
+        for number in range(self.ROUNDS):
+            left, right = right, left ^ self._round(number, right)
+        return (left << self.half_bits) | right
+
+    def permute(self, number: int) -> int:
+        if not 0 <= number < self.space:
+            raise ValueError("Short code space is exhausted")
+        value = self._encrypt(number)
+        while value >= self.space:
+            value = self._encrypt(value)
+        return value
+
+
+code_permutation = CodePermutation(app_settings.short_code_secret.encode(), app_settings.short_code_length)
+
+
+def encode_base62(number: int, length: int) -> str:
+    """Число -> строка base62 фиксированной длины"""
+    chars = []
+    for _ in range(length):
+        number, digit = divmod(number, 62)
+        chars.append(ALPHABET[digit])
+    if number:
+        raise ValueError("Number does not fit into the code length")
+    return "".join(reversed(chars))
+
+
+def short_code(number: int, permutation: CodePermutation = code_permutation) -> str:
+    """Короткий код по порядковому номеру"""
+    return encode_base62(permutation.permute(number), app_settings.short_code_length)
+
+
+def short_link(code: str) -> str:
+    """Куда ведёт короткая ссылка: публичная страница сниппета"""
+    return f"/snippets/shared/{code}"
+
+
+class ShortCodeAllocator:
+    """Номера кодов из последовательности БД блоками по SHORT_CODE_BLOCK_SIZE.
+
+    Блок принадлежит одному воркеру, поэтому выдача кода внутри блока не ходит в БД,
+    а разные воркеры никогда не получают один номер.
+    """
+
+    def __init__(self):
+        self._next = 0
+        self._end = 0
+        self.blocks = 0
+
+    async def next_code(self, db: db_dependency) -> str:
+        if self._next >= self._end:
+            start = await self._allocate_block(db)
+            self._next, self._end = start, start + SHORT_CODE_BLOCK_SIZE
+            self.blocks += 1
+        number = self._next
+        self._next += 1
+        return short_code(number)
+
+    async def _allocate_block(self, db: db_dependency) -> int:
+        if db.get_bind().dialect.name == "postgresql":
+            # nextval вне транзакций: откат запроса не вернёт номер в последовательность
+            return await db.scalar(short_code_sequence.next_value())
+        # SQLite (локальные прогоны): счётчик в таблице, запись в БД одна на блок.
+        # Как и nextval, блок фиксируется своей короткой транзакцией: откат запроса
+        # не возвращает счётчик назад, и тот же блок не достанется другому воркеру
+        engine = db.bind.engine if isinstance(db.bind, AsyncConnection) else db.bind
+        async with engine.begin() as conn:
+            return await self._advance_counter(conn)
+
+    async def _advance_counter(self, conn: AsyncConnection) -> int:
+        end = await conn.scalar(update(ShortCodeCounter)
+                                .where(ShortCodeCounter.id == 1)
+                                .values(value=ShortCodeCounter.value + SHORT_CODE_BLOCK_SIZE)
+                                .returning(ShortCodeCounter.value))
+        if end is None:
+            try:
+                async with conn.begin_nested():
+                    await conn.execute(insert(ShortCodeCounter).values(id=1, value=SHORT_CODE_BLOCK_SIZE))
+                end = SHORT_CODE_BLOCK_SIZE
+            except IntegrityError:
+                return await self._advance_counter(conn)
+        return end - SHORT_CODE_BLOCK_SIZE
+
+    def stats(self) -> dict:
+        return {"blocks": self.blocks, "available": self._end - self._next}
+
+
+class HotCodeTable:
+    """Горячие короткие коды: код -> адрес перехода, с инвалидацией по id сниппета.
+
+    Как и кэш публичных сниппетов, проверяет на попадании общее для воркеров поколение кода.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, generations: GenerationTable = shared_url_generations):
+        self._cache = LRUCache(maxsize=maxsize, ttl=ttl)
+        self._generations = generations
+        self._codes_by_id: dict[int, str] = {}
+
+    def generation(self, code: str) -> int:
+        return self._generations.get(code)
+
+    def get(self, code: str) -> Optional[str]:
+        entry = self._cache.get(code)
+        if entry is None:
+            return None
+        generation, location = entry
+        if generation != self._generations.get(code):
+            self._cache.pop(code)
+            return None
+        return location
+
+    def set(self, code: str, snippet_id: int, location: str, generation: Optional[int] = None) -> None:
+        if snippet_writes.in_progress:
+            return
+        if generation is None:
+            generation = self.generation(code)
+        self._cache.set(code, (generation, location))
+        self._codes_by_id[snippet_id] = code
+        if len(self._codes_by_id) > 2 * self._cache.maxsize:
+            self._codes_by_id = {snippet_id: code for snippet_id, code in self._codes_by_id.items()
+                                 if self._cache.get(code, count=False) is not None}
+
+    def invalidate(self, snippet_id: int, code: Optional[str] = None) -> None:
+        cached_code = self._codes_by_id.pop(snippet_id, None)
+        for code in {cached_code, code}:
+            if code:
+                self._cache.pop(code)
+                self._generations.bump(code)
+
+    def clear(self) -> None:
+        self._cache.clear()
+        self._codes_by_id.clear()
+
+    def stats(self) -> dict:
+        return self._cache.stats()
+
+
+short_codes = ShortCodeAllocator()
+hot_codes = HotCodeTable(maxsize=app_settings.short_code_cache_size, ttl=app_settings.short_code_cache_ttl)
+register_stats("short_codes", lambda: {"allocator": short_codes.stats(), "hot_codes": hot_codes.stats()})
+
+
+def short_url_values(snippet_id: int, code: str) -> dict:
+    """Строка таблицы url для публичного сниппета"""
+    return {"snippet_id": snippet_id, "shorted_url": code, "origin": short_link(code)}
+
+
+async def resolve_short_code(db: db_dependency, code: str) -> Optional[str]:
+    """Адрес перехода по короткому коду: из горячей таблицы или одним запросом.
+
+    Код действителен, пока он остаётся ссылкой сниппета: у ставшего приватным сниппета
+    ссылка стирается, и старый код больше никуда не ведёт.
+    """
+    location = hot_codes.get(code)
+    if location is not None:
+        return location
+    generation = hot_codes.generation(code)
+    result = await db.execute(select(ShortedUrl.snippet_id, ShortedUrl.origin)
+                              .join(Snippet, and_(Snippet.id == ShortedUrl.snippet_id,
+                                                  Snippet.shared_url == ShortedUrl.shorted_url))
+                              .where(ShortedUrl.shorted_url == code))
+    row = result.first()
+    if row is None:
+        return None
+    if not reads_from_replica(db):
+        # реплика может отставать от записи, сделавшей код недействительным
+        hot_codes.set(code, row.snippet_id, row.origin, generation)
+    return row.origin
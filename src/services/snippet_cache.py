@@ -0,0 +1,107 @@
+import functools
+from typing import Optional
+
+from core.cache import LRUCache
+from core.config import app_settings
+from core.generations import GenerationTable
+from core.stats import register_stats
+
+
+def _snippet_weight(snippet: dict) -> int:
+    # примерный размер записи в памяти: текст сниппета плюс накладные расходы словаря
+    return len(snippet["content"]) + len(snippet["title"]) + 256
+
+
+class SnippetWrites:
+    """Незавершённые записи сниппетов в этом воркере.
+
+    Пока запись не закоммичена, прочитанная строка может оказаться старше её,
+    поэтому кэши в это время ничего не запоминают. Используется как декоратор
+    функций записи.
+    """
+
+    def __init__(self):
+        self.in_progress = 0
+
+    def __call__(self, func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            self.in_progress += 1
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                self.in_progress -= 1
+        return wrapper
+
+
+snippet_writes = SnippetWrites()
+# поколения ссылок публичных сниппетов, общие для воркеров: по ним кэш сниппетов и горячая
+# таблица коротких кодов узнают о записи, обработанной другим воркером
+shared_url_generations = GenerationTable("shared_urls")
+
+
+class SharedSnippetCache:
+    """Read-through кэш публичных сниппетов по shared_url с инвалидацией по id сниппета.
+
+    Запись хранится вместе с поколением ссылки, взятым до чтения из БД: попадание
+    с устаревшим поколением - промах, так инвалидация доходит до всех воркеров,
+    а чтение, начатое до записи, не возвращает в кэш старую строку.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, max_bytes: int,
+                 generations: GenerationTable = shared_url_generations):
+        self._cache = LRUCache(maxsize=maxsize, ttl=ttl, max_bytes=max_bytes,
+                               weigher=lambda entry: _snippet_weight(entry[1]))
+        self._generations = generations
+        # обратный индекс id сниппета -> shared_url, чтобы инвалидировать запись без запроса в БД
+        self._urls_by_id: dict[int, str] = {}
+
+    def generation(self, shared_url: str) -> int:
+        """Поколение ссылки: берётся до чтения из БД и передаётся в set"""
+        return self._generations.get(shared_url)
+
+    def get(self, shared_url: str) -> Optional[dict]:
+        entry = self._cache.get(shared_url)
+        if entry is None:
+            return None
+        generation, snippet = entry
+        if generation != self._generations.get(shared_url):
+            self._cache.pop(shared_url)
+            return None
+        return snippet
+
+    def set(self, snippet: dict, generation: Optional[int] = None) -> None:
+        """Положить в кэш сниппет - словарь колонок ответа SnippetResponse"""
+        if not snippet["shared_url"] or snippet_writes.in_progress:
+            return
+        if generation is None:
+            generation = self.generation(snippet["shared_url"])
+        self._cache.set(snippet["shared_url"], (generation, snippet))
+        self._urls_by_id[snippet["id"]] = snippet["shared_url"]
+        if len(self._urls_by_id) > 2 * self._cache.maxsize:
+            # вытесненные из LRU записи оставляют в индексе мусор - периодически его чистим
+            self._urls_by_id = {snippet_id: url for snippet_id, url in self._urls_by_id.items()
+                                if self._cache.get(url, count=False) is not None}
+
+    def invalidate(self, snippet_id: int, shared_url: Optional[str] = None) -> None:
+        """Удалить из кэша сниппет (по id и, если известна, по старой ссылке) во всех воркерах"""
+        cached_url = self._urls_by_id.pop(snippet_id, None)
+        for url in {cached_url, shared_url}:
+            if url:
+                self._cache.pop(url)
+                self._generations.bump(url)
+
+    def clear(self) -> None:
+        self._cache.clear()
+        self._urls_by_id.clear()
+
+    def stats(self) -> dict:
+        return self._cache.stats()
+
+
+shared_snippet_cache = SharedSnippetCache(
+    maxsize=app_settings.shared_snippet_cache_size,
+    ttl=app_settings.shared_snippet_cache_ttl,
+    max_bytes=app_settings.shared_snippet_cache_max_bytes,
+)
+register_stats("shared_snippet_cache", shared_snippet_cache.stats)
@@ -0,0 +1,95 @@
+import asyncio
+import logging
+
+from sqlalchemy import text, exc
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from auth.auth import create_access_token, generate_salt, get_current_user, get_user_by_email, hash_password_async
+from core.config import app_settings
+from db import db as database
+from services.crud_snippet import get_snippet_row, get_snippets, get_snippet_by_shared_url_from_db
+from services.rendering import render_executor, render_html, resolve_lexer, resolve_style
+
+logger = logging.getLogger(__name__)
+
+
+class Readiness:
+    """Состояние прогрева воркера для /health/ready"""
+
+    def __init__(self):
+        self.ready = False
+        self.error: str | None = None
+        self.retry_task: asyncio.Task | None = None
+
+
+readiness = Readiness()
+
+
+async def _warm_up_queries(session: AsyncSession) -> None:
+    await session.execute(text("SELECT 1"))
+    await get_snippet_row(session, 0)
+    await get_snippets(session, limit=1)
+    await get_snippet_by_shared_url_from_db(session, "")
+    await get_user_by_email(session, "")
+
+
+async def _warm_up_connection() -> None:
+    # каждый запрос выполняется на своём соединении: так asyncpg подготавливает
+    # выражения на нём, а SQLAlchemy один раз компилирует их в общий кэш движка
+    async with database.async_session() as session:
+        await _warm_up_queries(session)
+
+
+async def _warm_up_replica(replica) -> None:
+    # недоступная реплика не мешает готовности воркера: чтения пойдут в основную БД
+    try:
+        async with AsyncSession(replica) as session:
+            await _warm_up_queries(session)
+    except (exc.DBAPIError, OSError):
+        database.replica_set.mark_down(replica)
+
+
+async def warm_up() -> None:
+    """Прогрев воркера до приёма трафика: соединения пула, горячие запросы, bcrypt, JWT и рендеринг"""
+    # открываем несколько соединений одновременно, чтобы они остались в пуле
+    await asyncio.gather(*(_warm_up_connection() for _ in range(app_settings.warmup_connections)),
+                         *(_warm_up_replica(replica) for replica in database.replica_set.replicas
+                           for _ in range(app_settings.warmup_connections)))
+    # первое хеширование загружает backend passlib и поднимает потоки пула;
+    # одновременно запускается процесс рендеринга и загружает в нём pygments
+    await asyncio.gather(hash_password_async("warmup", generate_salt()),
+                         render_executor.run(render_html, "", resolve_lexer(None, "warmup.py"), resolve_style(None)))
+    await get_current_user(create_access_token(data={"sub": "warmup", "role": "warmup"}))
+
+
+async def _try_warm_up() -> bool:
+    try:
+        await asyncio.wait_for(warm_up(), timeout=app_settings.warmup_timeout)
+    except Exception as ex:
+        readiness.error = repr(ex)
+        return False
+    readiness.ready = True
+    readiness.error = None
+    return True
+
+
+async def _retry_warm_up() -> None:
+    while not await _try_warm_up():
+        await asyncio.sleep(app_settings.warmup_retry_interval)
+    logger.info("Warm-up finished after retry")
+
+
+async def run_warm_up() -> None:
+    """Прогрев с таймаутом; при ошибке воркер остаётся неготовым и прогрев повторяется в фоне"""
+    if not app_settings.warmup_enabled:
+        readiness.ready = True
+        return
+    if not await _try_warm_up():
+        logger.error(f"Warm-up failed, retrying in background: {readiness.error}")
+        readiness.retry_task = asyncio.get_running_loop().create_task(_retry_warm_up())
+
+
+def stop_warm_up() -> None:
+    if readiness.retry_task is not None:
+        readiness.retry_task.cancel()
+        readiness.retry_task = None
@@ -0,0 +1,21 @@
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from db.db import create_sessionmaker
+from models import Base
+
+
+@pytest_asyncio.fixture
+async def db_engine():
+    # локальный движок SQLite в памяти вместо PostgreSQL
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield engine
+    await engine.dispose()
+
+
+@pytest_asyncio.fixture
+async def db_session(db_engine):
+    async with create_sessionmaker(db_engine)() as session:
+        yield session
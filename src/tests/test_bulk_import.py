@@ -0,0 +1,75 @@
+import pytest
+from sqlalchemy import select
+
+from api.v1.snippets import _iter_ndjson
+from models.model import Snippet
+from services import crud_snippet
+from services.crud_snippet import bulk_create_snippets
+
+
+class ChunkedRequest:
+    """Тело запроса, приходящее заданными кусками"""
+
+    def __init__(self, *chunks: bytes):
+        self.chunks = chunks
+
+    async def stream(self):
+        for chunk in self.chunks:
+            yield chunk
+
+
+async def collect(items) -> list:
+    return [item async for item in items]
+
+
+@pytest.mark.asyncio
+async def test_ndjson_lines_split_across_chunks():
+    request = ChunkedRequest(b'{"title": "a", "con', b'tent": "x"}\n\n{"title"', b': "b", "content": "y"}\r\n',
+                             b'not json\n{"title": "c", "content": "z"}')
+    items = await collect(_iter_ndjson(request))
+    assert [index for index, _ in items] == [0, 1, 2, 3]
+    assert items[0][1] == {"title": "a", "content": "x"}
+    assert items[1][1] == {"title": "b", "content": "y"}
+    assert isinstance(items[2][1], ValueError)
+    assert items[3][1] == {"title": "c", "content": "z"}
+
+
+@pytest.mark.asyncio
+async def test_bad_rows_are_reported_by_index_and_skipped(db_session, monkeypatch):
+    # два публичных сниппета пачки получают одну ссылку: многострочная вставка падает
+    # на уникальности shared_url, и пачка вставляется построчно в savepoint
+    codes = iter(["code-a", "dup", "dup"])
+
+    async def next_code(db):
+        return next(codes)
+
+    monkeypatch.setattr(crud_snippet, "generate_shared_url", next_code)
+
+    async def items():
+        yield 0, {"title": "a", "content": "1", "is_private": False}
+        yield 1, ValueError("Invalid JSON: unexpected character")
+        yield 2, {"title": "b", "content": "2", "is_private": False}
+        yield 3, {"title": "c"}
+        yield 4, {"title": "d", "content": "4", "is_private": False}
+        yield 5, {"title": "e", "content": "5"}
+
+    result = await bulk_create_snippets(db_session, items(), batch_size=10)
+    assert result.inserted == 3
+    assert [error["index"] for error in result.errors] == [1, 3, 4]
+    assert "Invalid JSON" in result.errors[0]["error"]
+    assert "UNIQUE" in result.errors[2]["error"]
+    titles = (await db_session.scalars(select(Snippet.title).order_by(Snippet.id))).all()
+    assert titles == ["a", "b", "e"]
+
+
+@pytest.mark.asyncio
+async def test_reported_errors_are_capped(db_session, monkeypatch):
+    monkeypatch.setattr(crud_snippet, "MAX_REPORTED_ERRORS", 2)
+
+    async def items():
+        for index in range(5):
+            yield index, {"title": "no content"}
+
+    result = await bulk_create_snippets(db_session, items(), batch_size=10)
+    assert result.as_dict()["failed"] == 5
+    assert [error["index"] for error in result.errors] == [0, 1]
@@ -0,0 +1,47 @@
+import gzip
+
+import pytest
+from sqlalchemy import select
+
+from core.compression import negotiate_encoding, compress_body, brotli
+from models.model import Snippet
+from schemas.snippet import SnippetCreate, SnippetUpdate
+from services.crud_snippet import create_snippet, get_snippet_row, get_snippets, update_snippet
+
+
+@pytest.mark.asyncio
+async def test_large_content_is_compressed_at_rest(db_session):
+    content = "def f():\n    return 42\n" * 1000
+    created = await create_snippet(db_session, SnippetCreate(title="big", content=content, is_private=True))
+    assert created["content"] == content
+
+    stored_columns = select(Snippet.content, Snippet.content_codec, Snippet.content_compressed).where(
+        Snippet.id == created["id"])
+    stored = (await db_session.execute(stored_columns)).one()
+    assert stored.content == "" and stored.content_codec == "zlib"
+    assert len(stored.content_compressed) < len(content)
+
+    assert (await get_snippet_row(db_session, created["id"]))["content"] == content
+    assert (await get_snippets(db_session))[0]["content"] == content
+
+    # после обновления коротким текстом сжатие снимается
+    await update_snippet(db_session, created["id"], SnippetUpdate(title="big", content="x", is_private=True))
+    assert (await get_snippet_row(db_session, created["id"]))["content"] == "x"
+    stored = (await db_session.execute(stored_columns)).one()
+    assert stored.content == "x" and stored.content_codec is None and stored.content_compressed is None
+
+
+def test_accept_encoding_negotiation():
+    assert negotiate_encoding("") is None
+    assert negotiate_encoding("gzip;q=0, identity") is None
+    assert negotiate_encoding("deflate, gzip;q=0.5") == "gzip"
+    assert negotiate_encoding("*") == "gzip"
+    # явный отказ от gzip не отменяется звёздочкой
+    assert negotiate_encoding("gzip;q=0, *") == ("br" if brotli is not None else None)
+    assert negotiate_encoding("gzip;q=0, br;q=0, *") is None
+    assert negotiate_encoding("br, gzip") == ("br" if brotli is not None else "gzip")
+
+    body = b'{"content": "' + b"x" * 4096 + b'"}'
+    compressed = compress_body(body, "gzip")
+    assert gzip.decompress(compressed) == body
+    assert compress_body(body, "gzip") is compressed  # повторное сжатие берётся из кэша
@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from core.conditional import PreconditionFailed, snippet_etag, encoded_etag, http_date, is_not_modified, parse_snippet_etag
+from schemas.snippet import SnippetCreate, SnippetUpdate
+from services.crud_snippet import create_snippet, get_snippet_validators, update_snippet
+
+
+def test_not_modified_conditions():
+    updated_at = datetime(2025, 1, 1, 12, 0, 0, 500000)
+    etag = snippet_etag(1, updated_at, "ab" * 32)
+
+    assert is_not_modified({"if-none-match": etag}, etag, updated_at)
+    # ETag сжатого представления и слабое сравнение тоже считаются совпадением
+    assert is_not_modified({"if-none-match": f'"x", W/{encoded_etag(etag, "gzip")}'}, etag, updated_at)
+    assert not is_not_modified({"if-none-match": '"other"'}, etag, updated_at)
+    # If-None-Match приоритетнее If-Modified-Since
+    assert not is_not_modified({"if-none-match": '"other"', "if-modified-since": http_date(updated_at)},
+                               etag, updated_at)
+    assert is_not_modified({"if-modified-since": http_date(updated_at)}, etag, updated_at)
+    assert not is_not_modified({"if-modified-since": http_date(updated_at - timedelta(seconds=1))},
+                               etag, updated_at)
+    assert not is_not_modified({"if-modified-since": "garbage"}, etag, updated_at)
+
+
+@pytest.mark.asyncio
+async def test_update_with_stale_if_match_is_rejected(db_session):
+    created = await create_snippet(db_session, SnippetCreate(title="t", content="v1"))
+    validators = await get_snippet_validators(db_session, created["id"])
+    etag = snippet_etag(validators["id"], validators["updated_at"], validators["content_hash"])
+
+    updated = await update_snippet(db_session, created["id"], SnippetUpdate(title="t", content="v2"), if_match=etag)
+    assert updated["content"] == "v2"
+    assert updated["content_hash"] != created["content_hash"]
+
+    # второй клиент пишет со старым ETag - его изменение не должно затереть первое
+    with pytest.raises(PreconditionFailed):
+        await update_snippet(db_session, created["id"], SnippetUpdate(title="t", content="v3"), if_match=etag)
+
+
+@pytest.mark.asyncio
+async def test_weak_etag_does_not_satisfy_if_match(db_session):
+    created = await create_snippet(db_session, SnippetCreate(title="t", content="v1"))
+    etag = snippet_etag(created["id"], created["updated_at"], created["content_hash"])
+    assert parse_snippet_etag(etag) is not None
+    assert parse_snippet_etag(f"W/{etag}") is None
+    # для If-None-Match слабое сравнение остаётся
+    assert is_not_modified({"if-none-match": f"W/{etag}"}, etag, created["updated_at"])
+
+    with pytest.raises(PreconditionFailed):
+        await update_snippet(db_session, created["id"], SnippetUpdate(title="t", content="v2"), if_match=f"W/{etag}")
+    updated = await update_snippet(db_session, created["id"], SnippetUpdate(title="t", content="v2"),
+                                   if_match=f"W/{etag}, {etag}")
+    assert updated["content"] == "v2"
@@ -0,0 +1,25 @@
+import asyncio
+import threading
+
+import pytest
+
+from core.executor import BoundedExecutor, ExecutorSaturated
+
+
+@pytest.mark.asyncio
+async def test_saturated_executor_fails_fast():
+    executor = BoundedExecutor("test", max_workers=1, max_queue=1)
+    release = threading.Event()
+    # одна задача выполняется, вторая ждёт в очереди, третья должна быть отклонена сразу
+    running = [asyncio.create_task(executor.run(release.wait)) for _ in range(2)]
+    await asyncio.sleep(0.05)
+    with pytest.raises(ExecutorSaturated):
+        await executor.run(release.wait)
+    release.set()
+    await asyncio.gather(*running)
+
+    stats = executor.stats()
+    assert stats["completed"] == 2
+    assert stats["rejected"] == 1
+    assert stats["in_flight"] == 0
+    executor.shutdown()
@@ -0,0 +1,77 @@
+import gzip
+import struct
+import zlib
+
+import httpx
+import orjson
+import pytest
+from fastapi import FastAPI
+from sqlalchemy.ext.asyncio import create_async_engine
+
+import api.v1.snippets
+import db.db
+from api.v1.snippets import snippets_router
+from auth.auth import get_current_user
+from core.config import app_settings
+from db.db import create_sessionmaker
+from db.replicas import ReplicaSet
+from models import Base
+from services.crud_snippet import bulk_create_snippets, iter_snippets_for_export
+
+ROWS = 130
+
+
+@pytest.mark.asyncio
+async def test_export_streams_all_rows_in_order(tmp_path, monkeypatch):
+    # файловая SQLite: выгрузка читает через собственную сессию на движке replica_set
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'export.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    monkeypatch.setitem(vars(db.db), "replica_set", ReplicaSet(engine, []))
+    monkeypatch.setattr(app_settings, "export_fetch_size", 50)
+    # каждый десятый текст больше порога и хранится сжатым
+    contents = [("long %d " % index) * 2000 if index % 10 == 0 else f"short {index}" for index in range(ROWS)]
+
+    async def items():
+        for index, content in enumerate(contents):
+            yield index, {"title": f"t{index}", "content": content}
+
+    async with create_sessionmaker(engine)() as session:
+        assert (await bulk_create_snippets(session, items(), batch_size=100)).inserted == ROWS
+    assert len(contents[0].encode()) > app_settings.content_compression_threshold
+
+    batches = []
+
+    async def recorded_batches(fetch_size):
+        async for rows in iter_snippets_for_export(fetch_size):
+            batches.append(len(rows))
+            yield rows
+
+    monkeypatch.setattr(api.v1.snippets, "iter_snippets_for_export", recorded_batches)
+    app = FastAPI()
+    app.include_router(snippets_router)
+    app.dependency_overrides[get_current_user] = lambda: {"role": "user"}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        async with client.stream("GET", "/snippets/export") as response:
+            assert response.status_code == 200
+            assert response.headers["content-type"] == "application/x-ndjson"
+            body = b"".join([chunk async for chunk in response.aiter_raw()])
+        # строки читаются из курсора пачками по export_fetch_size
+        assert batches == [50, 50, 30]
+
+        # сжатый поток читаем как есть, без распаковки клиентом
+        async with client.stream("GET", "/snippets/export", params={"gzip": "true"}) as response:
+            assert response.headers["content-encoding"] == "gzip"
+            compressed = b"".join([chunk async for chunk in response.aiter_raw()])
+
+    lines = body.splitlines()
+    assert len(lines) == ROWS
+    rows = [orjson.loads(line) for line in lines]
+    assert [row["id"] for row in rows] == sorted(row["id"] for row in rows)
+    assert [row["content"] for row in rows] == contents
+
+    # gzip.decompress проверяет CRC и длину из трейлера
+    assert gzip.decompress(compressed) == body
+    crc, size = struct.unpack("<II", compressed[-8:])
+    assert crc == zlib.crc32(body) and size == len(body)
+    await engine.dispose()
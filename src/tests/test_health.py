@@ -0,0 +1,76 @@
+import time
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+import db.db
+from api.v1 import health
+from core.config import app_settings
+from services import warmup
+
+
+@pytest.fixture
+def probe_app(monkeypatch, tmp_path):
+    monkeypatch.setattr(warmup, "readiness", warmup.Readiness())
+    monkeypatch.setattr(health, "readiness", warmup.readiness)
+    # пул на одно соединение с долгим ожиданием, как исчерпанный пул под нагрузкой
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'health.db'}", poolclass=AsyncAdaptedQueuePool,
+                                 pool_size=1, max_overflow=0, pool_timeout=30)
+    monkeypatch.setitem(vars(db.db), "engine", engine)
+    app = FastAPI()
+    app.include_router(health.health_router)
+    yield app, engine
+
+
+async def get_ready(app: FastAPI) -> httpx.Response:
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        return await client.get("/health/ready")
+
+
+@pytest.mark.asyncio
+async def test_ready_only_after_successful_warm_up(probe_app, monkeypatch):
+    app, engine = probe_app
+    response = await get_ready(app)
+    assert response.status_code == 503
+    assert response.json() == {"status": "warming_up"}
+
+    # прогрев падает дважды: воркер неготов, повтор идёт в фоне, пока не получится
+    attempts = []
+
+    async def flaky_warm_up():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ConnectionError("database is starting up")
+
+    monkeypatch.setattr(warmup, "warm_up", flaky_warm_up)
+    monkeypatch.setattr(app_settings, "warmup_retry_interval", 0.01)
+    await warmup.run_warm_up()
+    assert (await get_ready(app)).status_code == 503
+    assert "database is starting up" in warmup.readiness.error
+    assert "database is starting up" not in (await get_ready(app)).text
+
+    await warmup.readiness.retry_task
+    assert len(attempts) == 3
+    response = await get_ready(app)
+    assert response.status_code == 200
+    assert response.json() == {"status": "ready"}
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_ready_fails_fast_when_pool_is_exhausted(probe_app, monkeypatch):
+    app, engine = probe_app
+    warmup.readiness.ready = True
+    monkeypatch.setattr(health, "READINESS_DB_TIMEOUT", 0.1)
+    async with engine.connect():
+        started = time.monotonic()
+        response = await get_ready(app)
+        # ответ по таймауту пробы, а не через pool_timeout
+        assert time.monotonic() - started < 5
+    assert response.status_code == 503
+    assert response.json() == {"status": "database_unavailable"}
+    assert (await get_ready(app)).status_code == 200
+    await engine.dispose()
@@ -0,0 +1,56 @@
+import logging
+import queue
+
+import orjson
+
+from core.log_pipeline import (BatchingFileHandler, BatchingQueueListener, BoundedQueueHandler, JSONFormatter,
+                               SamplingFilter, pipeline_stats)
+
+
+def make_record(name: str = "app", level: int = logging.INFO, msg: str = "hello %s", **extra) -> logging.LogRecord:
+    record = logging.makeLogRecord({"name": name, "levelno": level, "levelname": logging.getLevelName(level),
+                                    "msg": msg, "args": ("world",)})
+    record.__dict__.update(extra)
+    return record
+
+
+def test_full_queue_drops_instead_of_blocking():
+    handler = BoundedQueueHandler(queue.Queue(maxsize=2))
+    dropped = pipeline_stats.dropped
+    for _ in range(5):
+        handler.handle(make_record())
+    assert handler.queue.qsize() == 2
+    assert pipeline_stats.dropped == dropped + 3
+
+
+def test_sampling_never_drops_warnings():
+    sampling = SamplingFilter({"noisy": 0.0})
+    assert not sampling.filter(make_record("noisy.child"))
+    assert sampling.filter(make_record("noisy", level=logging.WARNING))
+    assert sampling.filter(make_record("other"))
+
+
+def test_listener_writes_json_batches_and_rotates(tmp_path):
+    path = tmp_path / "app.log"
+    file_handler = BatchingFileHandler(str(path), maxBytes=100_000, backupCount=2)
+    file_handler.setFormatter(JSONFormatter())
+    records = queue.Queue(maxsize=100)
+    listener = BatchingQueueListener(records, file_handler)
+    handler = BoundedQueueHandler(records)
+
+    listener.start()
+    for index in range(6):
+        handler.handle(make_record(request_id=index))
+    listener.stop()
+    listener.stop()  # повторная остановка (lifespan + atexit) ничего не делает
+
+    lines = [orjson.loads(line) for line in path.read_text().splitlines()]
+    assert [line["request_id"] for line in lines] == list(range(6))
+    assert lines[0]["message"] == "hello world" and lines[0]["level"] == "INFO"
+
+    # следующая пачка не помещается в maxBytes - файл ротируется
+    file_handler.maxBytes = path.stat().st_size
+    file_handler.handle_batch([make_record()])
+    file_handler.close()
+    assert len((tmp_path / "app.log.1").read_text().splitlines()) == 6
+    assert len(path.read_text().splitlines()) == 1
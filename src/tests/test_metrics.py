@@ -0,0 +1,78 @@
+import os
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from core import metrics
+from core.config import RUN_DIR_ENV, app_settings, run_dir
+from core.metrics import RequestMetrics, request_metrics
+from core.middleware import ErrorAndMetricsMiddleware
+
+
+def test_snapshots_of_workers_are_summed():
+    first, second = RequestMetrics((0.1, 1.0)), RequestMetrics((0.1, 1.0))
+    first.observe("GET", "/snippets/{snippet_id}", 200, 0.05)
+    second.observe("GET", "/snippets/{snippet_id}", 200, 0.5)
+    second.observe("GET", "/snippets/{snippet_id}", 404, 5.0)
+
+    total = RequestMetrics((0.1, 1.0))
+    total.merge(first.snapshot())
+    total.merge(second.snapshot())
+    text = total.render()
+
+    assert 'http_requests_total{method="GET",route="/snippets/{snippet_id}",status="200"} 2' in text
+    assert 'http_requests_total{method="GET",route="/snippets/{snippet_id}",status="404"} 1' in text
+    # корзины кумулятивные
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/snippets/{snippet_id}",le="0.1"} 1' in text
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/snippets/{snippet_id}",le="1.0"} 2' in text
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/snippets/{snippet_id}",le="+Inf"} 3' in text
+    assert 'http_request_duration_seconds_count{method="GET",route="/snippets/{snippet_id}"} 3' in text
+
+
+@pytest.mark.asyncio
+async def test_middleware_labels_route_template_and_hides_errors():
+    app = FastAPI()
+    app.add_middleware(ErrorAndMetricsMiddleware)
+
+    @app.get("/items/{item_id}")
+    async def read_item(item_id: str):
+        if item_id == "boom":
+            raise RuntimeError("boom")
+        return {"id": item_id}
+
+    request_metrics.requests.clear()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        assert (await client.get("/items/a")).status_code == 200
+        assert (await client.get("/items/b")).status_code == 200
+        response = await client.get("/items/boom")
+        assert response.status_code == 500
+        assert response.json() == {"message": "Internal server error"}
+        assert (await client.get("/nowhere")).status_code == 404
+
+    assert request_metrics.requests[("GET", "/items/{item_id}", "200")] == 2
+    assert request_metrics.requests[("GET", "/items/{item_id}", "500")] == 1
+    assert request_metrics.requests[("GET", "<unmatched>", "404")] == 1
+
+
+def test_each_run_gets_own_directory(monkeypatch):
+    monkeypatch.delenv(RUN_DIR_ENV, raising=False)
+    first = run_dir()
+    # воркеры получают каталог через окружение
+    assert os.environ[RUN_DIR_ENV] == first and run_dir() == first
+    monkeypatch.delenv(RUN_DIR_ENV)
+    # новый запуск из той же оболочки не подхватывает снимки прошлого
+    assert run_dir() != first
+
+
+def test_reused_pid_does_not_overwrite_finished_worker(monkeypatch, tmp_path):
+    monkeypatch.setattr(app_settings, "metrics_dir", str(tmp_path))
+    monkeypatch.setattr(metrics, "request_metrics", RequestMetrics((0.1, 1.0)))
+    metrics.request_metrics.observe("GET", "/items", 200, 0.05)
+    metrics.write_snapshot()
+    # новый воркер с тем же pid: свой файл снимка, итоги прежнего сохраняются
+    monkeypatch.setattr(metrics, "_snapshot_name", (0, ""))
+    monkeypatch.setattr(metrics, "request_metrics", RequestMetrics((0.1, 1.0)))
+    metrics.request_metrics.observe("GET", "/items", 200, 0.05)
+    assert 'http_requests_total{method="GET",route="/items",status="200"} 2' in metrics.render_all_workers()
+    assert len(os.listdir(tmp_path)) == 2
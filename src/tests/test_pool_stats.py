@@ -0,0 +1,42 @@
+import pytest
+from sqlalchemy import exc
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from core.config import uvicorn_options
+from db.db import create_engine_from_settings, get_pool_stats, instrumented_pool_class, server_max_connections
+
+
+@pytest.mark.asyncio
+async def test_pool_counts_overflow_and_timeouts(tmp_path):
+    # файловая SQLite с пулом на одно соединение и одно сверх него
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}", poolclass=instrumented_pool_class(),
+                                 pool_size=1, max_overflow=1, pool_timeout=0.05)
+    first = await engine.connect()
+    second = await engine.connect()
+    with pytest.raises(exc.TimeoutError):
+        await engine.connect()
+    stats = get_pool_stats(engine)
+    assert stats["in_use"] == 2 and stats["overflow"] == 1
+    assert stats["checkouts"] == 2
+    assert stats["overflow_events"] == 1
+    assert stats["timeouts"] == 1
+    assert stats["checkout_wait_max_ms"] >= 50
+    assert stats["max_connections_per_worker"] == 2
+    await second.close()
+    await first.close()
+
+    # соединение вернулось в пул - повторная выдача без переполнения
+    async with engine.connect():
+        pass
+    stats = get_pool_stats(engine)
+    assert stats["checkouts"] == 3 and stats["overflow_events"] == 1
+    await engine.dispose()
+
+
+def test_server_max_connections_includes_replicas_on_same_server():
+    primary = create_engine_from_settings("postgresql+asyncpg://app@db:5432/snipper")
+    same_server = create_engine_from_settings("postgresql+asyncpg://app@db:5432/snipper_replica")
+    other_server = create_engine_from_settings("postgresql+asyncpg://app@replica:5432/snipper")
+    per_pool = get_pool_stats(primary)["max_connections_all_workers"]
+    assert per_pool == get_pool_stats(primary)["max_connections_per_worker"] * uvicorn_options["workers"]
+    assert server_max_connections(primary, [same_server, other_server]) == 2 * per_pool
@@ -0,0 +1,88 @@
+import math
+import sqlite3
+import time
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from auth.auth import limit_auth_attempts
+from core.config import app_settings
+from core.rate_limit import TokenBucketStore
+
+
+def test_bucket_is_shared_between_workers_and_refills(tmp_path):
+    path = str(tmp_path / "buckets.db")
+    # два хранилища на одном файле - как два воркера uvicorn
+    first, second = TokenBucketStore(path), TokenBucketStore(path)
+    bucket = [("ip:1.2.3.4", 2, 0.5)]
+    assert first.take(bucket, now=100.0) == 0
+    assert second.take(bucket, now=100.0) == 0
+    assert first.take(bucket, now=100.0) == pytest.approx(2.0)
+    # отказ токены не тратит, через секунду не хватает ещё половины токена
+    assert second.take(bucket, now=101.0) == pytest.approx(1.0)
+    assert first.take(bucket, now=102.0) == 0
+    # запрос проходит, только если есть токен в каждом ведре
+    assert first.take([("ip:5.6.7.8", 10, 1.0), ("ip:1.2.3.4", 2, 0.5)], now=102.0) > 0
+    assert first.stats()["limited"] == 2 and second.stats()["limited"] == 1
+
+
+def test_auth_attempts_get_429_with_retry_after(monkeypatch, tmp_path):
+    import auth.auth
+    monkeypatch.setattr(auth.auth, "auth_rate_limiter", TokenBucketStore(str(tmp_path / "buckets.db")))
+    request = Request({"type": "http", "client": ("10.0.0.1", 1234), "headers": []})
+    for _ in range(5):
+        limit_auth_attempts(request, "User@example.com")
+    with pytest.raises(HTTPException) as error:
+        limit_auth_attempts(request, "user@example.com ")
+    assert error.value.status_code == 429
+    assert int(error.value.headers["Retry-After"]) == math.ceil(1 / app_settings.auth_rate_limit_account_per_second)
+
+
+class BusyStore:
+    """Блокировка записи другим воркером дольше busy_timeout"""
+
+    def __init__(self, path: str):
+        self.writer = sqlite3.connect(path, isolation_level=None)
+
+    def __enter__(self):
+        self.writer.execute("BEGIN IMMEDIATE")
+
+    def __exit__(self, *exc_info):
+        self.writer.execute("ROLLBACK")
+
+
+def test_busy_store_falls_back_to_worker_buckets(tmp_path):
+    path = str(tmp_path / "buckets.db")
+    store = TokenBucketStore(path)
+    bucket = [("ip:1.2.3.4", 2, 0.5)]
+    assert store.take(bucket, now=100.0) == 0
+    with BusyStore(path):
+        started = time.perf_counter()
+        results = [store.take(bucket, now=100.0 + second) for second in range(3)]
+        elapsed = time.perf_counter() - started
+    # лимит продолжает действовать по пустому ведру процесса: только пополнение, без нового запаса
+    assert results[0] == pytest.approx(2.0) and results[1] == pytest.approx(1.0) and results[2] == 0
+    assert store.stats()["errors"] == 3
+    # каждая проверка ждёт блокировку не дольше busy_timeout, а не блокирует цикл надолго
+    assert elapsed < 3 * (store.busy_timeout_ms / 1000 + 0.05)
+    # файл освободился - снова общее ведро (в нём остался токен плюс пополнение)
+    assert store.take(bucket, now=102.0) == 0
+
+
+def test_fallback_never_exceeds_capacity(tmp_path):
+    path = str(tmp_path / "buckets.db")
+    # четыре воркера, файл то занят, то свободен; время стоит - пополнения нет
+    workers = [TokenBucketStore(path) for _ in range(4)]
+    busy = BusyStore(path)
+    bucket = [("account:user@example.com", 5, 0.1)]
+    allowed = 0
+    for attempt in range(40):
+        worker = workers[attempt % len(workers)]
+        if attempt // 3 % 2:
+            with busy:
+                allowed += worker.take(bucket, now=100.0) == 0
+        else:
+            allowed += worker.take(bucket, now=100.0) == 0
+    assert allowed == 5
+    assert sum(worker.stats()["errors"] for worker in workers) > 0
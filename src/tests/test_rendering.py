@@ -0,0 +1,41 @@
+import asyncio
+
+import pytest
+
+from core.cache import LRUCache
+from services import rendering
+from services.rendering import RenderOptionError, render_snippet, resolve_lexer, resolve_style
+
+
+def test_options_are_canonical_and_validated():
+    # псевдонимы и регистр не размножают ключи кэша
+    assert resolve_lexer("PY", "x") == resolve_lexer("python", "x") == "python"
+    assert resolve_lexer(None, "main.py") == "python"
+    assert resolve_lexer(None, "Заметка") == "text"
+    assert resolve_style(None) == "default"
+    assert resolve_style("Monokai") == "monokai"
+    with pytest.raises(RenderOptionError):
+        resolve_lexer("no-such-lexer", "x")
+    with pytest.raises(RenderOptionError):
+        resolve_style("no-such-style")
+
+
+@pytest.mark.asyncio
+async def test_identical_content_is_rendered_once(monkeypatch):
+    monkeypatch.setattr(rendering, "render_cache", LRUCache(maxsize=16, max_bytes=1024 * 1024, weigher=len))
+    executor = rendering.render_executor
+    completed = executor.completed
+    try:
+        content = "def f():\n    return 1\n"
+        # одновременные запросы одного текста (разные сниппеты, хеш не передан) ждут один рендеринг
+        results = await asyncio.gather(*(render_snippet(content, None, "python", "default") for _ in range(5)))
+        assert executor.completed == completed + 1
+        assert len(set(results)) == 1
+        assert b'<span class="k">def</span>' in results[0] and b".highlight" in results[0]
+
+        await render_snippet(content, None, "python", "default")
+        assert executor.completed == completed + 1
+        await render_snippet(content, None, "python", "monokai")
+        assert executor.completed == completed + 2
+    finally:
+        executor.shutdown()
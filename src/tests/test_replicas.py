@@ -0,0 +1,74 @@
+import httpx
+import pytest
+from fastapi import FastAPI
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from core.config import app_settings
+from core.middleware import ReadYourWritesMiddleware
+from db.db import create_sessionmaker
+from db.replicas import ReplicaSet, read_primary_requested, read_session
+
+
+async def make_database(path, name: str):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    async with engine.begin() as conn:
+        await conn.execute(text("CREATE TABLE node (name TEXT)"))
+        await conn.execute(text("INSERT INTO node VALUES (:name)"), {"name": name})
+    return engine
+
+
+async def read_node(replica_set: ReplicaSet, read_primary: bool = False) -> str:
+    async with read_session(replica_set, read_primary) as session:
+        return await session.scalar(text("SELECT name FROM node"))
+
+
+@pytest.mark.asyncio
+async def test_reads_are_balanced_and_fail_over_to_primary(tmp_path):
+    # три файла SQLite вместо основной БД и двух реплик: по имени видно, куда ушёл запрос
+    primary = await make_database(tmp_path / "primary.db", "primary")
+    first = await make_database(tmp_path / "first.db", "first")
+    second = await make_database(tmp_path / "second.db", "second")
+    replica_set = ReplicaSet(primary, [first, second])
+
+    assert [await read_node(replica_set) for _ in range(4)] == ["first", "second", "first", "second"]
+    assert await read_node(replica_set, read_primary=True) == "primary"
+
+    # реплика недоступна - сессия переключается на основную БД, реплика исключается из ротации
+    broken = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'missing' / 'replica.db'}")
+    replica_set = ReplicaSet(primary, [broken, second])
+    assert await read_node(replica_set) == "primary"
+    assert replica_set.stats()["replicas"][0]["down"]
+    assert [await read_node(replica_set) for _ in range(2)] == ["second", "second"]
+
+    # least_connections: пока на первой реплике открыта сессия, следующая уходит на вторую
+    replica_set = ReplicaSet(primary, [first, second], balancing="least_connections")
+    async with read_session(replica_set):
+        assert await read_node(replica_set) == "second"
+    for engine in (primary, first, second, broken):
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_write_sets_read_your_writes_cookie(tmp_path, monkeypatch):
+    monkeypatch.setattr(app_settings, "postgres_replica_dsns", ["sqlite+aiosqlite://"])
+    primary = await make_database(tmp_path / "primary.db", "primary")
+    app = FastAPI()
+    app.add_middleware(ReadYourWritesMiddleware)
+
+    @app.post("/nodes")
+    async def add_node():
+        async with create_sessionmaker(primary)() as session:
+            await session.execute(text("INSERT INTO node VALUES ('new')"))
+            await session.commit()
+        return {}
+
+    @app.get("/nodes")
+    async def list_nodes():
+        return {}
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        assert "set-cookie" not in (await client.get("/nodes")).headers
+        response = await client.post("/nodes")
+    assert read_primary_requested(response.cookies)
+    await primary.dispose()
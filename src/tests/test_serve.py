@@ -0,0 +1,25 @@
+import time
+
+import pytest
+import uvicorn
+from fastapi import FastAPI
+
+from core.config import app_settings
+from serve import WorkerServer, rss_bytes
+
+
+@pytest.mark.asyncio
+async def test_worker_exits_when_rss_exceeds_limit(monkeypatch):
+    config = uvicorn.Config(FastAPI(), limit_max_requests=100)
+    config.load()
+    server = WorkerServer(config, time.monotonic())
+    assert rss_bytes() > 0
+
+    monkeypatch.setattr(app_settings, "server_max_rss_mb", 1 << 20)
+    assert not await server.on_tick(0)
+    monkeypatch.setattr(app_settings, "server_max_rss_mb", 1)
+    assert await server.on_tick(0)
+    # и после server_max_requests запросов - как обычный uvicorn
+    monkeypatch.setattr(app_settings, "server_max_rss_mb", 0)
+    server.server_state.total_requests = 100
+    assert await server.on_tick(1)
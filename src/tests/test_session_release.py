@@ -0,0 +1,61 @@
+import httpx
+import pytest
+from fastapi import APIRouter, FastAPI, HTTPException
+from pydantic import BaseModel, field_validator
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+import db.db
+from db.db import SessionRoute, create_sessionmaker, db_dependency
+
+
+@pytest.mark.asyncio
+async def test_connection_is_released_before_serialization_and_rolled_back_on_error(tmp_path, monkeypatch):
+    # файловая SQLite с очередью соединений, как у PostgreSQL, чтобы видеть checkedout()
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'app.db'}", poolclass=AsyncAdaptedQueuePool)
+    async with engine.begin() as conn:
+        await conn.execute(text("CREATE TABLE items (name TEXT)"))
+    monkeypatch.setattr(db.db, "async_session", create_sessionmaker(engine))
+    checked_out = []
+
+    class Item(BaseModel):
+        name: str
+
+        @field_validator("name")
+        @classmethod
+        def record_pool(cls, value):
+            checked_out.append(engine.pool.checkedout())
+            return value
+
+    router = APIRouter(route_class=SessionRoute)
+
+    @router.get("/items", response_model=list[Item])
+    async def list_items(db: db_dependency):
+        rows = await db.execute(text("SELECT name FROM items"))
+        return [{"name": name} for name, in rows]
+
+    @router.post("/items")
+    async def add_item(db: db_dependency):
+        await db.execute(text("INSERT INTO items VALUES ('lost')"))
+        raise HTTPException(status_code=409, detail="conflict")
+
+    @router.get("/static")
+    async def static(db: db_dependency):
+        return {"ok": True}
+
+    app = FastAPI()
+    app.include_router(router)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        assert (await client.post("/items")).status_code == 409
+        async with engine.begin() as conn:
+            await conn.execute(text("INSERT INTO items VALUES ('kept')"))
+        response = await client.get("/items")
+        assert response.json() == [{"name": "kept"}]  # вставка упавшего запроса откатилась
+        assert checked_out == [0]  # к сериализации ответа соединение уже в пуле
+
+        checkouts = engine.pool.checkedin() + engine.pool.checkedout()
+        assert (await client.get("/static")).status_code == 200
+        # обработчик без запросов к БД новых соединений не открывает
+        assert engine.pool.checkedin() + engine.pool.checkedout() == checkouts
+    await engine.dispose()
@@ -0,0 +1,63 @@
+import pytest
+
+from schemas.snippet import SnippetCreate, SnippetUpdate
+from services.crud_snippet import create_snippet, update_snippet
+from services.short_codes import CodePermutation, ShortCodeAllocator, resolve_short_code, short_code, short_codes, hot_codes
+
+
+def test_codes_are_short_and_unique():
+    codes = {short_code(number) for number in range(20_000)}
+    assert len(codes) == 20_000
+    assert {len(code) for code in codes} == {7}
+    # соседние номера не дают соседних кодов
+    assert short_code(1)[:3] != short_code(2)[:3]
+    # на малом пространстве видно, что это перестановка: все номера, каждый по разу
+    permutation = CodePermutation(b"key", 2)
+    assert sorted(permutation.permute(number) for number in range(62 ** 2)) == list(range(62 ** 2))
+
+
+def test_codes_depend_on_deployment_key():
+    first, second = CodePermutation(b"first", 7), CodePermutation(b"second", 7)
+    first_codes = [short_code(number, first) for number in range(100)]
+    second_codes = [short_code(number, second) for number in range(100)]
+    assert first_codes == [short_code(number, CodePermutation(b"first", 7)) for number in range(100)]
+    assert not set(first_codes) & set(second_codes)
+
+
+@pytest.mark.asyncio
+async def test_short_code_redirects_while_snippet_is_public(db_session):
+    hot_codes.clear()
+    created = await create_snippet(db_session, SnippetCreate(title="t", content="c", is_private=False))
+    code = created["shared_url"]
+    assert len(code) == 7
+    assert await resolve_short_code(db_session, code) == f"/snippets/shared/{code}"
+    assert hot_codes.get(code) == f"/snippets/shared/{code}"
+
+    # приватный сниппет: горячая запись сброшена, старый код никуда не ведёт
+    await update_snippet(db_session, created["id"], SnippetUpdate(title="t", content="c", is_private=True))
+    assert hot_codes.get(code) is None
+    assert await resolve_short_code(db_session, code) is None
+
+    public = await update_snippet(db_session, created["id"], SnippetUpdate(title="t", content="c", is_private=False))
+    assert public["shared_url"] != code
+    assert await resolve_short_code(db_session, public["shared_url"]) == f"/snippets/shared/{public['shared_url']}"
+
+
+@pytest.mark.asyncio
+async def test_public_snippet_updates_keep_code_without_allocating(db_session):
+    created = await create_snippet(db_session, SnippetCreate(title="t", content="c", is_private=False))
+    available = short_codes.stats()["available"]
+    for content in ("c2", "c3"):
+        updated = await update_snippet(db_session, created["id"], SnippetUpdate(title="t", content=content,
+                                                                                 is_private=False))
+        assert updated["shared_url"] == created["shared_url"]
+    # номера блока не расходуются на сниппет, у которого код уже есть
+    assert short_codes.stats()["available"] == available
+
+
+@pytest.mark.asyncio
+async def test_rolled_back_request_does_not_reuse_block(db_session):
+    # блок фиксируется сразу: откат запроса, взявшего код, не отдаёт тот же блок заново
+    code = await ShortCodeAllocator().next_code(db_session)
+    await db_session.rollback()
+    assert await ShortCodeAllocator().next_code(db_session) != code
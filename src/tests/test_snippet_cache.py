@@ -0,0 +1,111 @@
+import multiprocessing
+from datetime import datetime
+
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from core.cache import LRUCache
+from core.generations import GenerationTable
+from db.db import create_sessionmaker
+from db.replicas import ReplicaSet, read_session
+from models import Base
+from schemas.snippet import SnippetCreate
+from services import crud_snippet
+from services.crud_snippet import create_snippet, get_snippet_by_shared_url_from_db
+from services.snippet_cache import SharedSnippetCache, snippet_writes
+
+
+def make_snippet(snippet_id: int, shared_url: str, content: str = "print(1)") -> dict:
+    return dict(id=snippet_id, title="t", content=content, is_private=False,
+                created_at=datetime.utcnow(), shared_url=shared_url)
+
+
+def test_lru_eviction_and_counters():
+    cache = LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "a" становится самым свежим
+    cache.set("c", 3)  # вытесняется "b"
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    stats = cache.stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 1
+    assert stats["evictions"] == 1
+
+
+def test_lru_ttl_and_memory_limit():
+    cache = LRUCache(maxsize=10, ttl=0.01, max_bytes=10, weigher=len)
+    cache.set("x", "12345")
+    cache.set("y", "123456")  # суммарно 11 байт - "x" вытесняется
+    assert cache.get("x") is None
+    assert cache.get("y") == "123456"
+    cache.set("big", "x" * 11)  # больше всего кэша - не сохраняется
+    assert cache.get("big") is None
+    cache.set("z", "1", ttl=-1)
+    assert cache.get("z") is None
+
+
+def test_shared_cache_invalidation_by_id_and_old_url():
+    cache = SharedSnippetCache(maxsize=10, ttl=60, max_bytes=1024 * 1024)
+    cache.set(make_snippet(1, "url-1"))
+    assert cache.get("url-1")["id"] == 1
+
+    # сниппет стал приватным - ссылка должна перестать работать сразу
+    cache.invalidate(1)
+    assert cache.get("url-1") is None
+
+    cache.set(make_snippet(2, "url-2"))
+    cache.invalidate(3, "url-2")
+    assert cache.get("url-2") is None
+
+
+def bump_in_other_worker(path: str, key: str) -> None:
+    GenerationTable("test", path=path).bump(key)
+
+
+def test_invalidation_reaches_other_workers(tmp_path, monkeypatch):
+    path = str(tmp_path / "generations")
+    cache = SharedSnippetCache(maxsize=10, ttl=60, max_bytes=1024 * 1024,
+                               generations=GenerationTable("test", path=path))
+    cache.set(make_snippet(1, "url-1"))
+    # запись обработал другой воркер: его кэш этой строки не видел, но поколение ссылки общее
+    worker = multiprocessing.get_context("fork").Process(target=bump_in_other_worker, args=(path, "url-1"))
+    worker.start()
+    worker.join()
+    assert cache.get("url-1") is None
+
+    # чтение началось до записи и закончилось после неё - старая строка в кэш не попадает
+    generation = cache.generation("url-2")
+    bump_in_other_worker(path, "url-2")
+    cache.set(make_snippet(2, "url-2"), generation)
+    assert cache.get("url-2") is None
+
+    # пока в воркере идёт запись, прочитанное не кэшируется
+    monkeypatch.setattr(snippet_writes, "in_progress", 1)
+    cache.set(make_snippet(3, "url-3"))
+    assert cache.get("url-3") is None
+
+
+@pytest.mark.asyncio
+async def test_rows_read_from_replica_are_not_cached(tmp_path, monkeypatch):
+    # реплика - второй движок на том же файле SQLite
+    primary = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'db.sqlite'}")
+    replica = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'db.sqlite'}")
+    async with primary.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with create_sessionmaker(primary)() as session:
+        created = await create_snippet(session, SnippetCreate(title="t", content="c", is_private=False))
+    cache = SharedSnippetCache(maxsize=10, ttl=60, max_bytes=1024 * 1024,
+                               generations=GenerationTable("test", path=str(tmp_path / "generations")))
+    monkeypatch.setattr(crud_snippet, "shared_snippet_cache", cache)
+    replica_set = ReplicaSet(primary, [replica])
+
+    async with read_session(replica_set) as session:
+        assert (await get_snippet_by_shared_url_from_db(session, created["shared_url"]))["id"] == created["id"]
+    assert cache.get(created["shared_url"]) is None
+    async with read_session(replica_set, read_primary=True) as session:
+        await get_snippet_by_shared_url_from_db(session, created["shared_url"])
+    assert cache.get(created["shared_url"])["id"] == created["id"]
+    await primary.dispose()
+    await replica.dispose()
@@ -0,0 +1,144 @@
+from contextlib import contextmanager
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from core.conditional import PreconditionFailed, snippet_etag
+from db.profiler import RequestProfile, current_profile, instrument_engine
+from schemas.snippet import SnippetCreate, SnippetUpdate
+from services import crud_snippet
+from services.crud_snippet import create_snippet, update_snippet, delete_snippet, get_snippet_row
+from services.short_codes import short_codes
+
+
+@contextmanager
+def count_statements():
+    profile = RequestProfile()
+    token = current_profile.set(profile)
+    try:
+        yield profile
+    finally:
+        current_profile.reset(token)
+
+
+@pytest.mark.asyncio
+async def test_mutation_statement_counts(db_engine, db_session):
+    instrument_engine(db_engine)
+    # блок коротких кодов выделяем заранее, чтобы его запрос не попал в подсчёт
+    await short_codes.next_code(db_session)
+    # в SQLite прежняя версия строки для истории читается отдельным SELECT,
+    # в PostgreSQL - в CTE того же UPDATE
+
+    with count_statements() as profile:
+        created = await create_snippet(db_session, SnippetCreate(title="t", content="c", is_private=True))
+    assert profile.queries == 2  # плюс первая ревизия
+    assert created["id"] and created["content"] == "c" and created["shared_url"] is None
+
+    with count_statements() as profile:
+        public = await update_snippet(db_session, created["id"], SnippetUpdate(title="t", content="c", is_private=False))
+    assert profile.queries == 3  # SELECT прежней версии, UPDATE и строка короткого кода в url
+    # приватный сниппет стал публичным - появилась ссылка
+    assert public["shared_url"]
+
+    etag = snippet_etag(public["id"], public["updated_at"], public["content_hash"])
+    with count_statements() as profile:
+        renamed = await update_snippet(db_session, created["id"], SnippetUpdate(title="t2", content="c", is_private=False),
+                                       if_match=etag)
+    assert profile.queries == 3  # заголовок изменился - плюс ревизия
+    assert renamed["revision"] == 2
+    # публичный сниппет сохраняет свою ссылку
+    assert renamed["shared_url"] == public["shared_url"]
+
+    with count_statements() as profile, pytest.raises(PreconditionFailed):
+        await update_snippet(db_session, created["id"], SnippetUpdate(title="t3", content="c"), if_match=etag)
+    assert profile.queries == 3  # запрос валидаторов только на неуспешном пути
+
+    with count_statements() as profile:
+        private = await update_snippet(db_session, created["id"], SnippetUpdate(title="t2", content="c", is_private=True))
+    assert profile.queries == 2  # текст и заголовок те же - ревизии нет
+    assert private["revision"] == 2
+    assert private["shared_url"] is None
+
+    with count_statements() as profile:
+        assert await delete_snippet(db_session, created["id"]) == created["id"]
+    assert profile.queries == 1
+    assert await get_snippet_row(db_session, created["id"]) is None
+    assert await update_snippet(db_session, created["id"], SnippetUpdate(title="t", content="c")) is None
+    assert await delete_snippet(db_session, created["id"]) is None
+
+
+class PostgresSession:
+    """Сессия без сервера PostgreSQL: компилирует запросы его диалектом и отвечает заготовленной строкой"""
+
+    def __init__(self, row: dict):
+        self.row = row
+        self.statements: list[str] = []
+
+    def get_bind(self):
+        return SimpleNamespace(dialect=postgresql.dialect())
+
+    async def execute(self, statement):
+        self.statements.append(str(statement.compile(dialect=postgresql.dialect())))
+        return SimpleNamespace(mappings=lambda: SimpleNamespace(first=lambda: self.row))
+
+    async def commit(self):
+        pass
+
+
+def returned_row(previous_is_private: bool, previous_hash: str, revision: int = 1) -> dict:
+    # строка RETURNING: колонки ответа и прежняя версия из CTE
+    now = datetime.utcnow()
+    row = dict(id=1, title="t", is_private=False, created_at=now, updated_at=now, content_hash="new",
+               shared_url=None if previous_is_private else "code", revision=revision)
+    previous = dict(revision=1, title="t", content="c", content_codec=None, content_compressed=None,
+                    content_hash=previous_hash, is_private=previous_is_private,
+                    shared_url=None if previous_is_private else "code")
+    return {**row, **{f"previous_{key}": value for key, value in previous.items()}}
+
+
+@pytest.mark.asyncio
+async def test_postgres_update_statements(monkeypatch):
+    async def next_code(db):
+        return "new-code"
+
+    monkeypatch.setattr(crud_snippet, "generate_shared_url", next_code)
+    content_hash = crud_snippet._content_values(PostgresSession({}), "t", "c")["content_hash"]
+
+    # публичный сниппет без изменений текста: прежняя версия, блокировка и запись - один запрос
+    db = PostgresSession(returned_row(False, content_hash))
+    updated = await update_snippet(db, 1, SnippetUpdate(title="t", content="c", is_private=False))
+    assert len(db.statements) == 1
+    assert updated["shared_url"] == "code"
+    statement = " ".join(db.statements[0].split())
+    assert statement.startswith("WITH previous AS (SELECT snippets.id")
+    assert "FROM snippets WHERE snippets.id = %(id_1)s FOR UPDATE)" in statement
+    assert "UPDATE snippets SET" in statement and "FROM previous WHERE snippets.id = previous.id" in statement
+    assert "shared_url=snippets.shared_url" in statement
+    assert "CASE WHEN (previous.content_hash IS NULL OR previous.content_hash != %(content_hash_1)s" in statement
+    assert "previous.is_private AS previous_is_private" in statement
+    assert "previous.shared_url AS previous_shared_url" in statement
+
+    # If-Match проверяется в том же UPDATE
+    db = PostgresSession(returned_row(False, content_hash))
+    await update_snippet(db, 1, SnippetUpdate(title="t", content="c", is_private=False),
+                         if_match=snippet_etag(1, datetime.utcnow(), content_hash))
+    assert len(db.statements) == 1
+    assert "AND snippets.id = %(id_2)s AND snippets.updated_at = %(updated_at_1)s" in db.statements[0]
+
+    # приватный сниппет стал публичным и текст изменился: плюс ревизия, код и строка url
+    db = PostgresSession(returned_row(True, "old", revision=2))
+    updated = await update_snippet(db, 1, SnippetUpdate(title="t", content="c", is_private=False))
+    assert len(db.statements) == 4
+    assert db.statements[1].startswith("INSERT INTO snippet_revisions")
+    assert db.statements[2] == ("UPDATE snippets SET updated_at=%(updated_at)s, shared_url=%(shared_url)s "
+                                "WHERE snippets.id = %(id_1)s")
+    assert db.statements[3].startswith("INSERT INTO url")
+    assert updated["shared_url"] == "new-code"
+
+    # публичный стал приватным: ссылка стирается тем же UPDATE
+    db = PostgresSession(returned_row(False, content_hash))
+    await update_snippet(db, 1, SnippetUpdate(title="t", content="c", is_private=True))
+    assert len(db.statements) == 1
+    assert "shared_url=%(shared_url)s" in db.statements[0]
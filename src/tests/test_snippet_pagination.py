@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from models.model import Snippet
+from services.crud_snippet import get_snippets, search_snippets
+from services.pagination import encode_cursor, decode_created_at_cursor, decode_rank_cursor
+
+
+@pytest.mark.asyncio
+async def test_keyset_pagination_walks_all_rows_in_stable_order(db_session):
+    base = datetime(2025, 1, 1)
+    # у части сниппетов одинаковый created_at - порядок должен добиваться id
+    db_session.add_all([Snippet(title=f"s{i}", content="x", created_at=base + timedelta(seconds=i // 2))
+                        for i in range(7)])
+    await db_session.commit()
+
+    seen, after = [], None
+    while True:
+        page = await get_snippets(db_session, limit=3, after=after)
+        seen.extend(snippet["id"] for snippet in page)
+        if len(page) < 3:
+            break
+        after = decode_created_at_cursor(encode_cursor(page[-1]["created_at"], page[-1]["id"]))
+
+    assert seen == [snippet["id"] for snippet in await get_snippets(db_session, limit=100)]
+    assert len(seen) == len(set(seen)) == 7
+
+
+def test_invalid_cursor_is_rejected():
+    with pytest.raises(ValueError):
+        decode_created_at_cursor("not-a-cursor")
+
+
+@pytest.mark.asyncio
+async def test_search_ranks_title_matches_first_and_pages(db_session):
+    db_session.add_all([
+        Snippet(title="notes", content="how to parse json in python"),
+        Snippet(title="python json parser", content="import json"),
+        Snippet(title="rust", content="fn main() {}"),
+        Snippet(title="misc", content="Python and JSON again"),
+    ])
+    await db_session.commit()
+
+    rows = await search_snippets(db_session, "json python", limit=2)
+    assert [snippet["title"] for snippet, _ in rows] == ["python json parser", "misc"]
+
+    last_snippet, last_rank = rows[-1]
+    rest = await search_snippets(db_session, "json python", limit=2,
+                                 after=decode_rank_cursor(encode_cursor(last_rank, last_snippet["id"])))
+    assert [snippet["title"] for snippet, _ in rest] == ["notes"]
@@ -0,0 +1,31 @@
+import pytest
+
+from db.profiler import RequestProfile, current_profile, instrument_engine, redact_parameters
+from schemas.snippet import SnippetCreate, SnippetUpdate
+from services.crud_snippet import create_snippet, get_snippet_row, update_snippet
+
+
+@pytest.mark.asyncio
+async def test_statements_are_attributed_to_current_request(db_engine, db_session):
+    instrument_engine(db_engine)
+    created = await create_snippet(db_session, SnippetCreate(title="t", content="c"))
+
+    profile = RequestProfile()
+    token = current_profile.set(profile)
+    try:
+        await update_snippet(db_session, created["id"], SnippetUpdate(title="t2", content="c2"))
+        for _ in range(5):
+            await get_snippet_row(db_session, created["id"])
+    finally:
+        current_profile.reset(token)
+
+    assert profile.queries >= 6
+    assert profile.total_time > 0
+    # пять одинаковых SELECT по id подряд отмечаются как вероятный N+1
+    assert len(profile.n_plus_one) == 1
+
+
+def test_parameters_are_redacted():
+    assert redact_parameters(("secret@mail.com", 1)) == "(str, int)"
+    assert redact_parameters({"email": "secret@mail.com"}) == "{email: str}"
+    assert redact_parameters([("a", 1), ("b", 2)]) == "<2 rows of (str, int)>"
@@ -0,0 +1,38 @@
+import os
+import subprocess
+import sys
+
+from benchmarks.import_time import IMPORT_BUDGET_MS, LAZY_MODULES, SRC_DIR, build_report, measure, parse_importtime
+
+IMPORTTIME_OUTPUT = """import time: self [us] | cumulative | imported package
+import time:       100 |        100 | site
+import time:       300 |        300 |     jose.jwt
+import time:        50 |        350 |   jose
+import time:       200 |        200 |   fastapi
+import time:        70 |        620 | main
+"""
+
+
+def test_build_report_parses_importtime():
+    report = build_report(parse_importtime(IMPORTTIME_OUTPUT), top=2)
+    assert report["total_ms"] == 0.62
+    # site импортируется до приложения и в отчёт не входит
+    assert report["loaded"] == ["fastapi", "jose", "jose.jwt", "main"]
+    assert report["slowest_modules"][0]["module"] == "jose.jwt"
+    assert report["packages"] == [{"package": "jose", "self_ms": 0.35}, {"package": "fastapi", "self_ms": 0.2}]
+
+
+def test_import_main_is_lazy_and_within_budget(tmp_path):
+    log_dir = tmp_path / "logs"
+    completed = subprocess.run(
+        [sys.executable, "-c", "import sys, main; print(','.join(sorted(sys.modules)))"],
+        cwd=SRC_DIR, capture_output=True, text=True,
+        env={**os.environ, "LOG_DIR": str(log_dir), "PYTHONPATH": SRC_DIR})
+    assert completed.returncode == 0, completed.stderr
+    loaded = {module.split(".")[0] for module in completed.stdout.strip().split(",")}
+    assert not loaded & set(LAZY_MODULES)
+    # каталог логов создаётся при запуске приложения, а не при импорте
+    assert not log_dir.exists()
+
+    report = measure(runs=5)
+    assert report["best_ms"] <= IMPORT_BUDGET_MS, report["slowest_modules"]